@@ -1,23 +1,43 @@
 import os
-import requests
+import re
+import io
+import base64
+import asyncio
+import time
+import uuid
+import atexit
+import queue
+import sqlite3
+import threading
+import functools
+import concurrent.futures
 from dotenv import load_dotenv
-from cs50 import SQL
 import json
 import datetime
+from urllib.parse import urlparse
 from datetime import timedelta
-import tempfile
 import edge_tts
-import asyncio
 from cryptography.fernet import Fernet
-import nest_asyncio
-import speech_recognition as sr
-import threading
-import ffmpeg
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, flash
+import extraction
+import asr
+import transcode
+from context_window import ContextWindow
+from tts_cache import TTSCache
+from recorder import SessionRecorder
+from audio_store import AudioStore
+from transcript_log import TranscriptLog
+from vad import EnergyVAD
+from session_store import SqliteSessionInterface
+from jobs import JobQueue, QueueFull
+from db import Database
+from profile_cache import ProfileCache, MISSING
+from greetings import GreetingCache, prompt_digest
+from llm_client import LLMClient, LLMError, LLMBusy, BACKGROUND
+from metrics import Registry
+from flask_sock import Sock, ConnectionClosed
+from flask import Flask, Response, render_template, request, jsonify, send_file, session, redirect, url_for, flash, stream_with_context, g
 from werkzeug.security import check_password_hash, generate_password_hash
 
-# Apply nest_asyncio to allow asyncio event loops to be nested
-nest_asyncio.apply()
 load_dotenv()
 
 # --- SSL Configuration ---
@@ -27,45 +47,102 @@ ssl_context = None
 if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
     ssl_context = (cert_path, key_path)
 
+# Databases, keys, recordings and the TTS cache live here (the app directory by default)
+DATA_DIR = os.getenv('DATA_DIR', os.path.dirname(__file__))
+
 # --- Flask App Initialization ---
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', os.urandom(24))
 app.permanent_session_lifetime = timedelta(minutes=30)
+# Session data lives server-side; the cookie only carries an opaque session ID
+SESSION_DB = os.path.join(DATA_DIR, 'sessions.db')
+JOBS_DB = os.path.join(DATA_DIR, 'jobs.db')
+app.session_interface = SqliteSessionInterface(SESSION_DB)
+sock = Sock(app)
+# Stage timings for /metrics and the Server-Timing header
+metrics = Registry('counsellor')
 
 # --- LLM Configuration ---
-OLLAMA_URL = 'http://localhost:11434/api/chat'
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434/api/chat')
 OLLAMA_MODEL = 'gemma3:latest'
+# How long Ollama keeps the model loaded after each request: seconds or a duration ('30m'),
+# -1 to keep it loaded. Unset leaves Ollama's default of 5 minutes.
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE')
+# Loading the model on a cold Ollama can take much longer than a reply
+OLLAMA_LOAD_TIMEOUT = float(os.getenv('OLLAMA_LOAD_TIMEOUT', '300'))
+# Stream replies sentence by sentence through /speech_stream and /initiate_stream
+STREAM_REPLIES = os.getenv('STREAM_REPLIES', '1') == '1'
+# Run the whole conversation over the /voice WebSocket instead of one upload per turn
+VOICE_CHANNEL = os.getenv('VOICE_CHANNEL', '1') == '1'
+# --- ASR Configuration ---
+# 'google' (Google Web Speech, the default), 'vosk' (local CPU model at VOSK_MODEL_PATH) or 'fake'
+asr_backend = asr.create_backend(os.getenv('ASR_BACKEND', 'google'), model_path=os.getenv('VOSK_MODEL_PATH'))
+EMPTY_AUDIO_TEXT = '(User audio was empty or indecipherable)'
+ASR_FAILED_TEXT = '(Speech recognition service failed)'
+# Silence around the speech is trimmed before recognition and recording; a clip with no
+# speech never reaches the recognizer or the LLM
+vad = EnergyVAD(margin_db=float(os.getenv('VAD_MARGIN_DB', '12')), hangover_ms=int(os.getenv('VAD_HANGOVER_MS', '300')))
+# --- TTS Configuration ---
+TTS_VOICE = "en-IN-NeerjaNeural"
+TTS_OUTPUT_FORMAT = 'audio-24khz-48kbitrate-mono-mp3'  # edge-tts default, decoded to 16 kHz PCM
+TTS_MIMETYPE = 'audio/mpeg'
+# A /reply_audio URL hashes the voice, text and format its audio is synthesized from, so it
+# always names the same audio and the browser may cache it for a year
+REPLY_AUDIO_MAX_AGE = 365 * 24 * 3600
+LLM_FALLBACK_REPLY = 'Sorry, there was an error with the local LLM.'
+INITIATE_FALLBACK_REPLY = "I'm sorry, I'm having trouble connecting right now. Please try again in a moment."
+LLM_BUSY_REPLY = "Sorry, I'm a little overloaded right now. Please try again in a moment."
+# Fixed phrases synthesized into the TTS cache at startup
+TTS_PREWARM_PHRASES = [LLM_FALLBACK_REPLY, INITIATE_FALLBACK_REPLY, LLM_BUSY_REPLY]
+
+def parse_keep_alive(value):
+    # Ollama reads a bare number as seconds; '-1' would be rejected as a duration string
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def llm_timer(phase, priority):
+    # Time waiting for a slot separately from time on the model; background calls get their own stages
+    stage = 'llm' if priority != BACKGROUND else 'llm_background'
+    return metrics.span(f'{stage}_queue' if phase == 'queue' else stage)
+
+# One pooled keep-alive client shared by every route and the background saver. At most
+# LLM_MAX_IN_FLIGHT requests run on Ollama at once, live turns ahead of background work;
+# the processes serve.py forks share the cap (see before_fork).
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '2'))
+llm = LLMClient(OLLAMA_URL, OLLAMA_MODEL, max_connections=int(os.getenv('OLLAMA_MAX_CONNECTIONS', '8')),
+                max_in_flight=LLM_MAX_IN_FLIGHT,
+                max_queued=int(os.getenv('LLM_MAX_QUEUED', '32')),
+                max_queued_background=int(os.getenv('LLM_MAX_QUEUED_BACKGROUND', '8')),
+                timer=llm_timer, keep_alive=parse_keep_alive(OLLAMA_KEEP_ALIVE))
 
 # --- Directory and File Paths ---
-AUDIO_LOG_DIR = os.path.join(os.path.dirname(__file__), 'audio_logs')
-KEY_FILE = os.path.join(os.path.dirname(__file__), 'keys', 'secret.key')
-DB_FILE = "sqlite:///conversation_history.db"
+AUDIO_LOG_DIR = os.path.join(DATA_DIR, 'audio_logs')
+AUDIO_INDEX_DB = os.path.join(DATA_DIR, 'audio_logs.db')
+KEY_FILE = os.path.join(DATA_DIR, 'keys', 'secret.key')
+TTS_CACHE_DIR = os.path.join(DATA_DIR, 'tts_cache')
+LLM_SLOTS_DIR = os.path.join(DATA_DIR, 'llm_slots')
+DB_FILE = os.path.join(DATA_DIR, 'conversation_history.db')
 os.makedirs(AUDIO_LOG_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(KEY_FILE), exist_ok=True)
 
+# --- Audio Log Storage ---
+# Saved recordings are compressed in the background; abandoned ones are deleted once their
+# session has expired, and old recordings are evicted by age and total size
+audio_store = AudioStore(AUDIO_LOG_DIR, AUDIO_INDEX_DB, codec=os.getenv('AUDIO_LOG_CODEC', 'flac'),
+                         orphan_seconds=app.permanent_session_lifetime.total_seconds(),
+                         retention_seconds=float(os.getenv('AUDIO_RETENTION_DAYS', '90')) * 24 * 3600,
+                         quota_bytes=int(float(os.getenv('AUDIO_QUOTA_MB', '0')) * 1024 * 1024))
+
 # --- Database Setup ---
+db = Database(DB_FILE, pool_size=int(os.getenv('DB_POOL_SIZE', '8')))
+
 def init_db():
-    db = SQL(DB_FILE)
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            hash TEXT NOT NULL
-        );
-    ''')
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS Main (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            info_json TEXT,
-            start_time TEXT,
-            end_time TEXT,
-            duration TEXT,
-            updated_at TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        );
-    ''')
-    db._disconnect()
+    # Creates the tables on a new database and migrates an existing one
+    db.migrate()
 
 # Initialize the database on startup
 init_db()
@@ -81,7 +158,41 @@ def load_or_create_key():
             key = f.read()
     return key
 
-fernet = Fernet(load_or_create_key())
+key = load_or_create_key()
+fernet = Fernet(key)
+
+# --- Transcript Log ---
+# Every turn is kept, compressed and encrypted, in the turns table; decrypt_and_display.py --turns reads it
+TRANSCRIPT_LOG = os.getenv('TRANSCRIPT_LOG', '1') == '1'
+transcript = TranscriptLog(db, key, flush_interval=float(os.getenv('TRANSCRIPT_FLUSH_SECONDS', '1')))
+atexit.register(transcript.flush)
+
+def log_turn(user_id, conversation_id, seq, role, content):
+    """Appends a turn of the conversation to the transcript log; `seq` is its index in the history."""
+    if TRANSCRIPT_LOG and conversation_id and content:
+        transcript.append(user_id, conversation_id, seq, role, content)
+
+# --- Profile Cache ---
+profile_cache = ProfileCache(max_entries=int(os.getenv('PROFILE_CACHE_SIZE', '1024')),
+                             ttl=float(os.getenv('PROFILE_CACHE_TTL', '300')))
+
+def load_profile(user_id):
+    """
+    Returns the user's decrypted profile, or None if they have none yet. Served from the
+    profile cache when possible; raises if the stored profile cannot be decrypted.
+    """
+    profile = profile_cache.get(user_id)
+    if profile is not MISSING:
+        return profile
+    info_json = db.get_profile(user_id)
+    profile = json.loads(fernet.decrypt(info_json).decode('utf-8')) if info_json else None
+    profile_cache.put(user_id, profile)
+    return profile
+
+# --- TTS Cache ---
+tts_cache = TTSCache(TTS_CACHE_DIR,
+                     memory_bytes=int(os.getenv('TTS_CACHE_MEMORY_MB', '16')) * 1024 * 1024,
+                     disk_bytes=int(os.getenv('TTS_CACHE_DISK_MB', '256')) * 1024 * 1024)
 
 # --- Admin Prompt Loading ---
 try:
@@ -90,6 +201,16 @@ try:
 except FileNotFoundError:
     admin_prompt = "You are a helpful assistant."
 
+# --- Context Window ---
+# Token budgets for the /speech prompt: the whole prompt is capped at CONTEXT_MAX_TOKENS, and once
+# the conversation part passes CONTEXT_FOLD_TOKENS older turns are folded into a rolling summary
+context_window = ContextWindow(max_tokens=int(os.getenv('CONTEXT_MAX_TOKENS', '3584')),
+                               fold_tokens=int(os.getenv('CONTEXT_FOLD_TOKENS', '1536')),
+                               keep_tokens=int(os.getenv('CONTEXT_KEEP_TOKENS', '512')))
+# Sessions with a summary being written, so a slow fold is not started again on every turn
+pending_folds = set()
+pending_folds_lock = threading.Lock()
+
 # --- Helper functions ---
 def safe_filename(who):
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
@@ -97,7 +218,7 @@ def safe_filename(who):
 
 async def generate_speech_bytes(text):
     try:
-        communicate = edge_tts.Communicate(text=text, voice="en-IN-NeerjaNeural")
+        communicate = edge_tts.Communicate(text=text, voice=TTS_VOICE)
         tts_audio_bytes = b""
         async for chunk in communicate.stream():
             if chunk["type"] == 'audio':
@@ -107,38 +228,320 @@ async def generate_speech_bytes(text):
         print(f"Error generating speech: {e}")
         return b""
 
-# --- Data Extraction ---
-def extract_user_data(conversation_history):
-    print("Summarizing User Data with Local Ollama")
-    data = { 'name': None, 'phone': None, 'hsc_marks': None, 'jee_percentile': None }
+def tts_key(text):
+    return TTSCache.key(TTS_VOICE, text, TTS_OUTPUT_FORMAT)
+
+async def synthesize(text):
+    """
+    Returns (mp3_bytes, pcm) for text, from the TTS cache when possible. Both are empty if
+    synthesis failed. Cache and decode work runs off the event loop.
+    """
+    key = tts_key(text)
+    cached = await asyncio.to_thread(tts_cache.get, key)
+    if cached:
+        return cached
+
+    with metrics.span('tts'):
+        tts_audio_bytes = await generate_speech_bytes(text)
+    if not tts_audio_bytes:
+        return b"", b""
+    try:
+        with metrics.span('tts_decode'):
+            pcm = await asyncio.to_thread(transcode.decode_to_pcm, tts_audio_bytes)
+    except transcode.TranscodeError as e:
+        print(f"Error decoding bot audio: {e}")
+        return tts_audio_bytes, b""
+    await asyncio.to_thread(tts_cache.put, key, tts_audio_bytes, pcm)
+    return tts_audio_bytes, pcm
+
+async def prewarm_tts(phrases):
+    for phrase in phrases:
+        await synthesize(phrase)
+    print(f"TTS cache pre-warmed: {tts_cache.stats()}")
+
+# The fixed phrases are synthesized by warm_up(), before serving or in the background
+TTS_PREWARM = os.getenv('TTS_PREWARM', '1') == '1'
 
-    def query_ollama_for_info(prompt_for_extraction, context_messages):
+async def generate_turn(messages, fallback_text):
+    """
+    The network-bound part of a turn, run as one coroutine on the LLM client's loop:
+    the Ollama reply followed by its speech. Returns (reply_text, mp3_bytes, pcm).
+    """
+    try:
+        reply_text = await llm.chat_async(messages)
+    except LLMBusy as e:
+        print(f"Ollama is busy: {e}")
+        reply_text = LLM_BUSY_REPLY
+    except LLMError as e:
+        print(f"Ollama API error: {e}")
+        reply_text = fallback_text
+    return (reply_text, *await synthesize(reply_text))
+
+def record_clip(recording_path, pcm, gap=True):
+    """Appends a finished clip to the session recording."""
+    if recording_path and pcm:
+        with metrics.span('record'):
+            SessionRecorder(recording_path).append(pcm, gap=gap)
+
+def build_chat_prompt(conversation_history, session_id):
+    """
+    The prompt for a conversation turn: the system prompt, the session's rolling summary and
+    the recent turns, within the context window's budget. Starts a background fold if the
+    verbatim turns have outgrown it.
+    """
+    with metrics.span('context'):
+        summary = app.session_interface.get_summary(session_id)
+        messages, fold = context_window.build(admin_prompt, conversation_history, summary)
+    if fold:
+        with pending_folds_lock:
+            if session_id in pending_folds:
+                return messages
+            pending_folds.add(session_id)
+        llm.submit(fold_context(session_id, fold)).add_done_callback(lambda _: pending_folds.discard(session_id))
+    return messages
+
+async def fold_context(session_id, fold):
+    """Summarizes the folded turns into the session's rolling summary, off the request path."""
+    try:
+        summary = await llm.chat_async(context_window.summary_request(fold), options={'temperature': 0.0},
+                                       priority=BACKGROUND)
+    except LLMError as e:
+        print(f"Could not summarize the conversation, keeping the turns verbatim: {e}")
+        return
+    await asyncio.to_thread(app.session_interface.put_summary, session_id, fold['upto'], fold['digest'], summary.strip())
+    print(f"Folded {len(fold['turns'])} turns of session context into the summary.")
+
+# --- Streaming Replies ---
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets) and then whitespace,
+# so decimals like "95.5" and a trailing "." still waiting for the next token are not cut.
+SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+
+def pop_sentences(buffer):
+    """Splits every complete sentence off the front of buffer. Returns (sentences, remainder)."""
+    sentences = []
+    match = SENTENCE_END.search(buffer)
+    while match:
+        sentence = buffer[:match.end()].strip()
+        buffer = buffer[match.end():]
+        if sentence:
+            sentences.append(sentence)
+        match = SENTENCE_END.search(buffer)
+    return sentences, buffer
+
+def split_sentences(tokens):
+    """Regroups a token stream into whole sentences as soon as each one is complete."""
+    buffer = ''
+    for token in tokens:
+        sentences, buffer = pop_sentences(buffer + token)
+        yield from sentences
+    if buffer.strip():
+        yield buffer.strip()
+
+def sse_event(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+def reply_events(messages, recording_path, fallback_text, cancelled=None):
+    """
+    Generates the events of one bot reply: a 'segment' with the text and mp3 of each sentence,
+    then 'done' with the full reply text. A producer reads the Ollama stream and queues finished
+    sentences while this generator synthesizes the previous ones, so the first audio segment
+    only waits for the first sentence. If the `cancelled` event is set the reply stops early and
+    ends with 'cancelled', holding only the sentences already produced.
+    """
+    sentences = queue.Queue()
+
+    async def produce():
+        buffer = ''
         try:
-            payload = {
-                'model': OLLAMA_MODEL,
-                'messages': context_messages + [{'role' : 'user', 'content' : prompt_for_extraction}],
-                'stream': False, 'options': {'temperature': 0.0}
-            }
-            llm_resp = requests.post(OLLAMA_URL, json=payload, timeout=60)
-            llm_resp.raise_for_status()
-            return llm_resp.json()['message']['content'].strip()
-        except requests.exceptions.RequestException as e:
-            print(f"Error querying Ollama: {e}")
-            return "None"
+            async for token in llm.stream_chat_async(messages):
+                complete, buffer = pop_sentences(buffer + token)
+                for sentence in complete:
+                    sentences.put(sentence)
+            if buffer.strip():
+                sentences.put(buffer.strip())
+        except LLMBusy as e:
+            print(f"Ollama is busy: {e}")
+            sentences.put(LLM_BUSY_REPLY)
+        except LLMError as e:
+            print(f"Ollama streaming error: {e}")
+            sentences.put(fallback_text)
+        finally:
+            sentences.put(None)
+
+    def next_sentence():
+        if cancelled is None:
+            return sentences.get()
+        while not cancelled.is_set():
+            try:
+                return sentences.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    # The Ollama stream is read on the LLM client's loop. If the consumer goes away this
+    # generator is closed and the producer is cancelled, which stops generation upstream.
+    producer = llm.submit(produce())
+    reply_parts = []
+    try:
+        while True:
+            sentence = next_sentence()
+            if sentence is None:
+                break
+            tts_audio_bytes, pcm = llm.run(synthesize(sentence))
+            if cancelled is not None and cancelled.is_set():
+                break
+            reply_parts.append(sentence)
+            yield {'type': 'segment', 'text': sentence, 'audio': tts_audio_bytes}
+            # The recording is appended after the segment is on its way to the browser. Sentences
+            # of one reply follow each other without the silence gap that separates turns.
+            record_clip(recording_path, pcm, gap=len(reply_parts) == 1)
+    finally:
+        producer.cancel()
+
+    if cancelled is not None and cancelled.is_set():
+        yield {'type': 'cancelled', 'reply_text': ' '.join(reply_parts)}
+    else:
+        yield {'type': 'done', 'reply_text': ' '.join(reply_parts) or fallback_text}
+
+def stream_reply(events, session_id, on_reply=None):
+    """
+    Turns the events of one bot reply (from reply_events or initiate_events) into SSE events,
+    with each segment's mp3 inlined as base64. `on_reply(reply_text)` is called once it is complete.
+    """
+    for event in events:
+        if event['type'] == 'segment':
+            audio = event['audio']
+            event = {'type': 'segment', 'text': event['text'], 'mime': TTS_MIMETYPE,
+                     'audio': base64.b64encode(audio).decode('ascii') if audio else ''}
+        else:
+            # The session was saved when the response started, so the reply is appended to the store directly
+            app.session_interface.append_turns(session_id, [{'role': 'assistant', 'content': event['reply_text']}])
+            if on_reply is not None:
+                on_reply(event['reply_text'])
+        yield sse_event(event)
+
+def event_stream_response(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Data Extraction ---
+# 'single' extracts every field in one schema-constrained request, 'sequential' asks one question per field
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'single')
+# Phone numbers, percentages and names given plainly are read with rules first; the LLM is
+# only asked for the fields they leave open
+FAST_PATH_EXTRACTION = os.getenv('FAST_PATH_EXTRACTION', '1') == '1'
+fast_path = extraction.FastPath(min_confidence=float(os.getenv('FAST_PATH_MIN_CONFIDENCE', '0.8')))
 
+def query_ollama_for_info(context_messages, response_format=None):
+    # LLMError is not caught here: the save job fails and is retried instead of saving 'None's
+    # and LLMBusy (too much background work queued) is retried the same way
+    return llm.chat(context_messages, options={'temperature': 0.0}, response_format=response_format,
+                    priority=BACKGROUND).strip()
+
+def extraction_system_prompt():
     try:
         with open("admin_prompt_extr.txt", 'r') as f:
-            extraction_system_prompt = f.read()
+            return f.read()
     except FileNotFoundError:
-        extraction_system_prompt = "You are an expert data extractor. From the conversation history, extract only the specific information requested. Output 'None' if the information is not present."
+        return "You are an expert data extractor. From the conversation history, extract only the specific information requested. Output 'None' if the information is not present."
+
+def run_extraction(extraction_context):
+    extract = extraction.extract_sequential if EXTRACTION_MODE == 'sequential' else extraction.extract_single_pass
+    if FAST_PATH_EXTRACTION:
+        return extraction.extract_tiered(query_ollama_for_info, extraction_context, fast_path, extract)
+    return extract(query_ollama_for_info, extraction_context)
+
+def extract_user_data(conversation_history):
+    print("Summarizing User Data with Local Ollama")
+    return run_extraction([{'role': 'system', 'content': extraction_system_prompt()}] + conversation_history)
+
+# --- Incremental Extraction ---
+# Each answered turn is extracted by a background job as soon as its reply is done, so saving
+# the conversation only merges the results. Set INCREMENTAL_EXTRACTION=0 to extract the whole
+# transcript at the end instead.
+INCREMENTAL_EXTRACTION = os.getenv('INCREMENTAL_EXTRACTION', '1') == '1'
+# Results of conversations that were never saved are dropped after a day
+TURN_PROFILE_RETENTION = 24 * 3600
+
+def extractable_turns(conversation_history):
+    """Indices of the user's turns, leaving out the placeholders for audio that was not understood."""
+    return [i for i, turn in enumerate(conversation_history)
+            if turn['role'] == 'user' and turn['content'] not in (EMPTY_AUDIO_TEXT, ASR_FAILED_TEXT)]
 
-    extraction_context = [{'role': 'system', 'content': extraction_system_prompt}] + conversation_history
+def conversation_turn(conversation_history, seq):
+    """The question the user's turn at `seq` answered (or '') and the turn's text."""
+    previous = conversation_history[seq - 1] if seq > 0 else None
+    question = previous['content'] if previous and previous['role'] == 'assistant' else ''
+    return question, conversation_history[seq]['content']
 
-    data['name'] = query_ollama_for_info('What is the full name of the user?', extraction_context)
-    data['phone'] = query_ollama_for_info('What is the mobile number of the user?', extraction_context)
-    data['hsc_marks'] = query_ollama_for_info('What are the HSC/12th percentage of the user?', extraction_context)
-    data['jee_percentile'] = query_ollama_for_info('What is the JEE Percentile of the user?', extraction_context)
-    return data
+def load_turn_profiles(conversation_id):
+    return [(seq, json.loads(fernet.decrypt(fields).decode('utf-8'))) for seq, fields in db.get_turn_profiles(conversation_id)]
+
+def extract_turn(conversation_id, user_id, seq, question, user_text, reply_text):
+    """
+    Extracts the profile fields one turn gives and stores them as the turn's result, replacing
+    any earlier run of the same turn. The model is shown the saved profile with the
+    conversation's earlier turns applied.
+    """
+    try:
+        saved = load_profile(user_id) or {}
+    except Exception as e:
+        print(f"Could not decrypt/parse existing data for UID {user_id}: {e}")
+        saved = {}
+    profile = extraction.merge_turns(saved, [turn for turn in load_turn_profiles(conversation_id) if turn[0] < seq])
+    context = extraction.turn_context(extraction_system_prompt(), profile, question, user_text, reply_text)
+    fields = extraction.changed_fields(run_extraction(context), profile)
+    if not db.put_turn_profile(conversation_id, seq, user_id, fernet.encrypt(json.dumps(fields).encode('utf-8')),
+                               time.time()):
+        print(f"Conversation was saved while turn {seq} was being extracted, dropping its result.")
+    return fields
+
+def extract_turn_job(payload):
+    # A job that waited past the save would only make an LLM request whose result is dropped
+    if db.is_conversation_saved(payload['conversation_id']):
+        print(f"Conversation already saved, skipping the extraction of turn {payload['seq']}.")
+        return
+    # The turn's text is kept encrypted in jobs.db, where a failed job stays until it is purged
+    question, user_text, reply_text = json.loads(fernet.decrypt(payload['turn'].encode('ascii')))
+    with metrics.span('turn_extraction'):
+        extract_turn(payload['conversation_id'], payload['user_id'], payload['seq'], question, user_text, reply_text)
+
+def queue_turn_extraction(conversation_id, user_id, conversation_history, seq, reply_text):
+    """Queues the extraction of the user's turn at `seq` once its reply is complete."""
+    if not INCREMENTAL_EXTRACTION or not conversation_id or seq not in extractable_turns(conversation_history):
+        return
+    question, user_text = conversation_turn(conversation_history, seq)
+    try:
+        job_queue.enqueue('extract_turn', {
+            'conversation_id': conversation_id, 'user_id': user_id, 'seq': seq,
+            'turn': fernet.encrypt(json.dumps([question, user_text, reply_text]).encode('utf-8')).decode('ascii'),
+        })
+    except QueueFull as e:
+        # The save extracts the turns that have no result yet
+        print(f"Turn extraction not queued, job queue is full: {e}")
+
+def with_turn_extraction(events, conversation_id, user_id, conversation_history, seq):
+    """Passes a reply's events through and queues the turn's extraction when the reply ends."""
+    for event in events:
+        if event['type'] != 'segment':
+            queue_turn_extraction(conversation_id, user_id, conversation_history, seq, event['reply_text'])
+        yield event
+
+def merge_conversation_turns(conversation_id, user_id, conversation_history):
+    """
+    The profile fields a conversation gave, merged from its per-turn results. Turns with no
+    result yet (their job is still waiting, or could not be queued) are extracted here.
+    """
+    done = {seq for seq, _ in db.get_turn_profiles(conversation_id)}
+    missing = [seq for seq in extractable_turns(conversation_history) if seq not in done]
+    if missing:
+        print(f"Extracting {len(missing)} turn(s) that have no result yet.")
+    for seq in missing:
+        question, user_text = conversation_turn(conversation_history, seq)
+        following = conversation_history[seq + 1] if seq + 1 < len(conversation_history) else None
+        reply_text = following['content'] if following and following['role'] == 'assistant' else ''
+        extract_turn(conversation_id, user_id, seq, question, user_text, reply_text)
+    return extraction.merge_turns({}, load_turn_profiles(conversation_id))
 
 # --- Routes and Core Logic ---
 
@@ -159,38 +562,37 @@ def auth():
         flash("Username and password are required.", "error")
         return redirect(url_for('index'))
 
-    db = SQL(DB_FILE)
-    try:
-        rows = db.execute("SELECT * FROM users WHERE username = ?", username)
-        if action == 'register':
-            if rows:
-                flash("Username already exists. Please choose another or log in.", "error")
-                return redirect(url_for('index'))
-            hash_pass = generate_password_hash(password)
-            db.execute("INSERT INTO users (username, hash) VALUES (?, ?)", username, hash_pass)
-            flash("Registration successful! Please log in.", "success")
+    if action == 'register':
+        hash_pass = generate_password_hash(password)
+        if not db.create_user(username, hash_pass):
+            flash("Username already exists. Please choose another or log in.", "error")
             return redirect(url_for('index'))
+        flash("Registration successful! Please log in.", "success")
+        return redirect(url_for('index'))
 
-        elif action == 'login':
-            if not rows or not check_password_hash(rows[0]["hash"], password):
-                flash("Invalid username or password.", "error")
-                return redirect(url_for('index'))
-            
-            session.permanent = True
-            session['user_id'] = rows[0]["id"]
-            session['username'] = rows[0]["username"]
-            return redirect(url_for('chat'))
-        else:
-            flash("Invalid action.", "error")
+    elif action == 'login':
+        user = db.get_user(username)
+        if not user or not check_password_hash(user["hash"], password):
+            flash("Invalid username or password.", "error")
             return redirect(url_for('index'))
-    finally:
-        db._disconnect()
+        
+        session.permanent = True
+        session['user_id'] = user["id"]
+        session['username'] = user["username"]
+        # The greeting is generated while the chat page loads
+        if GREETING_PREFETCH:
+            prefetch_greeting()
+        return redirect(url_for('chat'))
+    else:
+        flash("Invalid action.", "error")
+        return redirect(url_for('index'))
 
 @app.route('/chat')
 def chat():
     if 'user_id' not in session:
         return redirect(url_for('index'))
-    return render_template('main.html', username=session.get('username'))
+    return render_template('main.html', username=session.get('username'), streaming=STREAM_REPLIES,
+                           voice_channel=VOICE_CHANNEL)
 
 @app.route('/logout')
 def logout():
@@ -203,320 +605,741 @@ def initiate():
     if 'user_id' not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
+    reset_conversation()
+    return start_chat()
+
+@app.route('/initiate_stream', methods=['POST'])
+def initiate_stream():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    reset_conversation()
+    events = initiate_events(build_initiate_prompt(), session['user_id'], session.get('recording_path'))
+    on_reply = functools.partial(log_turn, session['user_id'], session['conversation_id'], 0, 'assistant')
+    return event_stream_response(stream_reply(events, session.sid, on_reply))
+
+def reset_conversation():
     session['conversation_history'] = []
-    session['audio_paths'] = []
+    session['recording_path'] = os.path.join(AUDIO_LOG_DIR, safe_filename(f"{session.get('username')}_processed"))
+    # Keys the conversation's per-turn extraction results
+    session['conversation_id'] = uuid.uuid4().hex
+    audio_store.start(session['recording_path'], session.get('user_id'))
     session['initial_time'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
 
-    return asyncio.get_event_loop().run_until_complete(start_chat())
-
-async def start_chat():
+def build_initiate_prompt():
     user_id = session.get('user_id')
-    db = SQL(DB_FILE)
-    try:
-        data_rows = db.execute("SELECT info_json FROM Main WHERE user_id = ?", user_id)
-    finally:
-        db._disconnect()
 
     initiate_prompt = "You are now connected to a new user, you may start the conversation now"
-    if data_rows and data_rows[0]['info_json']:
-        try:
-            decrypted_data = fernet.decrypt(data_rows[0]['info_json']).decode('utf-8')
-            user_info = json.loads(decrypted_data)
+    try:
+        with metrics.span('profile_load'):
+            user_info = load_profile(user_id)
+    except Exception as e:
+        print(f"Error decrypting data for user {user_id}: {e}")
+        initiate_prompt = f"There was an error fetching the data, you may start by sayin : Hi {session.get('username')}, I had some trouble retrieving your previous information, but I'm here to help. How can I assist you today?"
+    else:
+        if user_info is not None:
             initiate_prompt = f"You're connected to an existing user: {session.get('username')}. Current info: {user_info}. Your tone should be warm and friendly. Start with a personalized, professional greeting. Do not list all details unless necessary or asked by the user. Start by asking something like, 'hello, {session.get('username')}, how may I help you today?'. There is a high chance that the user is here to get some specific information updated, so, based on the response of the user, you should gather the necessary data and the data that you don't have instead of startiung the interview from scratch."
-        except Exception as e:
-            print(f"Error decrypting data for user {user_id}: {e}")
-            initiate_prompt = f"There was an error fetching the data, you may start by sayin : Hi {session.get('username')}, I had some trouble retrieving your previous information, but I'm here to help. How can I assist you today?"
-            
-    conversation_history = session.get('conversation_history', [])
-    prompt = [{'role' : 'system', 'content' : admin_prompt + initiate_prompt}]
-    
+
+    return [{'role' : 'system', 'content' : admin_prompt + initiate_prompt}]
+
+# --- Greetings ---
+# Generated speculatively at login; /initiate reuses the result or waits for it. The worker
+# that generates a greeting keeps its future; its text also goes to the session store (the
+# audio is in the shared TTS cache), so /initiate can use it from any worker process.
+GREETING_PREFETCH = os.getenv('GREETING_PREFETCH', '1') == '1'
+greetings = GreetingCache(max_entries=int(os.getenv('GREETING_CACHE_SIZE', '256')),
+                          ttl=float(os.getenv('GREETING_TTL', '600')))
+# How long another worker waits on a greeting still being generated before taking it as lost
+GREETING_PENDING_TIMEOUT = 60.0
+
+async def generate_greeting(messages):
+    """
+    Like generate_turn, but raises LLMError instead of falling back, so a failed greeting is
+    not kept.
+    """
+    reply_text = await llm.chat_async(messages)
+    return (reply_text, *await synthesize(reply_text))
+
+async def share_greeting(user_id, messages):
+    """generate_greeting, publishing its progress and result to the other worker processes."""
+    digest = prompt_digest(messages)
     try:
-        payload = {'model': OLLAMA_MODEL, 'messages': prompt, 'stream': False}
-        llm_resp = requests.post(OLLAMA_URL, json=payload, timeout=60)
-        llm_resp.raise_for_status()
-        reply_text = llm_resp.json()['message']['content']
-    except requests.exceptions.RequestException as e:
-        print(f"Ollama API error on initiation: {e}")
-        reply_text = "I'm sorry, I'm having trouble connecting right now. Please try again in a moment."
+        greeting = await generate_greeting(messages)
+    except BaseException:
+        await asyncio.to_thread(app.session_interface.drop_greeting, user_id, digest)
+        raise
+    await asyncio.to_thread(app.session_interface.put_greeting, user_id, digest, greeting[0])
+    return greeting
+
+def prefetch_greeting():
+    user_id, prompt = session['user_id'], build_initiate_prompt()
+
+    def generate():
+        app.session_interface.put_greeting(user_id, prompt_digest(prompt))
+        return llm.submit(share_greeting(user_id, prompt))
+    greetings.start(user_id, prompt, generate)
+
+def shared_greeting(user_id, messages, cancelled=None):
+    """
+    Returns (reply_text, mp3_bytes, pcm) of the greeting another worker process generated at
+    login for exactly `messages`, waiting while it is still being generated. Returns None
+    if there is none, it failed or expired, or `cancelled` was set while waiting.
+    """
+    digest = prompt_digest(messages)
+    with metrics.span('greeting_wait'):
+        while True:
+            found = app.session_interface.get_greeting(user_id, digest)
+            if found is None:
+                return None
+            reply_text, updated_at = found
+            if reply_text is not None:
+                break
+            if time.time() - updated_at > GREETING_PENDING_TIMEOUT or (cancelled is not None and cancelled.is_set()):
+                return None
+            time.sleep(0.1)
+    if time.time() - updated_at > greetings.ttl:
+        return None
+    # Normally a TTS cache hit; synthesized again if it was evicted
+    cached = tts_cache.get(tts_key(reply_text))
+    return (reply_text, *(cached or llm.run(synthesize(reply_text))))
+
+def precomputed_greeting(user_id, messages, cancelled=None):
+    """
+    Returns (reply_text, mp3_bytes, pcm) of the greeting started at login for exactly
+    `messages`, waiting for it if it is still being generated. Returns None if there is
+    none, it failed, or `cancelled` was set while waiting.
+    """
+    future = greetings.get(user_id, messages)
+    if future is None:
+        return shared_greeting(user_id, messages, cancelled)
+    try:
+        with metrics.span('greeting_wait'):
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except concurrent.futures.TimeoutError:
+                    if cancelled is not None and cancelled.is_set():
+                        return None
+    except (LLMError, concurrent.futures.CancelledError) as e:
+        print(f"Precomputed greeting failed, generating it again: {e}")
+        return None
+
+def initiate_events(messages, user_id, recording_path, cancelled=None):
+    """
+    The events of the greeting, as reply_events: the precomputed greeting as one segment if
+    there is one, otherwise generated now.
+    """
+    greeting = precomputed_greeting(user_id, messages, cancelled)
+    if cancelled is not None and cancelled.is_set():
+        yield {'type': 'cancelled', 'reply_text': ''}
+        return
+    if greeting is None:
+        yield from reply_events(messages, recording_path, INITIATE_FALLBACK_REPLY, cancelled)
+        return
+    reply_text, tts_audio_bytes, pcm = greeting
+    yield {'type': 'segment', 'text': reply_text, 'audio': tts_audio_bytes}
+    record_clip(recording_path, pcm)
+    yield {'type': 'done', 'reply_text': reply_text}
 
+def start_chat():
+    conversation_history = session.get('conversation_history', [])
+    prompt = build_initiate_prompt()
+    
+    greeting = precomputed_greeting(session['user_id'], prompt)
+    reply_text, _, pcm = greeting or llm.run(generate_turn(prompt, INITIATE_FALLBACK_REPLY))
+    record_clip(session.get('recording_path'), pcm)
     conversation_history.append({'role':'assistant','content':reply_text})
+    log_turn(session['user_id'], session.get('conversation_id'), len(conversation_history) - 1, 'assistant', reply_text)
     
-    bot_wav_name = safe_filename('bot')
-    bot_wav_path = os.path.join(AUDIO_LOG_DIR, bot_wav_name)
-    tts_audio_bytes = await generate_speech_bytes(reply_text)
-
-    if tts_audio_bytes:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tf:
-            tf.write(tts_audio_bytes)
-            temp_mp3_path = tf.name
-        try:
-            ffmpeg.input(temp_mp3_path).output(bot_wav_path, ar=16000, ac=1).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-            audio_paths = session.get('audio_paths', [])
-            audio_paths.append(bot_wav_path)
-            session['audio_paths'] = audio_paths
-        except ffmpeg.Error as e:
-            print(f"FFMPEG error: {e.stderr.decode()}")
-        finally:
-            if os.path.exists(temp_mp3_path):
-                 os.remove(temp_mp3_path)
-    else:
-        bot_wav_name = None # No audio to play
-
     session['conversation_history'] = conversation_history
-    return jsonify({'reply_text': reply_text, 'reply_audio_url': f'/reply_audio/{bot_wav_name}' if bot_wav_name else ''})
+    return jsonify({'reply_text': reply_text, 'reply_audio_url': f'/reply_audio/{tts_key(reply_text)}' if pcm else ''})
 
 @app.route('/speech', methods=['POST'])
 def speech_path():
     if 'user_id' not in session:
         return jsonify({"error": "Not authenticated"}), 401
-    return asyncio.get_event_loop().run_until_complete(speech())
+    return speech()
 
-async def speech():
-    if 'audio' not in request.files:
-        return jsonify({"error": "No audio file found"}), 400
+@app.route('/speech_stream', methods=['POST'])
+def speech_stream():
+    if 'user_id' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
 
-    audio = request.files['audio']
-    
-    # --- Start of Changes ---
-    
-    # 1. Define a permanent path for the user's audio
-    user_wav_name = safe_filename('user')
-    user_wav_path = os.path.join(AUDIO_LOG_DIR, user_wav_name)
-    
-    # Get the current audio paths from the session
-    audio_paths = session.get('audio_paths', [])
+    user_text, error_response = transcribe_request_audio()
+    if error_response:
+        return error_response
+    if user_text is None:
+        return event_stream_response(iter([sse_event({'type': 'no_speech'})]))
 
-    temp_webm_path = None
+    conversation_history = session.get('conversation_history', [])
+    conversation_history.append({'role':'user', 'content': user_text})
+    session['conversation_history'] = conversation_history
+    user_id, conversation_id, seq = session['user_id'], session.get('conversation_id'), len(conversation_history) - 1
+    log_turn(user_id, conversation_id, seq, 'user', user_text)
+    prompt = build_chat_prompt(conversation_history, session.sid)
+    session_id, recording_path = session.sid, session.get('recording_path')
+    reply = with_turn_extraction(reply_events(prompt, recording_path, LLM_FALLBACK_REPLY), conversation_id,
+                                 user_id, conversation_history, seq)
+    on_reply = functools.partial(log_turn, user_id, conversation_id, seq + 1, 'assistant')
+
+    def events():
+        yield sse_event({'type': 'user_text', 'text': user_text})
+        yield from stream_reply(reply, session_id, on_reply)
+
+    return event_stream_response(events())
+
+def recognize_pcm(pcm):
+    recognizer = asr_backend.stream()
+    recognizer.feed(pcm)
+    return recognizer.finish()
+
+def transcribe_audio(data, recording_path):
+    """
+    Decodes a whole utterance (the browser's webm) to 16 kHz PCM, trims the silence around the
+    speech, appends the speech to the session recording and transcribes it. Returns None if
+    the clip holds no speech. Raises transcode.TranscodeError if the audio cannot be decoded.
+    """
+    # Decode in memory; the same PCM feeds the recording and the recognizer
+    with metrics.span('asr_decode'):
+        pcm = transcode.decode_to_pcm(data)
+    with metrics.span('vad'):
+        pcm = vad.trim(pcm)
+    if not pcm:
+        return None
+    record_clip(recording_path, pcm)
     try:
-        # Save incoming audio to a temporary webm file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
-            audio.save(temp_webm.name)
-            temp_webm_path = temp_webm.name
+        with metrics.span('asr'):
+            user_text = recognize_pcm(pcm)
+        return user_text or EMPTY_AUDIO_TEXT
+    except asr.ASRError as e:
+        print(f"Speech recognition error: {e}")
+        return ASR_FAILED_TEXT
 
-        # Convert the temporary webm to our permanent wav file
-        ffmpeg.input(temp_webm_path).output(user_wav_path, ar=16000, ac=1).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-        
-        # 2. Add the new user audio path to our list for later processing
-        audio_paths.append(user_wav_path)
-        session['audio_paths'] = audio_paths # Save it back to the session
-
-        # Now, use the newly created file for speech recognition
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(user_wav_path) as source:
-            audio_data = recognizer.record(source)
-            user_text = recognizer.recognize_google(audio_data, language='en-US')
-
-    # --- End of Changes ---
-
-    except sr.UnknownValueError:
-        user_text = '(User audio was empty or indecipherable)'
-    except sr.RequestError as e:
-        user_text = '(Speech recognition service failed)'
-        print(f"Google Speech API error: {e}")
-    except ffmpeg.Error as e:
-        print(f"FFMPEG error during conversion: {e.stderr.decode()}")
-        # If conversion fails, remove the failed user audio path from the list
-        if user_wav_path in audio_paths:
-            audio_paths.remove(user_wav_path)
-            session['audio_paths'] = audio_paths
-        return jsonify({"error": "Failed to process audio"}), 500
+def finish_transcription(transcriber, recording_path):
+    """
+    Ends an utterance that was transcribed while it was uploaded and appends its speech to the
+    session recording. Returns None if the utterance holds no speech. Raises
+    transcode.TranscodeError if the audio cannot be decoded.
+    """
+    # Most of the decoding and recognition already happened during the upload
+    with metrics.span('asr_decode'):
+        pcm = transcriber.finish()
+    with metrics.span('vad'):
+        pcm = vad.trim(pcm)
+    if not pcm:
+        return None
+    record_clip(recording_path, pcm)
+    try:
+        with metrics.span('asr'):
+            # A backend that only buffered the upload is sent just the speech
+            user_text = transcriber.transcript() if asr_backend.streaming else recognize_pcm(pcm)
+        return user_text or EMPTY_AUDIO_TEXT
+    except asr.ASRError as e:
+        print(f"Speech recognition error: {e}")
+        return ASR_FAILED_TEXT
+
+def transcribe_request_audio():
+    """
+    Transcribes the uploaded audio file. Returns (user_text, None) or (None, error_response),
+    and (None, None) if it holds no speech.
+    """
+    if 'audio' not in request.files:
+        return None, (jsonify({"error": "No audio file found"}), 400)
+
+    try:
+        user_text = transcribe_audio(request.files['audio'].read(), session.get('recording_path'))
+    except transcode.TranscodeError as e:
+        print(f"Error during audio conversion: {e}")
+        return None, (jsonify({"error": "Failed to process audio"}), 500)
     except Exception as e:
         print(f"An unexpected error occurred during speech recognition: {e}")
-        return jsonify({"error": "An unexpected error occurred"}), 500
-    finally:
-        # We only need to clean up the temporary webm file now
-        if temp_webm_path and os.path.exists(temp_webm_path):
-             os.remove(temp_webm_path)
+        return None, (jsonify({"error": "An unexpected error occurred"}), 500)
+
+    return user_text, None
+
+def speech():
+    user_text, error_response = transcribe_request_audio()
+    if error_response:
+        return error_response
+    if user_text is None:
+        return jsonify({'no_speech': True, 'user_text': '', 'reply_text': '', 'reply_audio_url': ''})
     
-    # The rest of the function remains the same...
     conversation_history = session.get('conversation_history', [])
     conversation_history.append({'role':'user', 'content': user_text})
-    prompt = [{'role' : 'system', 'content' : admin_prompt}] + conversation_history
+    user_id, conversation_id, seq = session['user_id'], session.get('conversation_id'), len(conversation_history) - 1
+    log_turn(user_id, conversation_id, seq, 'user', user_text)
+    prompt = build_chat_prompt(conversation_history, session.sid)
     
-    reply_text = 'Sorry, there was an error with the local LLM.'
-    try:
-        payload = {'model': OLLAMA_MODEL, 'messages': prompt, 'stream': False}
-        llm_resp = requests.post(OLLAMA_URL, json=payload, timeout=60)
-        llm_resp.raise_for_status()
-        reply_text = llm_resp.json()['message']['content']
-    except requests.requests.exceptions.RequestException as e:
-        print(f"Ollama API error: {e}")
-
+    reply_text, _, pcm = llm.run(generate_turn(prompt, LLM_FALLBACK_REPLY))
+    record_clip(session.get('recording_path'), pcm)
+    queue_turn_extraction(conversation_id, user_id, conversation_history, seq, reply_text)
     conversation_history.append({'role':'assistant','content':reply_text})
+    log_turn(user_id, conversation_id, seq + 1, 'assistant', reply_text)
     
-    bot_wav_name = safe_filename('bot')
-    bot_wav_path = os.path.join(AUDIO_LOG_DIR, bot_wav_name)
-    tts_audio_bytes = await generate_speech_bytes(reply_text)
-
-    if tts_audio_bytes:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tf:
-            tf.write(tts_audio_bytes)
-            temp_mp3_path = tf.name
-        try:
-            ffmpeg.input(temp_mp3_path).output(bot_wav_path, ar=16000, ac=1).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-            # This is where the bot's audio path is added
-            audio_paths = session.get('audio_paths', [])
-            audio_paths.append(bot_wav_path)
-            session['audio_paths'] = audio_paths
-        except ffmpeg.Error as e:
-            print(f"FFMPEG error creating bot audio: {e.stderr.decode()}")
-        finally:
-            if os.path.exists(temp_mp3_path): os.remove(temp_mp3_path)
-    else:
-        bot_wav_name = None
-
     session['conversation_history'] = conversation_history
     return jsonify({
         'user_text': user_text, 'reply_text': reply_text,
-        'reply_audio_url': f'/reply_audio/{bot_wav_name}' if bot_wav_name else ''
+        'reply_audio_url': f'/reply_audio/{tts_key(reply_text)}' if pcm else ''
     })
 
-@app.route('/reply_audio/<filename>')
-def reply_audio(filename):
-    file_path = os.path.join(AUDIO_LOG_DIR, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, mimetype='audio/wav')
-    else:
-        return jsonify({"error": "File not found"}), 404
+# --- Voice Channel ---
+class VoiceChannel:
+    """
+    One full-duplex conversation over the /voice WebSocket. While the user speaks the browser
+    sends mic audio as binary frames, which are decoded and transcribed as they arrive, and it
+    controls the turn with JSON messages:
+        {"type": "start"}             reset the conversation and greet the user
+        {"type": "end_of_utterance"}  the audio sent since the last utterance is complete
+        {"type": "cancel_utterance"}  drop the audio sent since the last utterance
+        {"type": "interrupt"}         stop the reply being spoken (barge-in)
+        {"type": "end"}               stop the reply, store the session and answer 'ended'
+    The server answers with the events of the SSE routes, plus 'partial_text' with the
+    transcript so far while the user is speaking. Nothing is written to the session after
+    'ended', so the browser saves the conversation (/cleanup) only once it has it. A segment with audio carries its size
+    in `audio_bytes` and is followed by one binary frame holding the mp3. A reply cut short ends
+    with 'cancelled' instead of 'done', and only the sentences already sent enter the history.
+    """
+
+    def __init__(self, ws, session):
+        self.ws = ws
+        self.session = session
+        self.transcriber = None
+        self.cancelled = threading.Event()
+        self.reply_thread = None
+        self.send_lock = threading.Lock()
 
-def process_and_save_conversation(app_context, conversation_history, audio_paths, initial_time_str, user_id, uname):
+    def run(self):
+        try:
+            while True:
+                message = self.ws.receive()
+                if isinstance(message, bytes):
+                    if self.transcriber is None:
+                        self.transcriber = asr.Transcriber(asr_backend, on_partial=self.on_partial)
+                    self.transcriber.write(message)
+                    continue
+                try:
+                    kind = json.loads(message).get('type')
+                except (ValueError, AttributeError):
+                    kind = None
+                if kind == 'start':
+                    self.start()
+                elif kind == 'end_of_utterance':
+                    self.end_of_utterance()
+                elif kind == 'cancel_utterance':
+                    self.drop_utterance()
+                elif kind == 'interrupt':
+                    self.interrupt()
+                elif kind == 'end':
+                    self.end()
+                    return
+                else:
+                    self.send({'type': 'error', 'message': 'Unknown message'})
+        except ConnectionClosed:
+            pass
+        finally:
+            self.drop_utterance()
+            self.interrupt()
+
+    def on_partial(self, text):
+        self.send({'type': 'partial_text', 'text': text})
+
+    def drop_utterance(self):
+        if self.transcriber is not None:
+            self.transcriber.abort()
+            self.transcriber = None
+
+    def send(self, event, audio=None):
+        # The reply thread and the receiving thread both send; frames must not interleave
+        with self.send_lock:
+            try:
+                self.ws.send(json.dumps(event))
+                if audio:
+                    self.ws.send(audio)
+            except ConnectionClosed:
+                self.cancelled.set()
+
+    def interrupt(self):
+        """Stops the current reply, if any, and waits until its turn is in the history."""
+        if self.reply_thread is not None:
+            self.cancelled.set()
+            self.reply_thread.join()
+            self.reply_thread = None
+
+    def end(self):
+        """Finishes the conversation on this channel: the reply in progress is cut short and kept."""
+        self.drop_utterance()
+        self.interrupt()
+        app.session_interface.persist(self.session)
+        self.send({'type': 'ended'})
+
+    def start(self):
+        self.interrupt()
+        self.drop_utterance()
+        reset_conversation()
+        app.session_interface.persist(self.session)
+        self.speak(functools.partial(initiate_events, build_initiate_prompt(), self.session['user_id'],
+                                     self.session.get('recording_path')))
+
+    def end_of_utterance(self):
+        self.interrupt()
+        transcriber, self.transcriber = self.transcriber, None
+        if transcriber is None:
+            self.send({'type': 'error', 'message': 'No audio received'})
+            return
+        try:
+            user_text = finish_transcription(transcriber, self.session.get('recording_path'))
+        except transcode.TranscodeError as e:
+            print(f"Error during audio conversion: {e}")
+            self.send({'type': 'error', 'message': 'Failed to process audio'})
+            return
+        if user_text is None:
+            self.send({'type': 'no_speech'})
+            return
+        self.send({'type': 'user_text', 'text': user_text})
+
+        conversation_history = self.session.get('conversation_history', [])
+        conversation_history.append({'role': 'user', 'content': user_text})
+        self.session['conversation_history'] = conversation_history
+        app.session_interface.persist(self.session)
+        user_id, conversation_id, seq = self.session['user_id'], self.session.get('conversation_id'), len(conversation_history) - 1
+        log_turn(user_id, conversation_id, seq, 'user', user_text)
+        prompt = build_chat_prompt(conversation_history, self.session.sid)
+        recording_path = self.session.get('recording_path')
+        self.speak(lambda cancelled: with_turn_extraction(
+            reply_events(prompt, recording_path, LLM_FALLBACK_REPLY, cancelled), conversation_id,
+            user_id, conversation_history, seq))
+
+    def speak(self, make_events):
+        """Plays a reply on a new thread; `make_events(cancelled)` returns its events."""
+        self.cancelled = threading.Event()
+        self.reply_thread = threading.Thread(target=self._reply, name='voice-reply', daemon=True,
+                                             args=(make_events, self.cancelled))
+        self.reply_thread.start()
+
+    def _reply(self, make_events, cancelled):
+        for event in make_events(cancelled):
+            if event['type'] == 'segment':
+                audio = event['audio']
+                self.send({'type': 'segment', 'text': event['text'], 'mime': TTS_MIMETYPE,
+                           'audio_bytes': len(audio)}, audio)
+            else:
+                if event['reply_text']:
+                    conversation_history = self.session.get('conversation_history', [])
+                    conversation_history.append({'role': 'assistant', 'content': event['reply_text']})
+                    self.session['conversation_history'] = conversation_history
+                    app.session_interface.persist(self.session)
+                    log_turn(self.session['user_id'], self.session.get('conversation_id'), len(conversation_history) - 1,
+                             'assistant', event['reply_text'])
+                self.send(event)
+
+@sock.route('/voice')
+def voice(ws):
+    if 'user_id' not in session:
+        ws.close(1008, 'Not authenticated')
+        return
+    # Browsers send the session cookie on cross-site WebSocket connections too
+    origin = request.headers.get('Origin')
+    if origin and urlparse(origin).netloc != request.host:
+        ws.close(1008, 'Cross-origin connection refused')
+        return
+    VoiceChannel(ws, session._get_current_object()).run()
+
+@app.route('/llm_stats')
+def llm_stats():
+    return jsonify(llm.stats())
+
+@app.route('/tts_stats')
+def tts_stats():
+    return jsonify(tts_cache.stats())
+
+@app.route('/context_stats')
+def context_stats():
+    return jsonify(context_window.stats())
+
+@app.route('/profile_cache_stats')
+def profile_cache_stats():
+    return jsonify(profile_cache.stats())
+
+@app.route('/extraction_stats')
+def extraction_stats():
+    return jsonify(fast_path.stats())
+
+@app.route('/reply_audio/<key>')
+def reply_audio(key):
+    """
+    Serves a bot reply as the mp3 edge-tts produced, straight from the TTS cache, to logged-in
+    users. The key is the TTS cache key, sha256 of (voice, text, format), so a URL always
+    names the same audio: it can be cached for good and revalidated by ETag. Range requests
+    are answered for seeking, and a file on disk is handed to the server's file wrapper
+    (sendfile where supported) instead of being read into memory.
+    """
+    if 'user_id' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    path = tts_cache.audio_path(key)
+    try:
+        response = send_file(path, mimetype=TTS_MIMETYPE, conditional=True, etag=key, max_age=REPLY_AUDIO_MAX_AGE) if path else None
+    except FileNotFoundError:
+        response = None  # evicted since the lookup
+    if response is None:
+        cached = tts_cache.get(key)
+        if not cached or not cached[0]:
+            return jsonify({"error": "File not found"}), 404
+        response = send_file(io.BytesIO(cached[0]), mimetype=TTS_MIMETYPE, conditional=True, etag=key,
+                             max_age=REPLY_AUDIO_MAX_AGE)
+    # Replies can contain the user's details, so only the browser may keep a copy
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+def process_and_save_conversation(app_context, conversation_history, recording_path, initial_time_str, user_id,
+                                  conversation_id=None):
     with app_context:
-        print(f"Background thread started for user_id: {user_id}")
+        print(f"Background job started for user_id: {user_id}")
         if not conversation_history:
             print("No conversation to save.")
             return
 
-        try:
-            if audio_paths:
-                # --- Create a directory for the silence file ---
-                tmp_dir = os.path.join(os.path.dirname(__file__), 'silence')
-                os.makedirs(tmp_dir, exist_ok=True)
-                silence_path = os.path.join(tmp_dir, 'silence.wav')
-
-                # --- ** NEW: Generate the silent audio file if it doesn't exist ** ---
-                if not os.path.exists(silence_path):
-                    print("Generating silence.wav...")
-                    try:
-                        # FIXED: Use correct parameter for silence duration
-                        ffmpeg.input('anullsrc', format='lavfi').output(
-                            silence_path, t=0.5, ar=16000, ac=1
-                        ).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-                    except ffmpeg.Error as e:
-                        print(f"Failed to generate silence file: {e.stderr.decode()}")
-                        # If silence generation fails, we cannot proceed with concatenation
-                        return
-                
-                # --- Proceed with concatenation ---
-                with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.txt') as f_list:
-                    for idx, path in enumerate(audio_paths):
-                        if os.path.exists(path):
-                            # Add a silent gap before every clip except the first one
-                            if idx > 0:
-                                f_list.write(f"file '{silence_path}'\n")
-                            f_list.write(f"file '{path}'\n")
-                    filelist_path = f_list.name
-
-                if os.path.getsize(filelist_path) > 0:
-                    final_wav_name = safe_filename(f'{uname}_processed')
-                    final_path = os.path.join(AUDIO_LOG_DIR, final_wav_name)
-                    
-                    try:
-                        ffmpeg.input(
-                            filelist_path, format='concat', safe=0
-                        ).output(
-                            final_path, ar=16000, ac=1
-                        ).overwrite_output().run(capture_stdout=True, capture_stderr=True)
-                        print("Audio files merged successfully.")
-                    except ffmpeg.Error as e:
-                        print(f"Error during audio concatenation: {e.stderr.decode()}")
-
-                    os.remove(filelist_path)
-                    for path in audio_paths:
-                        if os.path.exists(path):
-                            os.remove(path)
-                    print("Temporary audio files cleaned up.")
-                else:
-                    print("File list was empty. Skipping concatenation.")
+        # The recording was built turn by turn, closing it only finalizes the header
+        if recording_path:
+            with metrics.span('recording_finalize'):
+                finalized = SessionRecorder(recording_path).close()
+            if finalized:
+                print(f"Session recording finalized: {recording_path}")
+                with metrics.span('recording_archive'):
+                    archived = audio_store.archive(finalized)
+                if archived:
+                    print(f"Session recording compressed: {archived}")
+            else:
+                print("No audio was recorded for this session.")
 
-        except Exception as e:
-            print(f'Error during audio processing in background thread: {e}')
+        # --- Data Extraction and Database Saving ---
+        # An unreachable Ollama raises LLMError out of here so the job queue retries it
+        print("Extracting user data in background job.")
+        with metrics.span('extraction'):
+            if INCREMENTAL_EXTRACTION and conversation_id:
+                user_data = merge_conversation_turns(conversation_id, user_id, conversation_history)
+            else:
+                user_data = extract_user_data(conversation_history)
 
-        # --- Data Extraction and Database Saving (Unchanged) ---
         try:
-            print("Extracting user data in background thread.")
-            user_data = extract_user_data(conversation_history)
-            
-            db = SQL(DB_FILE)
+            initial_time = datetime.datetime.fromisoformat(initial_time_str)
+            end_time = datetime.datetime.now(datetime.timezone.utc)
+            duration = (end_time - initial_time).total_seconds()
+
+            json_data = {}
             try:
-                initial_time = datetime.datetime.fromisoformat(initial_time_str)
-                end_time = datetime.datetime.now(datetime.timezone.utc)
-                duration = (end_time - initial_time).total_seconds()
-
-                rows = db.execute("SELECT info_json FROM Main WHERE user_id = ?", user_id)
-                json_data = {}
-                if rows and rows[0]['info_json']:
-                    try:
-                        decrypted = fernet.decrypt(rows[0]['info_json'])
-                        json_data = json.loads(decrypted.decode('utf-8'))
-                    except Exception as e:
-                        print(f"Could not decrypt/parse existing data for UID {user_id}: {e}")
-                
-                for k, v in user_data.items():
-                    if v and v.strip().lower() not in ['none', '']:
-                        json_data[k] = v
-
-                if not json_data:
-                    print("No new data extracted, nothing to save.")
-                    return
+                json_data = load_profile(user_id) or {}
+            except Exception as e:
+                print(f"Could not decrypt/parse existing data for UID {user_id}: {e}")
+            
+            for k, v in user_data.items():
+                if not extraction.is_missing(v):
+                    json_data[k] = v
 
-                json_str = json.dumps(json_data)
-                encrypted_json = fernet.encrypt(json_str.encode('utf-8'))
-                now_str = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            if not json_data:
+                print("No new data extracted, nothing to save.")
+                if conversation_id:
+                    db.finish_turn_profiles(conversation_id, time.time())
+                return
 
-                if rows:
-                    db.execute('UPDATE Main SET duration = ?, info_json = ?, start_time = ?, end_time = ?, updated_at = ? WHERE user_id = ?',
-                               str(duration), encrypted_json, initial_time.strftime('%Y-%m-%d %H:%M:%S'), end_time.strftime('%Y-%m-%d %H:%M:%S'), now_str, user_id)
-                else:
-                    db.execute('INSERT INTO Main (user_id, info_json, start_time, end_time, duration, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
-                               user_id, encrypted_json, initial_time.strftime('%Y-%m-%d %H:%M:%S'), end_time.strftime('%Y-%m-%d %H:%M:%S'), str(duration), now_str)
+            json_str = json.dumps(json_data)
+            encrypted_json = fernet.encrypt(json_str.encode('utf-8'))
+            now_str = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+            with metrics.span('profile_save'):
+                db.upsert_profile(user_id, encrypted_json, initial_time.strftime('%Y-%m-%d %H:%M:%S'),
+                                  end_time.strftime('%Y-%m-%d %H:%M:%S'), str(duration), now_str)
+            if conversation_id:
+                db.finish_turn_profiles(conversation_id, time.time())
+            # Write-through, so the next /initiate sees the new data without a DB read
+            profile_cache.put(user_id, json_data)
+            # The next login greets the user with the new profile
+            greetings.invalidate(user_id)
+            app.session_interface.drop_greeting(user_id)
 
-                print(f"Conversation history saved to database for user_id: {user_id}.")
-            finally:
-                db._disconnect()
+            print(f"Conversation history saved to database for user_id: {user_id}.")
         except Exception as e:
-            print(f"Error during database operation in background thread: {e}")
+            print(f"Error during database operation in background job: {e}")
+
+def save_conversation_job(payload):
+    # Like a turn's text, the transcript is kept encrypted in jobs.db; jobs queued before it
+    # was still carry it in plain text
+    if 'conversation' in payload:
+        conversation_history = json.loads(fernet.decrypt(payload['conversation'].encode('ascii')))
+    else:
+        conversation_history = payload['conversation_history']
+    process_and_save_conversation(app.app_context(), conversation_history, payload['recording_path'],
+                                  payload['initial_time'], payload['user_id'], payload.get('conversation_id'))
+
+def purge_turn_profiles():
+    db.purge_turn_profiles(time.time() - TURN_PROFILE_RETENTION)
+
+# --- Background Jobs ---
+# Session-end processing runs on a fixed pool of workers fed from a durable SQLite queue
+# Saves are admitted and claimed ahead of turn extractions: a dropped turn job costs nothing,
+# because the save extracts the turns that have no result yet
+job_queue = JobQueue(JOBS_DB, max_queued=int(os.getenv('JOB_MAX_QUEUED', '100')))
+job_queue.register('save_conversation', save_conversation_job, retry_on=(LLMError,), priority=1)
+job_queue.register('extract_turn', extract_turn_job, retry_on=(LLMError,),
+                   max_queued=int(os.getenv('JOB_MAX_QUEUED_TURNS', '100')))
+# Abandoned recordings are the ones no save ever reaches, so maintenance runs on a timer
+job_queue.every(audio_store.sweep_interval, audio_store.sweep)
+job_queue.every(3600, purge_turn_profiles)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+
+# --- Warm-Up and Readiness ---
+# Importing the app starts no threads, so serve.py can import it once and fork workers from
+# it. Each process starts its background threads when it begins serving: the warm-up, unless
+# the parent already ran it, and the job workers, which serve.py runs in a process of their
+# own so that their number and their share of Ollama don't grow with the web workers.
+readiness = {'warm': False, 'model': 'not loaded'}
+background = {'pid': None}
+background_lock = threading.Lock()
+
+def warm_up():
+    """
+    Loads the model into Ollama, kept for OLLAMA_KEEP_ALIVE, and synthesizes the fixed
+    phrases into the TTS cache. Blocks until both are done; failures are logged and left to
+    the first request that needs them.
+    """
+    start = time.perf_counter()
+    try:
+        llm.run(llm.load_model_async(OLLAMA_LOAD_TIMEOUT), OLLAMA_LOAD_TIMEOUT + 5)
+        readiness['model'] = 'loaded'
+        print(f"Loaded {OLLAMA_MODEL} in {time.perf_counter() - start:.1f}s.")
+    except LLMError as e:
+        readiness['model'] = 'unavailable'
+        print(f"Could not load {OLLAMA_MODEL}: {e}")
+    if TTS_PREWARM:
+        try:
+            llm.run(prewarm_tts(TTS_PREWARM_PHRASES), 60)
+        except LLMError as e:
+            print(f"TTS pre-warm did not finish: {e}")
+    readiness['warm'] = True
+
+def start_background(jobs=True):
+    """
+    Starts this process's job workers (unless `jobs` is false), and the warm-up if it has not
+    run, once per process. Threads do not survive a fork, so a worker forked after the import
+    starts its own here.
+    """
+    if background['pid'] == os.getpid():
+        return
+    with background_lock:
+        if background['pid'] == os.getpid():
+            return
+        background['pid'] = os.getpid()
+    if jobs:
+        job_queue.start(workers=JOB_WORKERS)
+    if not readiness['warm']:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def before_fork():
+    """
+    Closes what forked workers must not share with the parent: the LLM client's loop and
+    connections, and this thread's SQLite connections. Each worker reopens its own. The
+    forked processes hold LLM_MAX_IN_FLIGHT between them, through lock files in DATA_DIR.
+    """
+    llm.close()
+    llm.share_slots(LLM_SLOTS_DIR)
+    db.close()
+    app.session_interface.disconnect()
+    audio_store.disconnect()
+    job_queue.disconnect()
+
+@app.before_request
+def ensure_background():
+    # Covers servers that import the app without calling start_background() themselves
+    start_background()
+
+# --- Metrics ---
+metrics.add_stats('llm', llm.stats)
+metrics.add_stats('tts_cache', tts_cache.stats)
+metrics.add_stats('profile_cache', profile_cache.stats)
+metrics.add_stats('context', context_window.stats)
+metrics.add_stats('jobs', job_queue.stats)
+metrics.add_stats('audio', audio_store.stats)
+metrics.add_stats('greetings', greetings.stats)
+metrics.add_stats('vad', vad.stats)
+metrics.add_stats('fast_path', fast_path.stats)
+metrics.add_stats('transcript', transcript.stats)
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def finish_request_timing(response):
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.request_seconds.observe(elapsed, endpoint, request.method, response.status_code)
+    # A streamed response's later stages are only in the histograms, its headers are already sent
+    timing = metrics.server_timing()
+    response.headers['Server-Timing'] = f'{timing}, total;dur={elapsed * 1000:.1f}' if timing else f'total;dur={elapsed * 1000:.1f}'
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/status')
+def jobs_status():
+    return jsonify(job_queue.stats())
+
+@app.route('/ready')
+def ready():
+    # Readiness probe: 503 until this process has warmed up, or while the database is unreachable
+    try:
+        db.execute('SELECT 1')
+        database = True
+    except (sqlite3.Error, queue.Empty) as e:
+        print(f"Readiness check could not reach the database: {e}")
+        database = False
+    is_ready = readiness['warm'] and database
+    return jsonify({'ready': is_ready, 'model': readiness['model'], 'database': database,
+                    'pid': os.getpid()}), 200 if is_ready else 503
 
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
     if 'user_id' not in session:
         return jsonify({"status": "error", "message": "User not logged in"}), 401
 
-    print("Cleanup route called. Starting background processing.")
+    print("Cleanup route called. Queueing background processing.")
     
     conversation_history = session.get('conversation_history', []).copy()
     initial_time = session.get('initial_time')
     user_id = session.get('user_id')
-    audio_paths = session.get('audio_paths', []).copy()  # FIX: Create a copy of audio paths
-    user_name = session.get('username')
-
-    if conversation_history and initial_time and user_id and audio_paths:
-        background_task = threading.Thread(
-            target=process_and_save_conversation,
-            args=(app.app_context(), conversation_history, audio_paths, initial_time, user_id, user_name)
-        )
-        background_task.start()
+    recording_path = session.get('recording_path')
+
+    if conversation_history and initial_time and user_id:
+        try:
+            job_queue.enqueue('save_conversation', {
+                'conversation': fernet.encrypt(json.dumps(conversation_history).encode('utf-8')).decode('ascii'),
+                'recording_path': recording_path,
+                'initial_time': initial_time, 'user_id': user_id, 'conversation_id': session.get('conversation_id'),
+            })
+            if recording_path:
+                audio_store.close(recording_path)
+        except QueueFull as e:
+            # Keep the session so the client can retry the save
+            print(f"Cleanup rejected, job queue is full: {e}")
+            return jsonify({"status": "error", "message": "Server is busy, please try again shortly."}), 503, {'Retry-After': '30'}
     else:
         print("Cleanup skipped: no conversation history to save.")
 
-    # DO NOT DELETE AUDIO FILES HERE - background thread handles deletion
-    session.pop('audio_paths', None)
+    session.pop('recording_path', None)
     session.pop('conversation_history', None)
     session.pop('initial_time', None)
+    session.pop('conversation_id', None)
     
-    return jsonify({"status": "Cleanup process started and session cleared."})
+    return jsonify({"status": "Cleanup process queued and session cleared."})
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    # Development server; see serve.py for production
+    start_background()
     app.run(
         host='0.0.0.0',
         port=5000, 
@@ -0,0 +1,200 @@
+import json
+import time
+import transcode
+
+# Vosk runs a Kaldi model on the CPU, so speech is recognized locally while it is uploaded
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+# A backend's stream() returns a recognizer for one utterance:
+#     feed(pcm)  takes the next 16 kHz mono s16le PCM and returns the partial transcript so far
+#     finish()   returns the final transcript, '' if no speech was recognized
+# Both raise ASRError if the backend fails. A backend whose `streaming` is False only buffers
+# what is fed and recognizes it all in finish().
+
+class ASRError(Exception):
+    """
+    Raised when a speech recognition backend fails (as opposed to hearing no speech).
+    """
+
+# --- Google Web Speech ---
+class GoogleBackend:
+    """
+    The Google Web Speech API through SpeechRecognition. It has no streaming interface, so
+    audio is buffered and sent in one request when the utterance ends.
+    """
+    name = 'google'
+    streaming = False
+
+    def __init__(self, language='en-US'):
+        # Imported here, not with the module: it is slow to import and only this backend uses it
+        import speech_recognition
+        self.sr = speech_recognition
+        self.language = language
+
+    def stream(self):
+        return _GoogleStream(self.sr, self.language)
+
+class _GoogleStream:
+    def __init__(self, sr, language):
+        self.sr = sr
+        self.language = language
+        self.pcm = bytearray()
+
+    def feed(self, pcm):
+        self.pcm += pcm
+        return ''
+
+    def finish(self):
+        audio_data = self.sr.AudioData(bytes(self.pcm), transcode.SAMPLE_RATE, transcode.SAMPLE_WIDTH)
+        try:
+            return self.sr.Recognizer().recognize_google(audio_data, language=self.language)
+        except self.sr.UnknownValueError:
+            return ''
+        except self.sr.RequestError as e:
+            raise ASRError(f"Google Speech API error: {e}") from e
+
+# --- Vosk (local, CPU) ---
+class VoskBackend:
+    """
+    Local streaming recognition with a Vosk model (https://alphacephei.com/vosk/models),
+    loaded once and shared by every utterance. Partial transcripts are available while the
+    user is still speaking.
+    """
+    name = 'vosk'
+    streaming = True
+
+    def __init__(self, model_path):
+        if vosk is None:
+            raise ASRError("ASR_BACKEND=vosk needs the vosk package")
+        if not model_path:
+            raise ASRError("ASR_BACKEND=vosk needs VOSK_MODEL_PATH to point at an unpacked model")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+
+    def stream(self):
+        return _VoskStream(vosk.KaldiRecognizer(self.model, transcode.SAMPLE_RATE))
+
+class _VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+
+    def feed(self, pcm):
+        # AcceptWaveform returns True when it has closed a segment at a pause
+        if self.recognizer.AcceptWaveform(pcm):
+            self._add_segment(self.recognizer.Result())
+            partial = ''
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        return ' '.join(self.segments + ([partial] if partial else []))
+
+    def finish(self):
+        self._add_segment(self.recognizer.FinalResult())
+        return ' '.join(self.segments)
+
+    def _add_segment(self, result):
+        text = json.loads(result).get('text', '')
+        if text:
+            self.segments.append(text)
+
+# --- Fake (tests and benchmarks) ---
+class FakeBackend:
+    """
+    Deterministic stand-in with no model or network: it "hears" `text` at `words_per_second`
+    of audio fed, so partials grow with the audio and the final transcript is the whole text
+    (or '' for a clip shorter than `min_seconds`). `delay` simulates recognition time at the end.
+    """
+    name = 'fake'
+    streaming = True
+
+    def __init__(self, text='My name is Kaivan Mehta.', words_per_second=2.5, min_seconds=0.2, delay=0.0):
+        self.text = text
+        self.words_per_second = words_per_second
+        self.min_seconds = min_seconds
+        self.delay = delay
+
+    def stream(self):
+        return _FakeStream(self)
+
+class _FakeStream:
+    def __init__(self, backend):
+        self.backend = backend
+        self.samples = 0
+
+    def feed(self, pcm):
+        self.samples += len(pcm) // transcode.SAMPLE_WIDTH
+        words = self.backend.text.split()
+        heard = int(self.samples / transcode.SAMPLE_RATE * self.backend.words_per_second)
+        return ' '.join(words[:heard])
+
+    def finish(self):
+        if self.backend.delay:
+            time.sleep(self.backend.delay)
+        if self.samples / transcode.SAMPLE_RATE < self.backend.min_seconds:
+            return ''
+        return self.backend.text
+
+def create_backend(name, **options):
+    """
+    Returns the backend called `name` ('google', 'vosk' or 'fake').
+    """
+    if name == 'google':
+        return GoogleBackend(language=options.get('language', 'en-US'))
+    if name == 'vosk':
+        return VoskBackend(options.get('model_path'))
+    if name == 'fake':
+        return FakeBackend()
+    raise ASRError(f"Unknown ASR backend '{name}'")
+
+# --- Streaming Transcription ---
+class Transcriber:
+    """
+    Transcribes one utterance while it is uploaded: compressed chunks go through a
+    transcode.StreamDecoder and every decoded block is fed to the recognizer right away, so
+    little work is left when the utterance ends. `on_partial` is called from the decoder's
+    thread whenever the partial transcript changes.
+    """
+
+    def __init__(self, backend, on_partial=None):
+        self.recognizer = backend.stream()
+        self.on_partial = on_partial
+        self.partial = ''
+        self.error = None
+        self.decoder = transcode.StreamDecoder(on_pcm=self._feed)
+
+    def _feed(self, pcm):
+        if self.error is not None:
+            return
+        try:
+            partial = self.recognizer.feed(pcm)
+        except ASRError as e:
+            self.error = e
+            return
+        if partial and partial != self.partial:
+            self.partial = partial
+            if self.on_partial is not None:
+                self.on_partial(partial)
+
+    def write(self, data):
+        self.decoder.write(data)
+
+    def finish(self):
+        """
+        Waits for the rest of the upload to be decoded and returns the utterance's PCM. Raises
+        transcode.TranscodeError if the audio could not be decoded.
+        """
+        return self.decoder.close()
+
+    def transcript(self):
+        """
+        The final transcript, once finish() has returned. Raises ASRError if recognition failed.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.recognizer.finish()
+
+    def abort(self):
+        self.decoder.abort()
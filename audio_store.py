@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import transcode
+
+class AudioStore:
+    """
+    Manages the session recordings in the audio log directory. An index (SQLite) tracks
+    each recording from the moment its session starts:
+
+        recording  the session is still appending to the WAV
+        closed     the session was saved; the WAV waits to be compressed
+        archived   re-encoded with `codec` (FLAC or Opus) and the WAV removed
+
+    sweep() compresses closed recordings, deletes recordings abandoned while still being
+    recorded (no save within `orphan_seconds` of their last append), and evicts the oldest
+    recordings past `retention_seconds` or beyond `quota_bytes`. None of this needs a
+    directory scan, except importing files written before the index existed.
+    """
+    sweep_interval = 600
+    stale_seconds = 3600
+
+    def __init__(self, directory, db_path, codec='flac', orphan_seconds=1800, retention_seconds=None,
+                 quota_bytes=None):
+        self.directory = directory
+        self.db_path = db_path
+        self.codec = codec
+        self.orphan_seconds = orphan_seconds
+        self.retention_seconds = retention_seconds
+        self.quota_bytes = quota_bytes
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS recordings (
+                name TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                user_id INTEGER,
+                status TEXT NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                closed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS recordings_status ON recordings(status, created_at);
+            CREATE INDEX IF NOT EXISTS recordings_user ON recordings(user_id, created_at);
+        ''')
+        if conn.execute('PRAGMA user_version').fetchone()[0] == 0:
+            self._import_existing()
+            conn.execute('PRAGMA user_version = 1')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def disconnect(self):
+        """Closes the calling thread's connection; it is reopened on next use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _import_existing(self):
+        """
+        Indexes the files already in the directory. Merged session recordings are treated as
+        saved; anything else (per-turn clips from older versions) as abandoned.
+        """
+        rows = []
+        for entry in os.scandir(self.directory):
+            name, extension = os.path.splitext(entry.name)
+            if not entry.is_file() or extension not in ('.wav', '.flac', '.opus'):
+                continue
+            stat = entry.stat()
+            if extension != '.wav':
+                status = 'archived'
+            elif name.endswith('_processed'):
+                status = 'closed'
+            else:
+                status = 'recording'
+            rows.append((name, entry.name, status, stat.st_size, stat.st_mtime, stat.st_mtime))
+        self._connect().executemany('INSERT OR IGNORE INTO recordings (name, file, status, bytes, created_at, closed_at) '
+                                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        if rows:
+            print(f"Indexed {len(rows)} existing audio log files.")
+
+    # --- Session Lifecycle ---
+    def start(self, path, user_id):
+        """Indexes the recording a new session will append to at `path`."""
+        name = os.path.splitext(os.path.basename(path))[0]
+        self._connect().execute("INSERT OR IGNORE INTO recordings (name, file, user_id, status, created_at) "
+                                "VALUES (?, ?, ?, 'recording', ?)", (name, os.path.basename(path), user_id, time.time()))
+
+    def close(self, path):
+        """
+        Marks the recording at `path` as saved, so it is kept and later compressed. Called
+        when the session ends, before its save job runs.
+        """
+        name = os.path.splitext(os.path.basename(path))[0]
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._connect().execute("UPDATE recordings SET status = 'closed', bytes = ?, closed_at = ? "
+                                "WHERE name = ? AND status = 'recording'", (size, time.time(), name))
+
+    def archive(self, path):
+        """
+        Re-encodes the saved WAV at `path` with the store's codec and removes the WAV.
+        Returns the compressed file's path, or None if there was nothing to compress.
+        """
+        name = os.path.splitext(os.path.basename(path))[0]
+        conn = self._connect()
+        # Claim the row, so only one worker (or process) compresses a recording. The save job
+        # can get here before close() has marked it.
+        claimed = conn.execute("UPDATE recordings SET status = 'archiving', closed_at = COALESCE(closed_at, ?) "
+                               "WHERE name = ? AND status IN ('recording', 'closed')", (time.time(), name)).rowcount
+        if not claimed:
+            if not os.path.exists(path) or conn.execute('SELECT 1 FROM recordings WHERE name = ?', (name,)).fetchone():
+                return None
+            # A save queued before the index existed
+            conn.execute("INSERT INTO recordings (name, file, status, created_at, closed_at) VALUES (?, ?, 'archiving', ?, ?)",
+                         (name, os.path.basename(path), os.path.getmtime(path), time.time()))
+        if not os.path.exists(path):
+            conn.execute('DELETE FROM recordings WHERE name = ?', (name,))
+            return None
+
+        extension = transcode.ARCHIVE_CODECS[self.codec][2]
+        target = os.path.join(self.directory, name + extension)
+        partial = target + '.part'
+        try:
+            transcode.encode_file(path, partial, self.codec)
+            os.replace(partial, target)
+        except transcode.TranscodeError as e:
+            print(f"Could not compress {path}, keeping the WAV: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            conn.execute("UPDATE recordings SET status = 'closed', bytes = ? WHERE name = ?",
+                         (os.path.getsize(path), name))
+            return None
+        os.remove(path)
+        conn.execute("UPDATE recordings SET status = 'archived', file = ?, bytes = ? WHERE name = ?",
+                     (os.path.basename(target), os.path.getsize(target), name))
+        return target
+
+    # --- Lookups ---
+    def recordings(self, user_id):
+        """A user's recordings, oldest first, as dicts with the file's `path`."""
+        rows = self._connect().execute('SELECT name, file, status, bytes, created_at FROM recordings '
+                                       'WHERE user_id = ? ORDER BY created_at', (user_id,)).fetchall()
+        return [{'name': name, 'path': os.path.join(self.directory, file), 'status': status,
+                 'bytes': size, 'created_at': created_at} for name, file, status, size, created_at in rows]
+
+    # --- Maintenance ---
+    def sweep(self):
+        """
+        Compresses saved recordings, deletes abandoned ones and enforces the retention
+        window and the quota. Returns counts of what it did.
+        """
+        conn = self._connect()
+        now = time.time()
+        done = {'archived': 0, 'orphans': 0, 'expired': 0, 'evicted': 0}
+
+        # A compression interrupted by a crash is retried
+        conn.execute("UPDATE recordings SET status = 'closed' WHERE status = 'archiving' AND closed_at < ?",
+                     (now - self.stale_seconds,))
+
+        for (file,) in conn.execute("SELECT file FROM recordings WHERE status = 'closed' ORDER BY created_at").fetchall():
+            if self.archive(os.path.join(self.directory, file)):
+                done['archived'] += 1
+
+        # An abandoned session's WAV stops growing; one that is still being appended to is
+        # touched every turn
+        for name, file in conn.execute("SELECT name, file FROM recordings WHERE status = 'recording' "
+                                       "AND created_at < ?", (now - self.orphan_seconds,)).fetchall():
+            path = os.path.join(self.directory, file)
+            try:
+                if now - os.path.getmtime(path) < self.orphan_seconds:
+                    continue
+            except FileNotFoundError:
+                pass  # nothing was ever recorded
+            else:
+                done['orphans'] += 1
+            self._delete(name, path)
+
+        if self.retention_seconds:
+            for name, file in conn.execute("SELECT name, file FROM recordings WHERE status IN ('closed', 'archived') "
+                                           "AND created_at < ?", (now - self.retention_seconds,)).fetchall():
+                self._delete(name, os.path.join(self.directory, file))
+                done['expired'] += 1
+
+        if self.quota_bytes:
+            used = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM recordings "
+                                "WHERE status IN ('closed', 'archived')").fetchone()[0]
+            if used > self.quota_bytes:
+                for name, file, size in conn.execute("SELECT name, file, bytes FROM recordings WHERE status IN "
+                                                     "('closed', 'archived') ORDER BY created_at").fetchall():
+                    if used <= self.quota_bytes:
+                        break
+                    self._delete(name, os.path.join(self.directory, file))
+                    used -= size
+                    done['evicted'] += 1
+
+        if any(done.values()):
+            print(f"Audio log sweep: {done}")
+        return done
+
+    def _delete(self, name, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._connect().execute('DELETE FROM recordings WHERE name = ?', (name,))
+
+    def stats(self):
+        conn = self._connect()
+        counts = {status: (count, size) for status, count, size in
+                  conn.execute('SELECT status, COUNT(*), SUM(bytes) FROM recordings GROUP BY status').fetchall()}
+        stats = {'codec': self.codec, 'quota_bytes': self.quota_bytes or 0}
+        for status in ('recording', 'closed', 'archived'):
+            count, size = counts.get(status, (0, 0))
+            stats[f'{status}_count'], stats[f'{status}_bytes'] = count, size or 0
+        return stats
+
+# --- CLI ---
+def main():
+    directory = os.path.join(os.getenv('DATA_DIR', os.path.dirname(os.path.abspath(__file__))), 'audio_logs')
+    parser = argparse.ArgumentParser(description='Inspect or clean up the audio log directory.')
+    parser.add_argument('command', choices=['status', 'sweep'])
+    parser.add_argument('--dir', default=directory)
+    parser.add_argument('--codec', choices=sorted(transcode.ARCHIVE_CODECS), default=os.getenv('AUDIO_LOG_CODEC', 'flac'))
+    parser.add_argument('--retention-days', type=float, default=float(os.getenv('AUDIO_RETENTION_DAYS', '90')))
+    parser.add_argument('--quota-mb', type=float, default=float(os.getenv('AUDIO_QUOTA_MB', '0')))
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f"No audio log directory at {args.dir}")
+        return
+    store = AudioStore(args.dir, os.path.join(os.path.dirname(args.dir), 'audio_logs.db'), codec=args.codec,
+                       retention_seconds=args.retention_days * 24 * 3600, quota_bytes=int(args.quota_mb * 1024 * 1024))
+    if args.command == 'sweep':
+        store.sweep()
+    print(json.dumps(store.stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures the time from the end of an utterance to its transcript. The clip is uploaded in
+chunks at real-time pace, then transcribed either after the upload as one file (the /speech
+path) or while it is uploaded with asr.Transcriber (the /voice path). The fake ASR backend's
+`--recognize-delay` stands in for the recognizer's own time, e.g. a Google round trip.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asr
+import transcode
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {'p50': samples[len(samples) // 2], 'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))]}
+
+def upload(clip, chunk_bytes, chunk_seconds, write):
+    for i in range(0, len(clip), chunk_bytes):
+        write(clip[i:i + chunk_bytes])
+        time.sleep(chunk_seconds)
+
+def after_upload(backend, clip, args):
+    received = bytearray()
+    upload(clip, args.chunk_bytes, args.chunk_seconds, received.extend)
+    start = time.perf_counter()
+    recognizer = backend.stream()
+    recognizer.feed(transcode.decode_to_pcm(bytes(received)))
+    text = recognizer.finish()
+    return time.perf_counter() - start, text
+
+def while_uploading(backend, clip, args):
+    transcriber = asr.Transcriber(backend)
+    upload(clip, args.chunk_bytes, args.chunk_seconds, transcriber.write)
+    start = time.perf_counter()
+    transcriber.finish()
+    text = transcriber.transcript()
+    return time.perf_counter() - start, text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('clip', help='a webm/opus (or any ffmpeg-readable) recording of an utterance')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--chunk-bytes', type=int, default=2000, help='bytes per uploaded chunk')
+    parser.add_argument('--chunk-seconds', type=float, default=0.25, help='time between chunks')
+    parser.add_argument('--recognize-delay', type=float, default=0.0, help='seconds the fake recognizer takes to finish')
+    args = parser.parse_args()
+
+    with open(args.clip, 'rb') as f:
+        clip = f.read()
+    backend = asr.FakeBackend(delay=args.recognize_delay)
+    results = {'decoder': transcode.BACKEND, 'clip_seconds': transcode.pcm_duration(transcode.decode_to_pcm(clip))}
+    for name, run in [('after_upload', after_upload), ('while_uploading', while_uploading)]:
+        samples = [run(backend, clip, args) for _ in range(args.runs)]
+        results[name] = {'end_of_utterance_to_transcript_s': percentiles([s[0] for s in samples]),
+                         'transcript': samples[-1][1]}
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Plays a long conversation against a fake Ollama server and reports the prompt size and reply
+latency per turn, with the whole history sent every turn (as before) and with the token-budgeted
+context window. Folds are summarized by the fake server inline, as the app does in the background.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_ollama import FakeOllama
+from llm_client import LLMClient
+from context_window import ContextWindow
+
+USER_TURN = "This is answer {i}. I have been preparing for the admission process for a while and can share more details."
+
+def play(llm, system_prompt, turns, window):
+    history = []
+    summary = None
+    samples = []
+    for i in range(turns):
+        history.append({'role': 'user', 'content': USER_TURN.format(i=i)})
+        if window is None:
+            messages, fold = [{'role': 'system', 'content': system_prompt}] + history, None
+        else:
+            messages, fold = window.build(system_prompt, history, summary)
+        start = time.perf_counter()
+        reply = llm.chat(messages)
+        samples.append({'turn': i, 'prompt_chars': sum(len(m['content']) for m in messages),
+                        'seconds': time.perf_counter() - start})
+        history.append({'role': 'assistant', 'content': reply})
+        if fold:
+            summary = {'upto': fold['upto'], 'digest': fold['digest'],
+                       'summary': llm.chat(window.summary_request(fold))}
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=60, help='user turns in the session')
+    parser.add_argument('--prefill-chars-per-s', type=float, default=40000.0)
+    parser.add_argument('--tokens-per-s', type=float, default=400.0)
+    parser.add_argument('--every', type=int, default=10, help='report every Nth turn')
+    args = parser.parse_args()
+
+    fake = FakeOllama(prefill_chars_per_s=args.prefill_chars_per_s, tokens_per_s=args.tokens_per_s).start()
+    llm = LLMClient(fake.url, 'bench')
+    prompt_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'admin_prompt_conv.txt')
+    with open(prompt_path) as f:
+        system_prompt = f.read()
+
+    results = {}
+    for mode, window in [('full_history', None), ('context_window', ContextWindow())]:
+        samples = play(llm, system_prompt, args.turns, window)
+        results[mode] = [s for s in samples if s['turn'] % args.every == 0 or s['turn'] == args.turns - 1]
+        if window is not None:
+            results['context_window_stats'] = window.stats()
+    llm.close()
+    fake.stop()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
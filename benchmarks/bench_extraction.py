@@ -0,0 +1,90 @@
+"""
+Compares the sequential (one request per field) and single-pass extraction modes of
+app.extract_user_data against a fake Ollama server, each with and without the rule-based
+fast path. Also runs the per-turn extraction over a typical interview, where most turns
+give at most one field, and reports how often each field still needed the LLM.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_ollama import FakeOllama
+
+def build_conversation(turns):
+    history = []
+    for i in range(turns):
+        history.append({'role': 'assistant', 'content': f"Question {i}: could you tell me a little more about your preparation for the admission process so far?"})
+        history.append({'role': 'user', 'content': f"Sure, this is answer {i}. My name is Kaivan Mehta, my number is +916351374519, I got 95% in HSC and 79 percentile in JEE."})
+    return history
+
+INTERVIEW = [
+    ("Hello! Welcome to the admission interview. How are you doing today?", "I'm good, thank you."),
+    ("Great. Could you tell me your full name?", "Kaivan Mehta."),
+    ("Thanks, Kaivan. What is your mobile number?", "It's 63513 74519."),
+    ("What percentage did you get in your HSC boards?", "I got 92.4 percent."),
+    ("And what was your JEE percentile?", "79 percentile in mains."),
+    ("Which branch are you most interested in?", "Computer engineering, I think."),
+    ("Is there anything you would like to know about the campus?", "Yes, is there a hostel?"),
+    ("There is. Anything else I can help you with?", "No, that's all. Thanks!"),
+]
+
+def build_interview():
+    history = []
+    for question, answer in INTERVIEW:
+        history += [{'role': 'assistant', 'content': question}, {'role': 'user', 'content': answer}]
+    return history
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=20, help='conversation turns in the session')
+    parser.add_argument('--runs', type=int, default=5, help='extractions per mode')
+    parser.add_argument('--prefill-chars-per-s', type=float, default=40000.0)
+    parser.add_argument('--tokens-per-s', type=float, default=40.0)
+    parser.add_argument('--corrupt', default='', help='comma separated fields the fake returns unparsable in JSON mode')
+    args = parser.parse_args()
+
+    fake = FakeOllama(prefill_chars_per_s=args.prefill_chars_per_s, tokens_per_s=args.tokens_per_s,
+                      corrupt_fields=[f for f in args.corrupt.split(',') if f]).start()
+    os.environ['OLLAMA_URL'] = fake.url
+    import app
+
+    history = build_conversation(args.turns)
+    results = {}
+    import extraction
+    for mode, fast_path in [('sequential', False), ('single', False), ('sequential', True), ('single', True)]:
+        app.EXTRACTION_MODE, app.FAST_PATH_EXTRACTION = mode, fast_path
+        fake.reset_counters()
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            data = app.extract_user_data(history)
+        elapsed = time.perf_counter() - start
+        results[mode + ('_fast_path' if fast_path else '')] = {
+            'requests_per_extraction': fake.request_count / args.runs,
+            'prompt_chars_per_extraction': fake.prompt_chars / args.runs,
+            'seconds_per_extraction': elapsed / args.runs,
+            'result': data,
+        }
+
+    # Per-turn extraction, as run after each reply
+    interview = build_interview()
+    for fast_path in (False, True):
+        app.EXTRACTION_MODE, app.FAST_PATH_EXTRACTION = 'single', fast_path
+        app.fast_path = extraction.FastPath()
+        fake.reset_counters()
+        for seq in range(1, len(interview), 2):
+            context = extraction.turn_context(app.extraction_system_prompt(), {}, interview[seq - 1]['content'],
+                                              interview[seq]['content'], '')
+            app.run_extraction(context)
+        results['per_turn' + ('_fast_path' if fast_path else '')] = {
+            'turns': len(INTERVIEW), 'requests': fake.request_count,
+        }
+    results['per_turn_fast_path']['field_stats'] = app.fast_path.stats()
+    app.llm.close()
+    fake.stop()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+End-to-end load test of app.py's HTTP routes. N simulated users each register and log in
+(/auth), start an interview (/initiate), answer `--turns` times with a prerecorded webm clip
+(/speech) and save (/cleanup), concurrently. Ollama, edge-tts and speech recognition are
+replaced by local stand-ins with configurable latency, and the app runs in a temporary
+DATA_DIR. Reports p50/p95/p99 latency per route and per stage, throughput and memory as JSON.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+import resource
+import contextlib
+import tempfile
+import threading
+import statistics
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ffmpeg
+import requests
+from werkzeug.serving import make_server
+from fake_ollama import FakeOllama
+from bench_transcode import make_clip
+
+class Recorder:
+    """Collects latency samples by name from many threads."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+    def summary(self):
+        return {name: summarize(values, self.errors.get(name, 0)) for name, values in sorted(self.samples.items())}
+
+def summarize(values, errors=0):
+    values = sorted(values)
+    def pct(q):
+        return values[min(len(values) - 1, int(len(values) * q))]
+    return {'count': len(values), 'errors': errors, 'mean': statistics.fmean(values),
+            'p50': pct(0.5), 'p95': pct(0.95), 'p99': pct(0.99), 'max': values[-1]}
+
+class UniqueReplyOllama(FakeOllama):
+    """Numbers every chat reply so the TTS cache does not turn every turn into a hit."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replies = 0
+
+    def answer(self, body):
+        reply = super().answer(body)
+        if body.get('format') or reply != self.reply:
+            return reply
+        with self._lock:
+            self._replies += 1
+            return f"{reply} This is reply {self._replies}."
+
+def instrument(app, stages):
+    """Wraps the app's stage functions so each call's duration is recorded."""
+    def timed_async(name, fn):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                stages.add(name, time.perf_counter() - start)
+        return wrapper
+
+    def timed(name, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stages.add(name, time.perf_counter() - start)
+        return wrapper
+
+    app.llm.chat_async = timed_async('llm', app.llm.chat_async)
+    app.synthesize = timed_async('tts', app.synthesize)
+    app.transcribe_audio = timed('asr', app.transcribe_audio)
+    app.record_clip = timed('record', app.record_clip)
+    # Whole-transcript extraction at save time, or per turn (INCREMENTAL_EXTRACTION, the default)
+    # with the save merging the turns' results
+    app.extract_user_data = timed('extraction', app.extract_user_data)
+    app.extract_turn = timed('turn_extraction', app.extract_turn)
+    app.merge_conversation_turns = timed('extraction', app.merge_conversation_turns)
+
+def make_utterance(seconds, frequency=220):
+    """
+    A webm clip of a tone pulsed like syllables, with half a second of silence on either side.
+    A steady tone has no quiet part to measure it against, and the VAD would take it for noise.
+    """
+    # Commas inside a lavfi source's options are escaped
+    tone = f'0.3*sin(2*PI*{frequency}*t)*(0.5+0.5*sin(2*PI*4*t))*between(t\\,0.5\\,{seconds - 0.5})'
+    out, _ = (
+        ffmpeg.input(f'aevalsrc={tone}:d={seconds}:s=48000', f='lavfi')
+        .output('pipe:1', format='webm', acodec='libopus')
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return out
+
+def simulate_user(base, n, clip, args, routes):
+    http = requests.Session()
+    credentials = {'username': f'bench_user_{n}', 'password': 'bench'}
+
+    def call(route, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = http.post(base + route, allow_redirects=False, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        routes.add(route, time.perf_counter() - start)
+        if not ok:
+            routes.error(route)
+        return ok
+
+    call('/auth', data=dict(credentials, action='register'))
+    call('/auth', data=dict(credentials, action='login'))
+    call('/initiate')
+    for _ in range(args.turns):
+        call('/speech', files={'audio': ('input.webm', clip, 'audio/webm')})
+        time.sleep(args.think_time)
+    call('/cleanup')
+
+def run(args):
+    if args.clip:
+        with open(args.clip, 'rb') as f:
+            clip = f.read()
+    else:
+        clip = make_utterance(2)
+    reply_mp3 = make_clip(3, 'mp3', 'libmp3lame', 440)
+
+    fake = UniqueReplyOllama(prefill_chars_per_s=args.prefill_chars_per_s, tokens_per_s=args.tokens_per_s).start()
+    data_dir = tempfile.mkdtemp(prefix='bench_load_')
+    os.environ.update({'OLLAMA_URL': fake.url, 'DATA_DIR': data_dir, 'TTS_PREWARM': '0', 'ASR_BACKEND': 'fake'})
+    import app
+    import asr
+
+    async def fake_speech(text):
+        await asyncio.sleep(args.tts_latency)
+        return reply_mp3
+
+    app.generate_speech_bytes = fake_speech
+    app.asr_backend = asr.FakeBackend(delay=args.asr_latency)
+    routes, stages = Recorder(), Recorder()
+    instrument(app, stages)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    start = time.perf_counter()
+    users = [threading.Thread(target=simulate_user, args=(base, n, clip, args, routes)) for n in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - start
+
+    # Session-end processing runs in the background; wait for it so its stages are counted
+    deadline = time.time() + args.job_timeout
+    while time.time() < deadline:
+        jobs = app.job_queue.stats()
+        if not jobs['queued'] and not jobs['running']:
+            break
+        time.sleep(0.2)
+
+    route_summary = routes.summary()
+    results = {
+        'config': vars(args),
+        'routes': route_summary,
+        'stages': stages.summary(),
+        'throughput': {
+            'elapsed_s': elapsed,
+            'sessions_per_s': args.users / elapsed,
+            'speech_turns_per_s': route_summary.get('/speech', {}).get('count', 0) / elapsed,
+        },
+        # ru_maxrss is in kilobytes on Linux; it covers the app, the fakes and the clients
+        'memory': {'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024},
+        'jobs': app.job_queue.stats(),
+        'llm': app.llm.stats(),
+        'ollama_requests': fake.request_count,
+    }
+    server.shutdown()
+    fake.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=8, help='concurrent simulated users')
+    parser.add_argument('--turns', type=int, default=5, help='/speech turns per user')
+    parser.add_argument('--clip', help='webm recording to upload each turn (default: a generated 2 s opus clip)')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds between a reply and the next turn')
+    parser.add_argument('--prefill-chars-per-s', type=float, default=40000.0, help='fake Ollama prompt processing rate')
+    parser.add_argument('--tokens-per-s', type=float, default=40.0, help='fake Ollama generation rate')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='seconds before fake edge-tts returns audio')
+    parser.add_argument('--asr-latency', type=float, default=0.2, help='seconds the fake recognizer takes per utterance')
+    parser.add_argument('--job-timeout', type=float, default=120.0, help='seconds to wait for the save jobs to finish')
+    args = parser.parse_args()
+
+    # The app logs with print(); keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures live-turn latency while background extraction requests keep a fake Ollama busy.
+The fake serves `--parallel` requests at a time, like OLLAMA_NUM_PARALLEL. Compares sending
+every request straight through (as before) with the LLM client's priority scheduler, and
+reports interactive queue wait and model time separately.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+import contextlib
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_ollama import FakeOllama
+from llm_client import LLMClient, LLMError, LLMBusy, BACKGROUND
+from bench_extraction import build_conversation
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return {'count': len(samples), 'p50': samples[len(samples) // 2],
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))], 'max': samples[-1]}
+
+def run(url, args, max_in_flight):
+    timings = defaultdict(list)
+    lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(phase, priority):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with lock:
+                timings[(priority, phase)].append(time.perf_counter() - start)
+
+    llm = LLMClient(url, 'bench', max_connections=64, max_in_flight=max_in_flight,
+                    max_queued=args.max_queued, max_queued_background=args.max_queued_background, timer=timer)
+    extraction = [{'role': 'system', 'content': 'Extract the user profile as JSON.'}] + build_conversation(args.history_turns)
+    stop = threading.Event()
+    counts = defaultdict(int)
+
+    def background_worker():
+        while not stop.is_set():
+            try:
+                llm.chat(extraction, response_format='json', priority=BACKGROUND)
+                key = 'done'
+            except LLMBusy:
+                key = 'rejected'
+                time.sleep(0.5)  # the job queue would retry later
+            except LLMError:
+                key = 'failed'
+            with lock:
+                counts[key] += 1
+
+    def interactive_user(n):
+        history = [{'role': 'system', 'content': 'You are a counsellor.'}]
+        for i in range(args.turns):
+            history.append({'role': 'user', 'content': f'This is answer {i} from user {n}.'})
+            start = time.perf_counter()
+            try:
+                history.append({'role': 'assistant', 'content': llm.chat(history)})
+            except LLMError:
+                with lock:
+                    counts['interactive_failed'] += 1
+            with lock:
+                timings['turn'].append(time.perf_counter() - start)
+            time.sleep(args.think_time)
+
+    workers = [threading.Thread(target=background_worker, daemon=True) for _ in range(args.background)]
+    for worker in workers:
+        worker.start()
+    time.sleep(args.warmup)
+    start = time.perf_counter()
+    users = [threading.Thread(target=interactive_user, args=(n,)) for n in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for worker in workers:
+        worker.join()
+    llm.close()
+    return {
+        'interactive_turn_s': percentiles(timings['turn']),
+        'interactive_queue_s': percentiles(timings[('interactive', 'queue')]),
+        'interactive_model_s': percentiles(timings[('interactive', 'request')]),
+        'background_queue_s': percentiles(timings[('background', 'queue')]),
+        'background_per_s': counts['done'] / elapsed,
+        'counts': dict(counts),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--parallel', type=int, default=1, help='requests the fake Ollama serves at once')
+    parser.add_argument('--max-in-flight', type=int, default=1, help='scheduler limit in the scheduled run')
+    parser.add_argument('--max-queued', type=int, default=32)
+    parser.add_argument('--max-queued-background', type=int, default=8)
+    parser.add_argument('--background', type=int, default=6, help='concurrent background extraction loops')
+    parser.add_argument('--history-turns', type=int, default=10, help='conversation turns in each extraction prompt')
+    parser.add_argument('--users', type=int, default=2, help='concurrent interactive users')
+    parser.add_argument('--turns', type=int, default=5, help='turns per interactive user')
+    parser.add_argument('--think-time', type=float, default=0.5)
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds of background load before the users start')
+    parser.add_argument('--prefill-chars-per-s', type=float, default=40000.0)
+    parser.add_argument('--tokens-per-s', type=float, default=100.0)
+    args = parser.parse_args()
+
+    fake = FakeOllama(prefill_chars_per_s=args.prefill_chars_per_s, tokens_per_s=args.tokens_per_s,
+                      parallel=args.parallel).start()
+    results = {'config': vars(args)}
+    # A limit no run reaches stands in for the unscheduled client
+    for mode, max_in_flight in [('unscheduled', 1000), ('scheduled', args.max_in_flight)]:
+        results[mode] = run(fake.url, args, max_in_flight)
+    fake.stop()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
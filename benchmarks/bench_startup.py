@@ -0,0 +1,154 @@
+"""
+Measures cold starts. The app is started the way `python app.py` runs it (one process that
+imports the app and serves at once, nothing warmed) and through serve.py (imported once,
+model loaded and TTS cache filled, then forked into `--workers` processes), against a fake
+Ollama that takes `--load-seconds` to load the model on its first request. For each, reports
+the time from launch to the first response and to a 200 from /ready, and the /initiate
+latency of `--users` users who start an interview as soon as the server answers. Also times
+how long the command-line tools take to start.
+"""
+import os
+import sys
+import time
+import json
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+import requests
+from fake_ollama import FakeOllama
+from bench_transcode import make_clip
+
+def run_server(mode, port, workers, tts_latency):
+    # Runs in the server subprocess: edge-tts is replaced before anything is served or forked
+    import app
+    import serve
+    with open(os.environ['BENCH_TTS_MP3'], 'rb') as f:
+        reply_mp3 = f.read()
+
+    async def fake_speech(text):
+        await asyncio.sleep(tts_latency)
+        return reply_mp3
+
+    app.generate_speech_bytes = fake_speech
+    if mode == 'preforked':
+        serve.serve(app, serve.listen('127.0.0.1', port), workers)
+    else:
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', port, app.app, threaded=True).serve_forever()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for(url, status=None, timeout=120.0):
+    """Polls `url` until it answers, with `status` if given."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(url, timeout=timeout)
+            if status is None or response.status_code == status:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} did not answer")
+
+def time_until_ready(base, start, results):
+    wait_for(f'{base}/ready', status=200)
+    results.append(time.perf_counter() - start)
+
+def first_turn(base, n, results):
+    client = requests.Session()
+    client.post(f'{base}/auth', data={'username': f'startup{n}', 'password': 'pw', 'action': 'register'})
+    client.post(f'{base}/auth', data={'username': f'startup{n}', 'password': 'pw', 'action': 'login'})
+    start = time.perf_counter()
+    client.post(f'{base}/initiate').raise_for_status()
+    results.append(time.perf_counter() - start)
+
+def measure(mode, args, mp3_path):
+    fake = FakeOllama(load_seconds=args.load_seconds, tokens_per_s=args.tokens_per_s).start()
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, OLLAMA_URL=fake.url, DATA_DIR=tempfile.mkdtemp(prefix='bench_startup_'),
+               ASR_BACKEND='fake', BENCH_TTS_MP3=mp3_path)
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port),
+                               '--workers', str(args.workers), '--tts-latency', str(args.tts_latency)],
+                              env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(f'{base}/')
+        first_response = time.perf_counter() - start
+        ready = []
+        probe = threading.Thread(target=time_until_ready, args=(base, start, ready))
+        probe.start()
+        turns = []
+        users = [threading.Thread(target=first_turn, args=(base, n, turns)) for n in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        probe.join()
+    finally:
+        server.terminate()
+        server.wait(30)
+        fake.stop()
+    return {
+        'first_response_s': first_response,
+        'ready_s': ready[0],
+        'first_initiate_p50_s': statistics.median(turns),
+        'first_initiate_max_s': max(turns),
+    }
+
+def cli_start(command, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+                       env=dict(os.environ, DATA_DIR=tempfile.mkdtemp(prefix='bench_startup_')))
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=8, help='users starting an interview right after launch')
+    parser.add_argument('--load-seconds', type=float, default=5.0, help='fake Ollama model load time')
+    parser.add_argument('--tokens-per-s', type=float, default=40.0, help='fake Ollama generation rate')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='seconds before fake edge-tts returns audio')
+    parser.add_argument('--serve', choices=['cold', 'preforked'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        run_server(args.serve, args.port, args.workers, args.tts_latency)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+        f.write(make_clip(3, 'mp3', 'libmp3lame', 440))
+    try:
+        modes = {mode: measure(mode, args, f.name) for mode in ('cold', 'preforked')}
+    finally:
+        os.remove(f.name)
+    python = sys.executable
+    print(json.dumps({
+        'config': {name: value for name, value in vars(args).items() if name not in ('serve', 'port')},
+        'modes': modes,
+        'cli_start_s': {
+            'db.py migrate': cli_start([python, 'db.py', 'migrate']),
+            'import app (old database init)': cli_start([python, '-c', 'import app']),
+            'jobs.py status': cli_start([python, 'jobs.py', 'status']),
+            'decrypt_and_display.py --help': cli_start([python, 'decrypt_and_display.py', '--help']),
+            'serve.py --help': cli_start([python, 'serve.py', '--help']),
+        },
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures the per-turn transcoding cost: one browser webm/opus upload plus one edge-tts mp3
+reply, each turned into 16 kHz mono audio. Compares the original temp-file + ffmpeg CLI path
+with transcode.decode_to_pcm on its ffmpeg pipe and PyAV backends. Needs ffmpeg on PATH.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ffmpeg
+import transcode
+
+def make_clip(seconds, fmt, codec, frequency):
+    out, _ = (
+        ffmpeg.input(f'sine=frequency={frequency}:duration={seconds}', f='lavfi')
+        .output('pipe:1', format=fmt, acodec=codec, ar=48000 if codec == 'libopus' else 24000)
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return out
+
+def legacy_turn(user_webm, bot_mp3, out_dir):
+    # The pre-transcode.py code path: temp file in, ffmpeg CLI, wav file out
+    for data, suffix in [(user_webm, '.webm'), (bot_mp3, '.mp3')]:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tf:
+            tf.write(data)
+            temp_path = tf.name
+        wav_path = os.path.join(out_dir, 'legacy.wav')
+        try:
+            ffmpeg.input(temp_path).output(wav_path, ar=16000, ac=1).overwrite_output().run(capture_stdout=True, capture_stderr=True)
+        finally:
+            os.remove(temp_path)
+
+def pcm_turn(user_webm, bot_mp3, out_dir, backend):
+    for data in [user_webm, bot_mp3]:
+        transcode.write_wav(os.path.join(out_dir, f'{backend}.wav'), transcode.decode_to_pcm(data, backend))
+
+def measure(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': statistics.mean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--user-seconds', type=float, default=5.0)
+    parser.add_argument('--bot-seconds', type=float, default=8.0)
+    args = parser.parse_args()
+
+    user_webm = make_clip(args.user_seconds, 'webm', 'libopus', 300)
+    bot_mp3 = make_clip(args.bot_seconds, 'mp3', 'libmp3lame', 440)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        results['legacy_tempfile_cli'] = measure(lambda: legacy_turn(user_webm, bot_mp3, out_dir), args.runs)
+        results['ffmpeg_pipe'] = measure(lambda: pcm_turn(user_webm, bot_mp3, out_dir, 'ffmpeg'), args.runs)
+        if transcode.av is not None:
+            results['pyav_in_process'] = measure(lambda: pcm_turn(user_webm, bot_mp3, out_dir, 'av'), args.runs)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures the transcript log: the request-path cost of appending a turn, the writer's batch
+insert time, and the storage per turn (database growth, table and index pages included)
+compared with the same turns as raw JSON lines. Sessions are synthetic interviews whose
+replies vary in wording and length like an LLM's.
+
+By default (--corpus held-out) no turn is built from the phrases in transcript_log's preset
+dictionary, as is the case for most of what users and the LLM actually say. --corpus
+dictionary builds them from the interview's own phrases, the best case for the dictionary.
+The deflated size without the dictionary is reported for both.
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import zlib
+import tempfile
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import Database
+from transcript_log import TranscriptLog, DICTIONARY
+
+OPENERS = ["Thank you for sharing that.", "Great, thanks!", "Got it, thank you.", "That's wonderful to hear.",
+           "Thanks for letting me know.", "Perfect."]
+QUESTIONS = ["Could you please tell me your full name?", "What is your phone number?",
+             "What was your 12th HSC percentage?", "What is your JEE percentile?",
+             "Which branch are you most interested in, and why?", "Do you have any questions about the campus?"]
+ASIDES = ["XYZ College is located in Ahmedabad and offers hostel facilities for first-year students.",
+          "Our computer engineering program has a strong placement record, and there are several scholarships.",
+          "The admission committee reviews every application carefully, so take your time with each answer.",
+          "If anything is unclear, feel free to ask and I will do my best to explain it."]
+ANSWERS = ["My name is {name}.", "It's {phone}.", "I got {hsc} percent in my HSC boards.",
+           "{jee} percentile in JEE mains.", "I'd like computer engineering because I enjoy programming.",
+           "Yes, is there a hostel on campus?", "No, that's all, thank you."]
+NAMES = ['Kaivan Mehta', 'Riya Shah', 'Aarav Patel', 'Diya Desai', 'Vivaan Joshi']
+
+# The same interview in wording the dictionary does not contain
+HELD_OUT_GREETINGS = ["Good morning, and thanks for joining today's session.",
+                      "Hi there, glad you could make it. Shall we get started?"]
+HELD_OUT_OPENERS = ["Noted.", "Alright, that helps.", "Okay, understood.", "Excellent, appreciate it.",
+                    "Sounds good.", "I see."]
+HELD_OUT_QUESTIONS = ["May I ask what you'd like to be called?", "Where can we reach you if something comes up?",
+                      "How did your board exams go overall?", "What score did you end up with in the entrance test?",
+                      "Which subjects do you enjoy the most at the moment?", "Is there a city you'd prefer to study in?"]
+HELD_OUT_ASIDES = ["Many students worry about this step, but there are no wrong answers here.",
+                   "Our faculty often mention that curiosity matters more than any single result.",
+                   "The classes are small, so students get to know their professors quite well.",
+                   "Labs stay open late during the semester for anyone working on projects."]
+HELD_OUT_ANSWERS = ["Sure, I'm {name}, from Surat originally.", "You can reach me on {phone}, any time after five.",
+                    "Pretty well actually, I finished with {hsc} overall.", "I ended up around the {jee} mark.",
+                    "Physics mostly, and a bit of electronics as a hobby.",
+                    "Somewhere close to home would be easier for my family.", "Nope, I think we covered everything."]
+
+CORPORA = {
+    'held-out': (HELD_OUT_GREETINGS, HELD_OUT_OPENERS, HELD_OUT_QUESTIONS, HELD_OUT_ASIDES, HELD_OUT_ANSWERS),
+    'dictionary': (["Hello! Welcome to the XYZ College admission interview. Are you ready to begin?"], OPENERS,
+                   QUESTIONS, ASIDES, ANSWERS),
+}
+
+def session_turns(rng, corpus):
+    greetings, openers, questions, asides, answers = CORPORA[corpus]
+    values = {'name': rng.choice(NAMES), 'phone': str(rng.randint(6000000000, 9999999999)),
+              'hsc': f'{rng.uniform(60, 99):.1f}', 'jee': f'{rng.uniform(50, 99.9):.2f}'}
+    turns = [('assistant', rng.choice(greetings))]
+    for answer in answers:
+        turns.append(('user', answer.format(**values)))
+        reply = ' '.join([rng.choice(openers)] + rng.sample(asides, rng.randint(0, 2)) + [rng.choice(questions)])
+        turns.append(('assistant', reply))
+    return turns
+
+def deflated_size(content, zdict=None):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict) if zdict else zlib.compressobj(9, zlib.DEFLATED, -15)
+    return len(compressor.compress(content.encode('utf-8')) + compressor.flush())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--corpus', choices=sorted(CORPORA), default='held-out')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        db = Database(path, pool_size=2)
+        db.migrate()
+        with db.connection() as conn:
+            start_size = conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+        log = TranscriptLog(db, Fernet.generate_key(), batch_size=args.batch_size, flush_interval=3600)
+        log._thread = object()  # no writer thread: batches are flushed below, so they can be timed
+
+        json_bytes = deflated_bytes = plain_deflated_bytes = 0
+        append_seconds = flush_seconds = 0.0
+        turns = 0
+        for n in range(args.sessions):
+            session_id = os.urandom(16).hex()
+            for seq, (role, content) in enumerate(session_turns(rng, args.corpus)):
+                json_bytes += len(json.dumps({'user_id': n, 'session_id': session_id, 'seq': seq, 'role': role,
+                                              'created_at': time.time(), 'content': content})) + 1
+                deflated_bytes += deflated_size(content, DICTIONARY)
+                plain_deflated_bytes += deflated_size(content)
+                start = time.perf_counter()
+                log.append(n, session_id, seq, role, content)
+                append_seconds += time.perf_counter() - start
+                turns += 1
+                if turns % args.batch_size == 0:
+                    start = time.perf_counter()
+                    log.flush()
+                    flush_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        log.flush()
+        flush_seconds += time.perf_counter() - start
+
+        with db.connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            size = conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+        db.close()
+        stats = log.stats()
+
+    print(json.dumps({
+        'config': vars(args),
+        'turns': turns,
+        'append_us_per_turn': append_seconds / turns * 1e6,
+        'writer_us_per_turn': flush_seconds / turns * 1e6,
+        'raw_json_bytes_per_turn': json_bytes / turns,
+        'content_bytes_per_turn': stats['content_bytes'] / turns,
+        'deflated_bytes_per_turn': deflated_bytes / turns,
+        'deflated_without_dictionary_bytes_per_turn': plain_deflated_bytes / turns,
+        'sealed_bytes_per_turn': stats['stored_bytes'] / turns,
+        'database_bytes_per_turn': (size - start_size) / turns,
+        'raw_json_to_database': json_bytes / (size - start_size),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
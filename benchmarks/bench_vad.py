@@ -0,0 +1,108 @@
+"""
+Measures the voice-activity trimming in front of the recognizer. Synthesizes push-to-talk
+clips (noise-floor silence, a burst of speech-like audio, more silence) and reports the
+VAD's CPU time per second of audio, how much of each clip it keeps, how many noise-only
+clips it rejects at each noise level, and what that does to the upload Google's recognizer
+gets (FLAC, as SpeechRecognition sends it). ASR latency is modelled as `--rtt` + upload
+time at `--upload-kbps` + `--recognize-rtf` x audio seconds.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import wave
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transcode
+from vad import EnergyVAD
+
+def make_clip(rng, lead, speech, trail, noise_dbfs=-60.0):
+    """
+    Silence at `noise_dbfs` around `speech` seconds of syllable-like bursts: harmonic tones
+    at a varying pitch under a 4 Hz envelope, at speaking level.
+    """
+    rate = transcode.SAMPLE_RATE
+    total = int((lead + speech + trail) * rate)
+    audio = rng.normal(0.0, 10 ** (noise_dbfs / 20), total)
+    t = np.arange(int(speech * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    start = int(lead * rate)
+    audio[start:start + len(t)] += 0.2 * voice * envelope
+    return (np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes()
+
+def flac_bytes(pcm):
+    if not pcm:
+        return 0
+    with tempfile.TemporaryDirectory() as directory:
+        source, target = os.path.join(directory, 'clip.wav'), os.path.join(directory, 'clip.flac')
+        with wave.open(source, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(transcode.SAMPLE_WIDTH)
+            f.setframerate(transcode.SAMPLE_RATE)
+            f.writeframes(pcm)
+        transcode.encode_file(source, target, 'flac')
+        return os.path.getsize(target)
+
+def asr_seconds(pcm, upload, args):
+    return args.rtt + upload * 8 / (args.upload_kbps * 1000) + transcode.pcm_duration(pcm) * args.recognize_rtf
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clips', type=int, default=20)
+    parser.add_argument('--lead', type=float, default=1.0, help='seconds of silence before the speech')
+    parser.add_argument('--speech', type=float, default=3.0, help='seconds of speech')
+    parser.add_argument('--trail', type=float, default=1.5, help='seconds of silence after the speech')
+    parser.add_argument('--runs', type=int, default=50, help='VAD passes per clip for the CPU timing')
+    parser.add_argument('--rtt', type=float, default=0.15)
+    parser.add_argument('--upload-kbps', type=float, default=1000.0)
+    parser.add_argument('--recognize-rtf', type=float, default=0.1, help='recognizer seconds per audio second')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vad = EnergyVAD()
+    clips = [make_clip(rng, args.lead * rng.uniform(0.5, 1.5), args.speech * rng.uniform(0.5, 1.5),
+                       args.trail * rng.uniform(0.5, 1.5)) for _ in range(args.clips)]
+    silent = {level: [make_clip(rng, args.lead + args.speech + args.trail, 0, 0, level) for _ in range(args.clips)]
+              for level in (-60.0, -45.0, -35.0, -25.0)}
+
+    audio_seconds = sum(transcode.pcm_duration(clip) for clip in clips) * args.runs
+    start = time.process_time()
+    for _ in range(args.runs):
+        for clip in clips:
+            vad.bounds(clip)
+    cpu = time.process_time() - start
+
+    full = {'pcm_bytes': 0, 'flac_bytes': 0, 'asr_s': []}
+    trimmed = {'pcm_bytes': 0, 'flac_bytes': 0, 'asr_s': []}
+    kept = []
+    for clip in clips:
+        speech = vad.trim(clip)
+        kept.append(transcode.pcm_duration(speech) / transcode.pcm_duration(clip))
+        for totals, pcm in ((full, clip), (trimmed, speech)):
+            upload = flac_bytes(pcm)
+            totals['pcm_bytes'] += len(pcm)
+            totals['flac_bytes'] += upload
+            totals['asr_s'].append(asr_seconds(pcm, upload, args))
+    for totals in (full, trimmed):
+        samples = sorted(totals.pop('asr_s'))
+        totals['asr_p50_s'] = samples[len(samples) // 2]
+        totals['asr_p95_s'] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    print(json.dumps({
+        'config': vars(args),
+        'vad_cpu_ms_per_audio_s': cpu / audio_seconds * 1000,
+        'kept_fraction_mean': sum(kept) / len(kept),
+        'noise_only_clips_rejected': {f'{level:g}_dbfs': sum(not vad.trim(clip) for clip in noise) / len(noise)
+                                      for level, noise in silent.items()},
+        'untrimmed': full,
+        'trimmed': trimmed,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
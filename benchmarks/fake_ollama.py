@@ -0,0 +1,143 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the Ollama /api/chat endpoint used by the benchmarks. Latency is modelled as a
+# prefill cost proportional to the prompt size plus a fixed per-token decode rate, which is
+# what makes repeated long-context requests expensive on a real local model. `parallel`, like
+# OLLAMA_NUM_PARALLEL, limits how many requests are processed at once; the rest wait their turn.
+# With `load_seconds`, the model starts unloaded: the first request loads it, and requests
+# arriving meanwhile wait for the load. A request with no messages only loads the model.
+
+DEFAULT_PROFILE = {
+    'name': 'Kaivan Mehta',
+    'phone': '+916351374519',
+    'hsc_marks': '95%',
+    'jee_percentile': '79%ile',
+}
+
+DEFAULT_REPLY = ("Thank you for sharing that. Could you please tell me your JEE percentile? "
+                 "Once I have it, we can move on to the next step of your admission interview.")
+
+FIELD_QUESTIONS = {
+    'full name': 'name',
+    'mobile number': 'phone',
+    'hsc': 'hsc_marks',
+    'jee percentile': 'jee_percentile',
+}
+
+class FakeOllama:
+    def __init__(self, host='127.0.0.1', port=0, prefill_chars_per_s=40000.0, tokens_per_s=40.0,
+                 profile=None, corrupt_fields=(), reply=DEFAULT_REPLY, parallel=None, load_seconds=0.0):
+        self.prefill_chars_per_s = prefill_chars_per_s
+        self.tokens_per_s = tokens_per_s
+        self.profile = dict(profile or DEFAULT_PROFILE)
+        self.corrupt_fields = set(corrupt_fields)
+        self.reply = reply
+        self._slots = threading.Semaphore(parallel) if parallel else None
+        self.load_seconds = load_seconds
+        self.loaded = not load_seconds
+        self._load_lock = threading.Lock()
+        self.request_count = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/chat'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.request_count = 0
+            self.prompt_chars = 0
+
+    def load(self):
+        with self._load_lock:
+            if not self.loaded:
+                time.sleep(self.load_seconds)
+                self.loaded = True
+
+    def answer(self, body):
+        """Picks the reply content for a chat request."""
+        if not body.get('messages'):
+            return ''
+        if body.get('format'):
+            data = {k: ('??' if k in self.corrupt_fields else v) for k, v in self.profile.items()}
+            return json.dumps(data)
+        last = body['messages'][-1] if body.get('messages') else {}
+        question = last.get('content', '').lower() if last.get('role') == 'user' else ''
+        for phrase, field in FIELD_QUESTIONS.items():
+            if phrase in question:
+                return self.profile.get(field) or 'None'
+        return self.reply
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                prompt_chars = sum(len(m.get('content', '')) for m in body.get('messages', []))
+                with fake._lock:
+                    fake.request_count += 1
+                    fake.prompt_chars += prompt_chars
+                fake.load()
+                if fake._slots is not None:
+                    fake._slots.acquire()
+                try:
+                    time.sleep(prompt_chars / fake.prefill_chars_per_s)
+                    tokens = [t + ' ' for t in fake.answer(body).split(' ')]
+                    self._respond(body, tokens)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the request mid-stream
+                    pass
+                finally:
+                    if fake._slots is not None:
+                        fake._slots.release()
+
+            def _respond(self, body, tokens):
+                if body.get('stream', True):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-ndjson')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(1.0 / fake.tokens_per_s)
+                        self._chunk({'message': {'role': 'assistant', 'content': token}, 'done': False})
+                    self._chunk({'message': {'role': 'assistant', 'content': ''}, 'done': True})
+                    self.wfile.write(b'0\r\n\r\n')
+                else:
+                    time.sleep(len(tokens) / fake.tokens_per_s)
+                    data = json.dumps({'message': {'role': 'assistant', 'content': ''.join(tokens).strip()},
+                                       'done': True}).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+            def _chunk(self, obj):
+                line = (json.dumps(obj) + '\n').encode()
+                self.wfile.write(f'{len(line):x}\r\n'.encode() + line + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,120 @@
+import json
+import hashlib
+import threading
+
+# Rough token count for English text; close enough to budget a prompt without loading
+# the model's tokenizer
+CHARS_PER_TOKEN = 4
+# Role and template markers Ollama adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier part of this conversation (the turns below follow on from it):\n"
+SUMMARIZE_PROMPT = ("You maintain a running summary of an admission interview between a counsellor bot and an "
+                    "applicant. Update the existing summary with the new turns. Keep every detail the applicant "
+                    "gave (name, phone number, HSC marks, JEE percentile, corrections), what is still missing, and "
+                    "any open question. Write plain prose in under 150 words and output only the summary.")
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def message_tokens(message):
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+def history_digest(turns):
+    return hashlib.sha256(json.dumps(turns, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ContextWindow:
+    """
+    Builds the chat prompt for a turn within a token budget: the system prompt, then a
+    rolling summary of older turns, then the most recent turns verbatim.
+
+    Older turns are folded into the summary in batches, once the conversation (summary plus
+    verbatim turns) grows past `fold_tokens`, leaving about `keep_tokens` of recent turns.
+    Between folds every prompt extends the previous one byte for byte, so Ollama can reuse
+    its KV cache for the prefix. Folding is planned here but run by the
+    caller off the request path; until it finishes the turns stay verbatim. If the whole
+    prompt would still exceed `max_tokens`, the oldest verbatim turns are dropped.
+    """
+
+    def __init__(self, max_tokens=3584, fold_tokens=1536, keep_tokens=512):
+        self.max_tokens = max_tokens
+        self.fold_tokens = fold_tokens
+        self.keep_tokens = keep_tokens
+        self._lock = threading.Lock()
+        self._stats = {'prompts': 0, 'folds_planned': 0, 'truncated_turns': 0, 'last_prompt_tokens': 0}
+
+    def valid_summary(self, history, summary):
+        """
+        Returns the stored summary if it still describes the start of this history (the
+        history may have been reset since it was written), otherwise None.
+        """
+        if not summary or summary['upto'] > len(history):
+            return None
+        if summary['digest'] != history_digest(history[:summary['upto']]):
+            return None
+        return summary
+
+    def build(self, system_prompt, history, summary=None):
+        """
+        Returns (messages, fold). `fold` is None, or the turns to fold into the summary as
+        {'previous': summary text, 'turns': [...], 'upto': index, 'digest': ...}.
+        """
+        summary = self.valid_summary(history, summary)
+        prefix = [{'role': 'system', 'content': system_prompt}]
+        start = 0
+        if summary:
+            prefix.append({'role': 'system', 'content': SUMMARY_PREFIX + summary['summary']})
+            start = summary['upto']
+        tail = history[start:]
+        conversation_tokens = sum(message_tokens(m) for m in prefix[1:] + tail)
+        tokens = message_tokens(prefix[0]) + conversation_tokens
+
+        fold = None
+        if conversation_tokens > self.fold_tokens:
+            upto = self._fold_point(history, start)
+            if upto > start:
+                fold = {
+                    'previous': summary['summary'] if summary else '', 'turns': history[start:upto],
+                    'upto': upto, 'digest': history_digest(history[:upto]),
+                }
+
+        dropped = 0
+        while tokens > self.max_tokens and len(tail) - dropped > 1:
+            tokens -= message_tokens(tail[dropped])
+            dropped += 1
+        with self._lock:
+            self._stats['prompts'] += 1
+            self._stats['folds_planned'] += fold is not None
+            self._stats['truncated_turns'] += dropped
+            self._stats['last_prompt_tokens'] = tokens
+        return prefix + tail[dropped:], fold
+
+    def _fold_point(self, history, start):
+        # Keep the newest turns that fit in keep_tokens, and always at least the last one
+        kept = 0
+        upto = len(history)
+        while upto > start + 1 and kept + message_tokens(history[upto - 1]) <= self.keep_tokens:
+            upto -= 1
+            kept += message_tokens(history[upto])
+        upto = min(upto, len(history) - 1)
+        # Start the verbatim part on a user turn so a question and its answer stay together
+        aligned = upto
+        while aligned > start and history[aligned]['role'] != 'user':
+            aligned -= 1
+        return aligned if aligned > start else upto
+
+    def summary_request(self, fold):
+        """
+        The chat messages asking the model for the updated summary.
+        """
+        transcript = '\n'.join(f"{turn['role']}: {turn['content']}" for turn in fold['turns'])
+        return [
+            {'role': 'system', 'content': SUMMARIZE_PROMPT},
+            {'role': 'user', 'content': f"Existing summary:\n{fold['previous'] or '(none)'}\n\nNew turns:\n{transcript}"},
+        ]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'max_tokens': self.max_tokens, 'fold_tokens': self.fold_tokens, 'keep_tokens': self.keep_tokens})
+        return stats
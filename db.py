@@ -0,0 +1,277 @@
+import os
+import queue
+import sqlite3
+import argparse
+import contextlib
+
+# --- Schema Migrations ---
+# Applied in order; PRAGMA user_version records how many have run, so existing
+# conversation_history.db files are brought up to date on startup.
+MIGRATIONS = [
+    # 1: the original schema
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        hash TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Main (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        info_json TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        duration TEXT,
+        updated_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+    ''',
+    # 2: one profile row per user. Older databases may hold duplicates from the
+    # read-then-insert race; the most recent row of each user is kept.
+    '''
+    DELETE FROM Main WHERE user_id IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM Main GROUP BY user_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS main_user_id ON Main(user_id);
+    ''',
+    # 3: date-range exports (decrypt_and_display.py --since/--until)
+    '''
+    CREATE INDEX IF NOT EXISTS main_updated_at ON Main(updated_at);
+    ''',
+    # 4: profile fields extracted turn by turn, until the conversation is saved
+    '''
+    CREATE TABLE IF NOT EXISTS turn_profiles (
+        conversation_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        user_id INTEGER,
+        fields TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (conversation_id, seq)
+    );
+    CREATE INDEX IF NOT EXISTS turn_profiles_created_at ON turn_profiles(created_at);
+    ''',
+    # 5: the append-only transcript log (transcript_log.py); content is compressed and encrypted
+    '''
+    CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        session_id BLOB NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        format INTEGER NOT NULL,
+        content BLOB NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS turns_user_session_seq ON turns(user_id, session_id, seq);
+    ''',
+    # 6: conversations whose profile is saved; a turn extraction that finishes later is dropped
+    '''
+    CREATE TABLE IF NOT EXISTS saved_conversations (
+        conversation_id TEXT PRIMARY KEY,
+        saved_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS saved_conversations_saved_at ON saved_conversations(saved_at);
+    ''',
+]
+
+# --- Statements ---
+# Kept as constants so each is compiled once per pooled connection and then served from
+# sqlite3's statement cache.
+SELECT_USER_BY_NAME = 'SELECT id, username, hash FROM users WHERE username = ?'
+INSERT_USER = 'INSERT INTO users (username, hash) VALUES (?, ?)'
+SELECT_PROFILE = 'SELECT info_json FROM Main WHERE user_id = ?'
+UPSERT_PROFILE = '''
+    INSERT INTO Main (user_id, info_json, start_time, end_time, duration, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        info_json = excluded.info_json, start_time = excluded.start_time, end_time = excluded.end_time,
+        duration = excluded.duration, updated_at = excluded.updated_at
+'''
+# A re-run of a turn replaces its earlier result; a turn of a conversation already saved is dropped
+PUT_TURN_PROFILE = '''
+    INSERT OR REPLACE INTO turn_profiles (conversation_id, seq, user_id, fields, created_at)
+    SELECT ?1, ?2, ?3, ?4, ?5 WHERE NOT EXISTS (SELECT 1 FROM saved_conversations WHERE conversation_id = ?1)
+'''
+SELECT_TURN_PROFILES = 'SELECT seq, fields FROM turn_profiles WHERE conversation_id = ? ORDER BY seq'
+DELETE_TURN_PROFILES = 'DELETE FROM turn_profiles WHERE conversation_id = ?'
+PURGE_TURN_PROFILES = 'DELETE FROM turn_profiles WHERE created_at < ?'
+SELECT_SAVED_CONVERSATION = 'SELECT 1 FROM saved_conversations WHERE conversation_id = ?'
+INSERT_SAVED_CONVERSATION = 'INSERT OR REPLACE INTO saved_conversations (conversation_id, saved_at) VALUES (?, ?)'
+PURGE_SAVED_CONVERSATIONS = 'DELETE FROM saved_conversations WHERE saved_at < ?'
+INSERT_TURN = '''
+    INSERT OR IGNORE INTO turns (user_id, session_id, seq, role, created_at, format, content) VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# --- Connection Pool ---
+# Primary SQLite result codes after which a pooled connection is not reused: the database
+# file is unreadable, corrupt or gone. SQLITE_IOERR, SQLITE_CORRUPT, SQLITE_CANTOPEN and
+# SQLITE_NOTADB; the sqlite3 module only names them from Python 3.11.
+BROKEN_CONNECTION_CODES = {10, 11, 14, 26}
+
+def _is_broken(error):
+    """Whether `error` leaves the connection it was raised on in an unknown state."""
+    code = getattr(error, 'sqlite_errorcode', None)  # Python 3.11+, errors raised by SQLite itself
+    if code is not None:
+        return code & 0xff in BROKEN_CONNECTION_CODES
+    # Constraint violations and bad values leave the connection as it was
+    return not isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError))
+
+class Database:
+    """
+    Thread-safe pool of SQLite connections to the app database, opened in WAL mode so the
+    request threads and the background job workers can read while one of them writes.
+    """
+
+    def __init__(self, path, pool_size=8, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._pool = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(None)  # connections are opened on first use
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=64)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-8000')
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool, blocking while all of them are in use.
+        """
+        conn = self._pool.get(timeout=self.timeout)
+        try:
+            if conn is None:
+                conn = self._open()
+            yield conn
+        except sqlite3.Error as e:
+            # Don't hand a connection in an unknown state to the next caller
+            if conn is not None and _is_broken(e):
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def execute(self, sql, *params):
+        """
+        Runs one statement and returns its rows as dicts.
+        """
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def pending_migrations(self):
+        """
+        The number of migrations not yet applied to the database.
+        """
+        return max(0, len(MIGRATIONS) - self.execute('PRAGMA user_version')[0]['user_version'])
+
+    def migrate(self):
+        with self.connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.executescript(f'BEGIN IMMEDIATE; {script} PRAGMA user_version = {number}; COMMIT;')
+                print(f"Applied database migration {number}.")
+
+    def close(self):
+        """
+        Closes the idle connections. The pool stays usable and opens new ones on demand.
+        """
+        for _ in range(self._pool.qsize()):
+            conn = self._pool.get_nowait()
+            if conn is not None:
+                conn.close()
+            self._pool.put(None)
+
+    # --- Queries ---
+    def get_user(self, username):
+        rows = self.execute(SELECT_USER_BY_NAME, username)
+        return rows[0] if rows else None
+
+    def create_user(self, username, hash_pass):
+        """
+        Returns False if the username is already taken.
+        """
+        try:
+            self.execute(INSERT_USER, username, hash_pass)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def get_profile(self, user_id):
+        """
+        Returns the encrypted info_json of a user, or None.
+        """
+        rows = self.execute(SELECT_PROFILE, user_id)
+        return rows[0]['info_json'] if rows else None
+
+    def upsert_profile(self, user_id, info_json, start_time, end_time, duration, updated_at):
+        self.execute(UPSERT_PROFILE, user_id, info_json, start_time, end_time, duration, updated_at)
+
+    def put_turn_profile(self, conversation_id, seq, user_id, fields, created_at):
+        """
+        Stores a turn's result. Returns False if the conversation was saved first, in which
+        case nothing is stored.
+        """
+        with self.connection() as conn:
+            return conn.execute(PUT_TURN_PROFILE, (conversation_id, seq, user_id, fields, created_at)).rowcount > 0
+
+    def get_turn_profiles(self, conversation_id):
+        """
+        Returns the (seq, encrypted fields) of a conversation's extracted turns, in order.
+        """
+        return [(row['seq'], row['fields']) for row in self.execute(SELECT_TURN_PROFILES, conversation_id)]
+
+    def finish_turn_profiles(self, conversation_id, saved_at):
+        """
+        Deletes a conversation's turn results once its profile is saved, and records it as
+        saved so results still on their way are not stored.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(DELETE_TURN_PROFILES, (conversation_id,))
+            conn.execute(INSERT_SAVED_CONVERSATION, (conversation_id, saved_at))
+            conn.execute('COMMIT')
+
+    def is_conversation_saved(self, conversation_id):
+        return bool(self.execute(SELECT_SAVED_CONVERSATION, conversation_id))
+
+    def purge_turn_profiles(self, before):
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(PURGE_TURN_PROFILES, (before,))
+            conn.execute(PURGE_SAVED_CONVERSATIONS, (before,))
+            conn.execute('COMMIT')
+
+    def insert_turns(self, rows):
+        """
+        Appends transcript turns, (user_id, session_id, seq, role, created_at, format, content)
+        tuples, in one transaction.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(INSERT_TURN, rows)
+            conn.execute('COMMIT')
+
+# --- CLI ---
+def main():
+    path = os.path.join(os.getenv('DATA_DIR', os.path.dirname(os.path.abspath(__file__))), 'conversation_history.db')
+    parser = argparse.ArgumentParser(description='Create or migrate the app database without starting the app.')
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('--db', default=path)
+    args = parser.parse_args()
+
+    db = Database(args.db, pool_size=1)
+    db.migrate()
+    version = db.execute('PRAGMA user_version')[0]['user_version']
+    db.close()
+    print(f"{args.db} is at schema version {version}.")
+
+if __name__ == '__main__':
+    main()
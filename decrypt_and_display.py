@@ -1,12 +1,53 @@
 import os
+import sys
+import csv
 import json
-import sqlite3
+import argparse
+import datetime
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
 from cryptography.fernet import Fernet
+from db import Database
+import transcript_log
+
+load_dotenv()
 
 # Define the database path and key file path
-# These paths are relative to the script's location
-DB_PATH = os.path.join(os.path.dirname(__file__), 'conversation_history.db')
-KEY_FILE = os.path.join(os.path.dirname(__file__), 'keys', 'secret.key')
+# These live in DATA_DIR (default: the script's directory), as in app.py
+DATA_DIR = os.getenv('DATA_DIR', os.path.dirname(__file__))
+DB_PATH = os.path.join(DATA_DIR, 'conversation_history.db')
+KEY_FILE = os.path.join(DATA_DIR, 'keys', 'secret.key')
+
+# Rows are read in id order, so an export can be resumed from the last id it wrote. A full
+# export walks the table by id; an updated_at range is looked up in the main_updated_at
+# index and its rows sorted by id.
+SELECT_RECORDS = '''
+    SELECT
+        M.id,
+        M.user_id,
+        U.username,
+        M.start_time,
+        M.end_time,
+        M.duration,
+        M.updated_at,
+        M.info_json
+    FROM Main AS M {index}
+    JOIN users AS U ON M.user_id = U.id
+    WHERE M.id > ? {range}
+    ORDER BY M.id ASC
+'''
+FIELDS = ['id', 'user_id', 'username', 'start_time', 'end_time', 'duration', 'updated_at']
+
+# The transcript log, read in the same resumable id order. A user's (or one session's) turns
+# are a range of the (user_id, session_id, seq) index.
+SELECT_TURNS = '''
+    SELECT id, user_id, session_id, seq, role, created_at, format, content
+    FROM turns {index}
+    WHERE id > ? {range}
+    ORDER BY id ASC
+'''
+TURN_FIELDS = ['id', 'user_id', 'session_id', 'seq', 'role', 'created_at']
 
 def load_key():
     """
@@ -17,10 +58,10 @@ def load_key():
             return f.read()
     except FileNotFoundError:
         print(f"Error: Key file not found at {KEY_FILE}. "
-              "Please ensure 'secret.key' exists in the 'keys' directory.")
+              "Please ensure 'secret.key' exists in the 'keys' directory.", file=sys.stderr)
         exit(1)
     except Exception as e:
-        print(f"Error loading encryption key: {e}")
+        print(f"Error loading encryption key: {e}", file=sys.stderr)
         exit(1)
 
 def decrypt_data(enc_data, fernet):
@@ -36,82 +77,271 @@ def decrypt_data(enc_data, fernet):
             return f"[Decryption failed: Invalid or tampered token. Key might be wrong or data corrupted.]"
         return f"[Decryption failed: {e}]"
 
-def main():
+# --- Decryption Workers ---
+_fernet = None
+_sealer = None
+
+def _init_worker(key):
+    global _fernet, _sealer
+    _fernet = Fernet(key)
+    _sealer = transcript_log.TurnSealer(key)
+
+def decrypt_batch(rows):
     """
-    Main function to connect to the database, decrypt, and display user data.
-    It now joins with the 'users' table to show usernames.
+    Runs in a worker process. Decrypts a batch of (fields..., info_json) tuples into record
+    dicts, with the profile parsed into `info`, or `error` set if it could not be read.
     """
-    # Load the encryption key
-    key = load_key()
-    fernet = Fernet(key)
+    records = []
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        decrypted_raw = decrypt_data(row[-1], _fernet)
+        try:
+            record['info'], record['error'] = json.loads(decrypted_raw), None
+        except json.JSONDecodeError:
+            # Either a decryption failure message or decrypted text that is not JSON
+            record['info'], record['error'] = None, decrypted_raw
+        records.append(record)
+    return records
+
+def decrypt_turn_batch(rows):
+    """
+    Runs in a worker process. Decrypts a batch of transcript rows into turn dicts with the
+    text in `content`, or `error` set if it could not be read.
+    """
+    turns = []
+    for row in rows:
+        turn = dict(zip(TURN_FIELDS, row))
+        turn['session_id'] = row[2].hex()
+        turn['created_at'] = datetime.datetime.fromtimestamp(turn['created_at'], datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            turn['content'], turn['error'] = _sealer.unseal(*row[1:5], row[6], row[7]), None
+        except Exception as e:
+            turn['content'], turn['error'] = None, f"[Decryption failed: {type(e).__name__}]"
+        turns.append(turn)
+    return turns
+
+# --- Output Formats ---
+class TextWriter:
+    """The original human-readable listing."""
+
+    def __init__(self, out):
+        self.out = out
+        print("--- Decrypted User Data ---", file=out)
+
+    def write(self, record):
+        print(f"\nRecord ID: {record['id']}", file=self.out)
+        print(f"  User ID: {record['user_id']}", file=self.out)
+        print(f"  Username: {record['username']}", file=self.out)
+        print(f"  Conversation Start: {record['start_time']}", file=self.out)
+        print(f"  Conversation End: {record['end_time']}", file=self.out)
+        print(f"  Duration: {record['duration']} seconds", file=self.out)
+        print(f"  Last Updated: {record['updated_at']}", file=self.out)
+        if isinstance(record['info'], dict):
+            print("  Extracted User Info:", file=self.out)
+            for k, v in record['info'].items():
+                print(f"    - {k}: {v}", file=self.out)
+        elif record['error'] is not None:
+            print(f"  Decrypted Info (not valid JSON): {record['error']}", file=self.out)
+        else:
+            print(f"  Decrypted Info: {record['info']}", file=self.out)
+
+class TurnTextWriter:
+    def __init__(self, out):
+        self.out = out
+        self.session = None
+        print("--- Decrypted Transcripts ---", file=out)
+
+    def write(self, turn):
+        if turn['session_id'] != self.session:
+            self.session = turn['session_id']
+            print(f"\nSession {turn['session_id']} (User ID: {turn['user_id']})", file=self.out)
+        text = turn['content'] if turn['error'] is None else turn['error']
+        print(f"  [{turn['seq']}] {turn['created_at']} {turn['role']}: {text}", file=self.out)
+
+class JsonlWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+class CsvWriter:
+    """One row per record; the profile is a JSON string in the `info` column."""
+    columns = FIELDS + ['info', 'error']
+
+    def __init__(self, out, header=True):
+        self.writer = csv.writer(out, lineterminator='\n')
+        if header:
+            self.writer.writerow(self.columns)
+
+    def write(self, record):
+        record = dict(record, info=json.dumps(record['info'], ensure_ascii=False) if record['info'] is not None else '')
+        self.writer.writerow(['' if record[c] is None else record[c] for c in self.columns])
+
+class TurnCsvWriter(CsvWriter):
+    """One row per turn."""
+    columns = TURN_FIELDS + ['content', 'error']
+
+    def write(self, turn):
+        self.writer.writerow(['' if turn[c] is None else turn[c] for c in self.columns])
+
+def resume_point(path, fmt):
+    """
+    Returns the last record id written to an earlier export at `path` (0 if there is none),
+    after cutting off a trailing partial line left by an interrupted run.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        # Records are single lines, so the last complete one is within the file's tail
+        size = f.seek(0, os.SEEK_END)
+        tail_start = max(0, size - 1024 * 1024)
+        f.seek(tail_start)
+        tail = f.read()
+        end = tail.rfind(b'\n') + 1
+        if tail_start + end < size:
+            f.truncate(tail_start + end)
+        lines = tail[:end].splitlines()
+    if not lines or (fmt == 'csv' and lines[-1].startswith(b'id,')):
+        return 0
+    last = lines[-1].decode('utf-8')
+    if fmt == 'jsonl':
+        return json.loads(last)['id']
+    return int(next(csv.reader([last]))[0])
+
+def parse_time(value):
+    """Normalizes a --since/--until date or datetime to updated_at's UTC 'YYYY-MM-DD HH:MM:SS'."""
+    try:
+        return datetime.datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date or datetime: {value}")
 
-    conn = None # Initialize conn to None for finally block
+def parse_session_id(value):
+    """A --session-id conversation id (32 hex digits) as the 16 bytes the turns table stores."""
     try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(DB_PATH)
-        # Set the row_factory to sqlite3.Row to access columns by name
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-
-        # SQL query to select data from 'Main' and join with 'users' to get the username.
-        # We use aliases (M for Main, U for users) for clarity.
-        cur.execute('''
-            SELECT
-                M.id,
-                U.username,
-                M.user_id,
-                M.info_json,
-                M.start_time,
-                M.end_time,
-                M.duration,
-                M.updated_at
-            FROM Main AS M
-            JOIN users AS U ON M.user_id = U.id
-            ORDER BY M.id ASC
-        ''')
-        rows = cur.fetchall()
+        session_id = bytes.fromhex(value)
+    except ValueError:
+        session_id = b''
+    if len(session_id) != 16:
+        raise argparse.ArgumentTypeError(f"not a conversation id: {value}")
+    return session_id
+
+def record_query(args):
+    conditions, params = '', [args.after_id]
+    if args.since:
+        conditions, params = conditions + 'AND M.updated_at >= ? ', params + [args.since]
+    if args.until:
+        conditions, params = conditions + 'AND M.updated_at < ? ', params + [args.until]
+    # The planner would otherwise walk the whole table for the ORDER BY
+    index = 'INDEXED BY main_updated_at' if conditions else ''
+    return SELECT_RECORDS.format(index=index, range=conditions), params
+
+def turn_query(args):
+    conditions, params = '', [args.after_id]
+    if args.user_id is not None:
+        conditions, params = conditions + 'AND user_id = ? ', params + [args.user_id]
+    if args.session_id:
+        conditions, params = conditions + 'AND session_id = ? ', params + [args.session_id]
+    index = 'INDEXED BY turns_user_session_seq' if args.user_id is not None else ''
+    return SELECT_TURNS.format(index=index, range=conditions), params
 
+def read_batches(conn, query, params, batch_size):
+    """
+    Streams the selected rows from one cursor in batches of plain tuples, which (unlike
+    sqlite3.Row) can be sent to the worker processes.
+    """
+    cur = conn.execute(query, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
         if not rows:
-            print('No records found in the Main table.')
             return
+        yield [tuple(row) for row in rows]
 
-        print("--- Decrypted User Data ---")
-        for row in rows:
-            print(f"\nRecord ID: {row['id']}")
-            print(f"  User ID: {row['user_id']}")
-            print(f"  Username: {row['username']}") # Display the fetched username
-            print(f"  Conversation Start: {row['start_time']}")
-            print(f"  Conversation End: {row['end_time']}")
-            print(f"  Duration: {row['duration']} seconds")
-            print(f"  Last Updated: {row['updated_at']}")
-
-            # Decrypt the info_json column
-            decrypted_raw = decrypt_data(row['info_json'], fernet)
-
-            try:
-                # Attempt to parse the decrypted string as JSON
-                data = json.loads(decrypted_raw)
-                print("  Extracted User Info:")
-                # Iterate and print each key-value pair from the JSON
-                for k, v in data.items():
-                    print(f"    - {k}: {v}")
-            except json.JSONDecodeError:
-                # If decryption was successful but parsing failed (e.g., not valid JSON)
-                print(f"  Decrypted Info (not valid JSON): {decrypted_raw}")
-            except Exception as e:
-                # Catch any other unexpected errors during processing
-                print(f"  Error processing info_json: {e}")
-                print(f"  Decrypted Info (raw): {decrypted_raw}")
-
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+def export(db, args, out, key, header=True):
+    """
+    Decrypts the selected records across a process pool and writes them to `out` in id order.
+    At most a few batches per worker are in flight, so memory stays flat whatever the table
+    size. Returns the number of records written.
+    """
+    if args.turns:
+        query, params = turn_query(args)
+        decrypt = decrypt_turn_batch
+        writers = {'text': TurnTextWriter, 'jsonl': JsonlWriter, 'csv': TurnCsvWriter}
+    else:
+        query, params = record_query(args)
+        decrypt = decrypt_batch
+        writers = {'text': TextWriter, 'jsonl': JsonlWriter, 'csv': CsvWriter}
+    writer = writers[args.format](out, header=header) if args.format == 'csv' else writers[args.format](out)
+
+    count = 0
+    pending = collections.deque()
+    with db.connection() as conn, ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(key,)) as pool:
+        # Let a large range's sort spill to disk instead of memory
+        conn.execute('PRAGMA temp_store=FILE')
+        def drain(limit):
+            nonlocal count
+            while len(pending) > limit:
+                for record in pending.popleft().result():
+                    writer.write(record)
+                    count += 1
+                out.flush()
+
+        for batch in read_batches(conn, query, params, args.batch_size):
+            pending.append(pool.submit(decrypt, batch))
+            drain(args.workers * 2)
+        drain(0)
+    return count
+
+def main():
+    """
+    Exports the users' decrypted profiles (the 'Main' table joined with 'users' for usernames),
+    or with --turns the conversation transcripts, as text, JSONL or CSV.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--format', choices=['text', 'jsonl', 'csv'], default='text')
+    parser.add_argument('-o', '--output', help='file to write to (default: stdout)')
+    parser.add_argument('--since', type=parse_time, help='only records updated at or after this UTC date/time')
+    parser.add_argument('--until', type=parse_time, help='only records updated before this UTC date/time')
+    parser.add_argument('--after-id', type=int, default=0, help='only records with a larger id')
+    parser.add_argument('--turns', action='store_true', help='export the transcript log instead of the profiles')
+    parser.add_argument('--user-id', type=int, help='with --turns: only this user\'s turns')
+    parser.add_argument('--session-id', type=parse_session_id, help='with --turns: only this conversation\'s turns')
+    parser.add_argument('--resume', action='store_true', help='append to --output after the last record it holds')
+    parser.add_argument('--batch-size', type=int, default=500, help='rows read and decrypted per batch')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='decryption processes')
+    args = parser.parse_args()
+
+    if args.turns and (args.since or args.until):
+        parser.error('--since/--until select profiles; use --user-id/--session-id/--after-id with --turns')
+    if not args.turns and (args.user_id is not None or args.session_id):
+        parser.error('--user-id/--session-id need --turns')
+    if args.resume:
+        if not args.output or args.format == 'text':
+            parser.error('--resume needs --output and --format jsonl or csv')
+        args.after_id = max(args.after_id, resume_point(args.output, args.format))
+    if not os.path.exists(DB_PATH):
+        print(f"Error: Database not found at {DB_PATH}.", file=sys.stderr)
+        exit(1)
+    db = Database(DB_PATH, pool_size=1)
+    # The export only reads: migrating, which can rewrite rows and lock out the app, is left to db.py
+    if db.pending_migrations():
+        print(f"Error: The database at {DB_PATH} is not up to date. Run `python db.py migrate` first.",
+              file=sys.stderr)
+        exit(1)
+
+    # Load the encryption key
+    key = load_key()
+    out = open(args.output, 'a' if args.resume else 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        # A resumed CSV export already has its header
+        count = export(db, args, out, key, header=out.tell() == 0 if args.resume else True)
     finally:
-        # Ensure the database connection is closed
-        if conn:
-            conn.close()
-            print("\nDatabase connection closed.")
+        db.close()
+        if out is not sys.stdout:
+            out.close()
+    if count == 0 and args.format == 'text':
+        print('No turns found in the transcript log.' if args.turns else 'No records found in the Main table.')
+    print(f"Exported {count} records.", file=sys.stderr)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,325 @@
+import re
+import json
+import threading
+
+# --- Extraction Schema ---
+# Every field the extractor collects. Adding a field here adds it to the single-pass JSON
+# schema and to the per-field fallback questions; no other code needs to change.
+EXTRACTION_FIELDS = {
+    'name': {
+        'question': 'What is the full name of the user?',
+        'description': "The user's full name, for example 'kaivan mehta'.",
+        'pattern': r"[^\W\d_]",
+    },
+    'phone': {
+        'question': 'What is the mobile number of the user?',
+        'description': "The user's mobile number, for example '+916351374519' or '6351372519'.",
+        'pattern': r"^\+?[\d\s\-()]{10,16}$",
+    },
+    'hsc_marks': {
+        'question': 'What are the HSC/12th percentage of the user?',
+        'description': "The user's HSC/12th percentage, for example '95%'.",
+        'pattern': r"^(100(\.0+)?|\d{1,2}(\.\d+)?)\s*%?$",
+    },
+    'jee_percentile': {
+        'question': 'What is the JEE Percentile of the user?',
+        'description': "The user's JEE percentile, for example '79%ile'.",
+        'pattern': r"^(100(\.0+)?|\d{1,2}(\.\d+)?)\s*(%ile|%|percentile)?$",
+    },
+}
+
+SINGLE_PASS_PROMPT = ("Extract the following details about the user from the conversation above and reply with "
+                      "a JSON object only. Use null for anything the user has not provided.\n")
+
+def build_schema(fields):
+    """
+    Builds the JSON schema passed as Ollama's `format` for a single-pass extraction.
+    """
+    return {
+        'type': 'object',
+        'properties': {
+            name: {'type': ['string', 'null'], 'description': spec['description']}
+            for name, spec in fields.items()
+        },
+        'required': list(fields),
+    }
+
+def is_missing(value):
+    return value is None or str(value).strip().lower() in ['none', 'null', '']
+
+def validate_field(name, value):
+    """
+    Returns True if the value is a usable answer for the field. A missing value is valid,
+    it just means the user never said it.
+    """
+    if is_missing(value):
+        return True
+    if not isinstance(value, str):
+        return False
+    pattern = EXTRACTION_FIELDS[name]['pattern']
+    return re.search(pattern, value.strip()) is not None
+
+def extract_sequential(query, context_messages, fields=EXTRACTION_FIELDS):
+    """
+    Asks one question per field, the original extraction mode. `query(messages, format)`
+    returns the model's reply text.
+    """
+    return {
+        name: query(context_messages + [{'role': 'user', 'content': spec['question']}], None)
+        for name, spec in fields.items()
+    }
+
+def extract_single_pass(query, context_messages, fields=EXTRACTION_FIELDS):
+    """
+    Extracts every field with one schema-constrained request, then re-asks only the fields
+    whose values failed to parse or validate.
+    """
+    field_list = '\n'.join(f"- {name}: {spec['description']}" for name, spec in fields.items())
+    messages = context_messages + [{'role': 'user', 'content': SINGLE_PASS_PROMPT + field_list}]
+    reply = query(messages, build_schema(fields))
+
+    try:
+        parsed = json.loads(reply)
+        if not isinstance(parsed, dict):
+            parsed = {}
+    except (TypeError, ValueError):
+        print(f"Single-pass extraction returned invalid JSON: {reply!r}")
+        parsed = {}
+
+    data = {}
+    retry = {}
+    for name, spec in fields.items():
+        value = parsed.get(name)
+        if name in parsed and validate_field(name, value):
+            data[name] = None if is_missing(value) else value.strip()
+        else:
+            retry[name] = spec
+
+    if retry:
+        print(f"Re-querying fields that failed validation: {', '.join(retry)}")
+        data.update(extract_sequential(query, context_messages, retry))
+    return data
+
+# --- Incremental Extraction ---
+TURN_PROMPT = ("\nAlready known about the user: {profile}\nOnly extract details the user gives in the exchange "
+               "below; use null for anything they do not mention in it.")
+
+def turn_context(system_prompt, profile, question, user_text, reply_text):
+    """
+    The extraction context for one turn: the profile known so far, the question the user
+    answered, their answer and the reply to it. Its size does not grow with the conversation.
+    """
+    messages = [{'role': 'system', 'content': system_prompt + TURN_PROMPT.format(profile=json.dumps(profile or {}))}]
+    if question:
+        messages.append({'role': 'assistant', 'content': question})
+    messages.append({'role': 'user', 'content': user_text})
+    if reply_text:
+        messages.append({'role': 'assistant', 'content': reply_text})
+    return messages
+
+def changed_fields(extracted, profile):
+    """
+    The extracted values that are not missing and differ from `profile`. A value the model
+    only repeated from the profile it was shown is dropped, so an extraction that ran before
+    a later correction was known cannot undo it.
+    """
+    profile = profile or {}
+    return {
+        name: value for name, value in extracted.items()
+        if not is_missing(value) and str(value).strip().lower() != str(profile.get(name) or '').strip().lower()
+    }
+
+def merge_turns(profile, turns):
+    """
+    Applies per-turn results, a list of (seq, fields), to `profile` in conversation order, so
+    a later answer wins. The same turns give the same profile whatever order they were
+    extracted in and however often each one was.
+    """
+    merged = dict(profile or {})
+    for _, fields in sorted(turns, key=lambda turn: turn[0]):
+        merged.update(fields)
+    return merged
+
+# --- Rule-Based Fast Path ---
+# Regular fields are read from the user's turns with precompiled patterns before any LLM
+# request. Each rule returns (candidates, mentioned) for one answer and the question it
+# answered: candidates are (normalized value, confidence) pairs, and `mentioned` says whether
+# the turn could be about the field at all, either because the question asked about it or
+# because the answer touches it. A field no turn is about is settled as missing; one with a
+# single confident value is settled to it; anything else is left to the LLM.
+
+NUMBER = r'(100(?:\.0+)?|\d{1,2}(?:\.\d+)?)'
+PHONE_RE = re.compile(r'(?<![\d+])(\+?\d[\d\s\-()]{8,16}\d)(?!\d)')
+PHONE_CUE_RE = re.compile(r'\b(phone|mobile|number|contact|whatsapp)\b', re.I)
+DIGITS_RE = re.compile(r'\d(?:[\s\-()]*\d){6,}')
+PERCENT_RE = re.compile(NUMBER + r'\s*(%\s*ile\b|%|percentile\b|per\s?cent\b|percent\b|th percentile\b)', re.I)
+HSC_CUE_RE = re.compile(r'\b(hsc|12th|twelfth|class 12|class twelve|boards?|higher secondary)\b', re.I)
+JEE_CUE_RE = re.compile(r'\b(jee|mains?|advanced|entrance)\b', re.I)
+# Only the user's own name: "my father's name is ..." and a bare "call me tomorrow" don't match
+NAME_RE = re.compile(r"\b(?:my (?:full )?name is|my name's|i am called|(?:you|people|everyone|friends) (?:can )?call me)\s+"
+                     r"([a-z][a-z.'\-]*(?:\s+[a-z][a-z.'\-]*){0,3})(?![a-z.'\-]*\s*\d)", re.I)
+NAME_CUE_RE = re.compile(r"\b(name|i am|i'm|this is|myself)\b|^\s*[a-z][a-z.'\-]*(?:\s+[a-z][a-z.'\-]*)?\s+here\b", re.I)
+NAME_QUESTION_RE = re.compile(r"\b(name|who (?:am i|are you)|speaking (?:with|to)|talking (?:with|to)|"
+                              r"introduce yourself|call you|about yourself)\b", re.I)
+NAME_STOP_WORDS = {'and', 'i', 'im', 'my', 'from', 'here', 'by', 'the', 'sir', 'maam', 'madam', 'please',
+                   'thanks', 'thank', 'you', 'is', 'am', 'yes', 'no', 'okay', 'ok', 'hi', 'hello', 'so', 'but',
+                   'at', 'on', 'in', 'to', 'for', 'with', 'after', 'before', 'back', 'now', 'later', 'today',
+                   'tomorrow', 'tonight', 'anytime', 'any', 'when', 'if', 'or', 'not'}
+# A percentage within this many characters of a cue word is taken to be about it
+CUE_WINDOW = 40
+
+def _phone_rule(text, question):
+    candidates = []
+    for match in PHONE_RE.finditer(text):
+        digits = re.sub(r'\D', '', match.group(1))
+        if len(digits) == 12 and digits.startswith('91'):
+            digits = digits[2:]
+        elif len(digits) == 11 and digits.startswith('0'):
+            digits = digits[1:]
+        if len(digits) != 10 or digits[0] not in '6789':
+            continue
+        value = '+91' + digits if match.group(1).startswith('+') else digits
+        cued = PHONE_CUE_RE.search(text) or PHONE_CUE_RE.search(question)
+        candidates.append((value, 0.95 if cued else 0.85))
+    mentioned = bool(DIGITS_RE.search(text)) or bool(PHONE_CUE_RE.search(question))
+    return candidates, mentioned
+
+def _cue_distance(cue_re, text, start, end):
+    """Characters between the span and the nearest match of `cue_re` in `text` (None if it has none)."""
+    distances = [max(cue.start() - end, start - cue.end(), 0) for cue in cue_re.finditer(text)]
+    return min(distances, default=None)
+
+def _percent_rule(field):
+    """HSC percentages and JEE percentiles, told apart by the nearest cue word and their unit."""
+    own_cue, other_cue = (HSC_CUE_RE, JEE_CUE_RE) if field == 'hsc_marks' else (JEE_CUE_RE, HSC_CUE_RE)
+    suffix = '%' if field == 'hsc_marks' else '%ile'
+
+    def rule(text, question):
+        candidates = []
+        for match in PERCENT_RE.finditer(text):
+            # A percentile is JEE's unit; a plain percentage is used for both
+            fits_unit = 'ile' not in match.group(2).lower() or field == 'jee_percentile'
+            own = _cue_distance(own_cue, text, *match.span())
+            other = _cue_distance(other_cue, text, *match.span())
+            if own is not None and own <= CUE_WINDOW and (other is None or own < other):
+                confidence = 0.95 if fits_unit else 0.5
+            elif other is not None and other <= CUE_WINDOW:
+                continue
+            elif own_cue.search(question):
+                confidence = 0.9 if fits_unit else 0.5
+            elif other_cue.search(question):
+                continue
+            else:
+                # No cue at all: a percentile is most likely JEE, a bare percentage could be either
+                confidence = 0.85 if field == 'jee_percentile' and 'ile' in match.group(2).lower() else 0.5
+            candidates.append((match.group(1) + suffix, confidence))
+        mentioned = bool(candidates) or bool(own_cue.search(text)) or bool(own_cue.search(question))
+        return candidates, mentioned
+    return rule
+
+def _clean_name(words):
+    words = words.split()
+    for i, word in enumerate(words):
+        if word.lower().strip(".'") in NAME_STOP_WORDS:
+            words = words[:i]
+            break
+    return ' '.join(words).strip(".'- ")
+
+def _name_rule(text, question):
+    candidates = []
+    for match in NAME_RE.finditer(text):
+        name = _clean_name(match.group(1))
+        if name:
+            candidates.append((name, 0.9))
+    # Names given any other way ("Kaivan here", a bare "Kaivan Shah") are left to the LLM
+    mentioned = bool(candidates) or bool(NAME_CUE_RE.search(text)) or bool(NAME_QUESTION_RE.search(question))
+    return candidates, mentioned
+
+FAST_PATH_RULES = {
+    'name': _name_rule,
+    'phone': _phone_rule,
+    'hsc_marks': _percent_rule('hsc_marks'),
+    'jee_percentile': _percent_rule('jee_percentile'),
+}
+
+def _answers(context_messages):
+    """(answer, question) for each user message, the question being the assistant turn before it."""
+    answers = []
+    question = ''
+    for message in context_messages:
+        if message['role'] == 'assistant':
+            question = message['content']
+        elif message['role'] == 'user':
+            answers.append((message['content'], question))
+            question = ''
+    return answers
+
+class FastPath:
+    """
+    Settles the fields the rules can before extraction goes to the LLM, and counts per field
+    how often they did: `rule` (a value was found), `absent` (no turn was about the field),
+    `conflict` (differing values) and `llm` (left to the model, conflicts included).
+    """
+
+    def __init__(self, rules=FAST_PATH_RULES, min_confidence=0.8):
+        self.rules = rules
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def settle(self, context_messages, fields=EXTRACTION_FIELDS):
+        """
+        Returns ({field: (value, confidence)} for the settled fields, {field: spec} for the rest).
+        A settled missing field has the value None.
+        """
+        answers = _answers(context_messages)
+        settled, remaining, outcomes = {}, {}, {}
+        for name, spec in fields.items():
+            rule = self.rules.get(name)
+            if rule is None:
+                remaining[name], outcomes[name] = spec, 'llm'
+                continue
+            candidates, mentioned = [], False
+            for text, question in answers:
+                found, about = rule(text, question)
+                candidates += found
+                mentioned = mentioned or about
+            values = {value.lower() for value, _ in candidates}
+            confidence = min((c for _, c in candidates), default=0.0)
+            if not mentioned:
+                settled[name], outcomes[name] = (None, 1.0), 'absent'
+            elif len(values) == 1 and confidence >= self.min_confidence:
+                settled[name], outcomes[name] = (candidates[-1][0], confidence), 'rule'
+            else:
+                remaining[name], outcomes[name] = spec, 'conflict' if len(values) > 1 else 'llm'
+        with self._lock:
+            for name, outcome in outcomes.items():
+                self._stats[f'{name}_{outcome}'] = self._stats.get(f'{name}_{outcome}', 0) + 1
+                if outcome == 'conflict':
+                    self._stats[f'{name}_llm'] = self._stats.get(f'{name}_llm', 0) + 1
+            self._stats['extractions'] = self._stats.get('extractions', 0) + 1
+            self._stats['llm_skipped'] = self._stats.get('llm_skipped', 0) + (not remaining)
+        return settled, remaining
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.setdefault('extractions', 0)
+        stats.setdefault('llm_skipped', 0)
+        for name in self.rules:
+            for outcome in ('rule', 'absent', 'conflict', 'llm'):
+                stats.setdefault(f'{name}_{outcome}', 0)
+            total = stats[f'{name}_rule'] + stats[f'{name}_absent'] + stats[f'{name}_llm']
+            stats[f'{name}_llm_rate'] = stats[f'{name}_llm'] / total if total else 0.0
+        return stats
+
+def extract_tiered(query, context_messages, fast_path, extract=extract_single_pass, fields=EXTRACTION_FIELDS):
+    """
+    Fills in what the fast path settles and extracts only the remaining fields with
+    `extract` (one of the LLM modes above). Makes no request if every field is settled.
+    """
+    settled, remaining = fast_path.settle(context_messages, fields)
+    data = {name: value for name, (value, _) in settled.items()}
+    if remaining:
+        data.update(extract(query, context_messages, remaining))
+    return data
@@ -0,0 +1,78 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+def prompt_digest(messages):
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()
+
+class GreetingCache:
+    """
+    Greetings generated speculatively when a user logs in, so /initiate can play one that
+    is already done (or wait for the one in progress) instead of starting from scratch.
+    Entries are keyed by user and by a digest of the prompt they were generated from, which
+    holds the user's profile: once the profile changes the old greeting no longer matches.
+    Failed generations are dropped, so the caller falls back to generating inline.
+    """
+
+    def __init__(self, max_entries=256, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (digest, expires_at, future)
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'hits': 0, 'joins': 0, 'misses': 0, 'failed': 0, 'invalidated': 0}
+
+    def start(self, user_id, messages, generate):
+        """
+        Starts generating the greeting for `messages` with `generate()`, which returns a
+        concurrent.futures.Future, unless a matching one is already cached or in progress.
+        """
+        digest = prompt_digest(messages)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == digest and entry[1] > time.monotonic():
+                return entry[2]
+            future = generate()
+            self._entries[user_id] = (digest, time.monotonic() + self.ttl, future)
+            self._entries.move_to_end(user_id)
+            self._stats['started'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.add_done_callback(lambda f: self._finished(user_id, f))
+        return future
+
+    def _finished(self, user_id, future):
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                self._stats['failed'] += 1
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[2] is future:
+                    del self._entries[user_id]
+
+    def get(self, user_id, messages):
+        """
+        Returns the future of the greeting generated for exactly `messages` (done or still
+        running), or None.
+        """
+        digest = prompt_digest(messages)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != digest or entry[1] < time.monotonic():
+                self._stats['misses'] += 1
+                return None
+            future = entry[2]
+            self._stats['hits' if future.done() else 'joins'] += 1
+            return future
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._stats['invalidated'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        return stats
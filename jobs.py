@@ -0,0 +1,245 @@
+import os
+import json
+import argparse
+import time
+import sqlite3
+import threading
+
+class QueueFull(Exception):
+    """
+    Raised by enqueue() when the queue is at its admission limit. Callers should ask the
+    client to retry later.
+    """
+
+class JobQueue:
+    """
+    Durable background job queue backed by SQLite. Jobs are processed by a fixed number of
+    worker threads, so a burst of enqueues is drained at a steady rate instead of starting
+    one thread each. Jobs survive a restart: a job left running by a process that died is
+    claimed again once its lease runs out. Failures raising one of the handler's retryable
+    exceptions are retried with exponential backoff. Maintenance registered with every()
+    runs on the same workers, between jobs, whether or not any are queued.
+
+    Each job kind is admitted up to its own limit, so a kind that is queued often cannot
+    crowd out another, and ready jobs of a higher-priority kind are claimed first.
+    """
+
+    def __init__(self, db_path, max_queued=100, max_attempts=5, backoff_base=5.0, backoff_max=300.0,
+                 lease_seconds=600.0, poll_interval=1.0, retention_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._last_purge = 0.0
+        self._periodic = []  # [next run, interval, task]
+        self._periodic_lock = threading.Lock()
+        self._handlers = {}
+        self._limits = {}
+        self._priorities = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._connect().executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, run_after);
+            CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(status, finished_at);
+        ''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def disconnect(self):
+        """Closes the calling thread's connection; it is reopened on next use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Producers ---
+    def register(self, kind, handler, retry_on=(), max_queued=None, priority=0):
+        """
+        Registers handler(payload) for a job kind. Exceptions in `retry_on` are retried. At
+        most `max_queued` (default: the queue's) jobs of the kind may be queued or running.
+        """
+        self._handlers[kind] = (handler, tuple(retry_on))
+        self._limits[kind] = self.max_queued if max_queued is None else max_queued
+        self._priorities[kind] = priority
+
+    def enqueue(self, kind, payload):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE kind = ? AND status IN ('queued', 'running')",
+                                  (kind,)).fetchone()[0]
+            if queued >= self._limits.get(kind, self.max_queued):
+                raise QueueFull(f"{queued} {kind} jobs are already waiting")
+            now = time.time()
+            job_id = conn.execute('INSERT INTO jobs (kind, payload, run_after, created_at) VALUES (?, ?, ?, ?)',
+                                  (kind, json.dumps(payload), now, now)).lastrowid
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._wakeup.set()
+        return job_id
+
+    def every(self, seconds, task):
+        """
+        Has one of the workers call task() every `seconds`, starting with the first idle
+        moment after start().
+        """
+        self._periodic.append([0.0, seconds, task])
+
+    # --- Workers ---
+    def start(self, workers=2):
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _claim(self):
+        now = time.time()
+        ranked = [(kind, priority) for kind, priority in self._priorities.items() if priority]
+        rank = ' '.join('WHEN ? THEN ?' for _ in ranked)
+        rank = f'CASE kind {rank} ELSE 0 END DESC, ' if ranked else ''
+        return self._connect().execute(f'''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_until = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)
+                ORDER BY {rank}id LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts
+        ''', (now, now + self.lease_seconds, now, now, *(value for pair in ranked for value in pair))).fetchone()
+
+    def _work(self):
+        while not self._stop.is_set():
+            self._run_periodic()
+            job = self._claim()
+            if job is None:
+                self._purge()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(*job)
+
+    def _run(self, job_id, kind, payload, attempts):
+        conn = self._connect()
+        handler, retry_on = self._handlers.get(kind, (None, ()))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            handler(json.loads(payload))
+        except Exception as e:
+            if isinstance(e, retry_on) and attempts < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                print(f"Job {job_id} ({kind}) failed on attempt {attempts}, retrying in {delay:.0f}s: {e}")
+                conn.execute("UPDATE jobs SET status = 'queued', run_after = ?, lease_until = NULL, last_error = ? "
+                             "WHERE id = ?", (time.time() + delay, str(e), job_id))
+            else:
+                print(f"Job {job_id} ({kind}) failed permanently after {attempts} attempt(s): {e}")
+                conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, lease_until = NULL, last_error = ? "
+                             "WHERE id = ?", (time.time(), str(e), job_id))
+            return
+        # The payload can hold a whole transcript; it is not kept once the job is done
+        conn.execute("UPDATE jobs SET status = 'done', finished_at = ?, lease_until = NULL, payload = '' "
+                     "WHERE id = ?", (time.time(), job_id))
+
+    def _run_periodic(self):
+        now = time.time()
+        with self._periodic_lock:
+            due = [entry for entry in self._periodic if entry[0] <= now]
+            for entry in due:
+                entry[0] = now + entry[1]  # claimed by this worker
+        for _, _, task in due:
+            try:
+                task()
+            except Exception as e:
+                print(f"Periodic task {getattr(task, '__name__', task)} failed: {e}")
+
+    def _purge(self):
+        # Finished jobs are kept for the status latencies (and failed ones for inspection)
+        # until they are older than the retention window
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        self._connect().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                (now - self.retention_seconds,))
+
+    # --- Status ---
+    def stats(self, window=100):
+        """
+        Queue depth by status, jobs waiting by kind, the age of the oldest waiting job, and
+        latency (enqueue to finish) and run time of the last `window` finished jobs, in seconds.
+        """
+        conn = self._connect()
+        now = time.time()
+        depth = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        waiting = dict(conn.execute("SELECT kind, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') "
+                                    "GROUP BY kind").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        finished = conn.execute("SELECT finished_at - created_at, finished_at - started_at FROM jobs "
+                                "WHERE status = 'done' ORDER BY finished_at DESC LIMIT ?", (window,)).fetchall()
+        latencies = sorted(row[0] for row in finished)
+        run_times = sorted(row[1] for row in finished)
+        return {
+            'queued': depth.get('queued', 0), 'running': depth.get('running', 0),
+            'done': depth.get('done', 0), 'failed': depth.get('failed', 0),
+            'max_queued': self.max_queued, 'workers': len(self._workers),
+            **{f'waiting_{kind}': waiting.get(kind, 0) for kind in {*self._handlers, *waiting}},
+            'oldest_queued_age': now - oldest if oldest else 0.0,
+            'latency_p50': _percentile(latencies, 0.5), 'latency_p95': _percentile(latencies, 0.95),
+            'run_time_p50': _percentile(run_times, 0.5), 'run_time_p95': _percentile(run_times, 0.95),
+        }
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+# --- CLI ---
+def main():
+    path = os.path.join(os.getenv('DATA_DIR', os.path.dirname(os.path.abspath(__file__))), 'jobs.db')
+    parser = argparse.ArgumentParser(description='Inspect the background job queue.')
+    parser.add_argument('command', choices=['status'])
+    parser.add_argument('--db', default=path)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No job database at {args.db}")
+        return
+    print(json.dumps(JobQueue(args.db).stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import contextlib
+import collections
+import concurrent.futures
+import aiohttp
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: no forked workers, the per-process scheduler is the only cap
+
+# Request priorities. Interactive requests (a user is waiting for the reply) are always
+# admitted before background ones (profile extraction, context summaries).
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+class LLMError(Exception):
+    """
+    Raised when an Ollama request fails, runs past its deadline or is cancelled.
+    """
+
+class LLMBusy(LLMError):
+    """
+    Raised when a request is turned away because too many requests of its priority are
+    already waiting. The request was never sent, so it can be retried later.
+    """
+
+class _Scheduler:
+    """
+    Admission control for the requests sent to Ollama, used only from the client's loop.
+    At most `max_in_flight` requests run at once and background requests never take the
+    last slot, so a live turn waits for at most one in-flight request's remainder rather
+    than a backlog of extractions. Waiting requests are queued per priority; interactive
+    ones are always admitted first, and a full queue rejects new requests with LLMBusy.
+    """
+
+    def __init__(self, max_in_flight, max_queued):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued  # priority -> queue bound
+        # Leave a slot for interactive requests whenever there is more than one
+        self.max_background = max(1, max_in_flight - 1)
+        self.in_flight = dict.fromkeys(PRIORITIES, 0)
+        self.waiting = {priority: collections.deque() for priority in PRIORITIES}
+
+    def _can_start(self, priority):
+        if sum(self.in_flight.values()) >= self.max_in_flight:
+            return False
+        if priority == BACKGROUND:
+            return not self.waiting[INTERACTIVE] and self.in_flight[BACKGROUND] < self.max_background
+        return True
+
+    async def acquire(self, priority):
+        if not self.waiting[priority] and self._can_start(priority):
+            self.in_flight[priority] += 1
+            return
+        if len(self.waiting[priority]) >= self.max_queued[priority]:
+            raise LLMBusy(f"{len(self.waiting[priority])} {priority} requests are already waiting for Ollama")
+        slot = asyncio.get_running_loop().create_future()
+        self.waiting[priority].append(slot)
+        try:
+            await slot
+        except asyncio.CancelledError:
+            if slot.done() and not slot.cancelled():
+                # Granted the slot in the same iteration it was cancelled; pass it on
+                self.release(priority)
+            elif slot in self.waiting[priority]:
+                self.waiting[priority].remove(slot)
+            raise
+
+    def release(self, priority):
+        self.in_flight[priority] -= 1
+        for waiting_priority in PRIORITIES:
+            queue = self.waiting[waiting_priority]
+            while queue and self._can_start(waiting_priority):
+                slot = queue.popleft()
+                if not slot.done():
+                    self.in_flight[waiting_priority] += 1
+                    slot.set_result(None)
+
+class _SharedSlots:
+    """
+    The cap on requests in flight across processes (serve.py's workers and job process):
+    one lock file per slot under `directory`, held with flock while a request runs. Slots
+    are polled, not waited on, so a cancelled request never ends up holding one, and a
+    process that dies releases its slots with its file descriptors. Like _Scheduler,
+    background requests only use the first `max_background` slots, leaving the last one to
+    live turns, and interactive requests try the slots from the last one down and poll
+    more often, so a live turn gets a slot freed by another process first.
+    """
+
+    POLL_SECONDS = {INTERACTIVE: 0.005, BACKGROUND: 0.05}
+
+    def __init__(self, directory, count):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f'llm-slot-{i}.lock') for i in range(count)]
+        self.max_background = max(1, count - 1)
+        self._files = []
+        self._pid = None
+        self._held = set()
+
+    def _try(self, priority):
+        if self._pid != os.getpid():
+            # A forked child must not share the parent's open files: flock is per open file
+            self._files = [open(path, 'a+b') for path in self.paths]
+            self._pid = os.getpid()
+            self._held = set()
+        order = range(self.max_background) if priority == BACKGROUND else reversed(range(len(self.paths)))
+        for index in order:
+            if index in self._held:
+                continue
+            try:
+                fcntl.flock(self._files[index], fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            self._held.add(index)
+            return index
+        return None
+
+    async def acquire(self, priority):
+        """Waits for a free slot and returns its index. Only used from the client's loop."""
+        while (index := self._try(priority)) is None:
+            await asyncio.sleep(self.POLL_SECONDS[priority])
+        return index
+
+    def release(self, index):
+        self._held.discard(index)
+        fcntl.flock(self._files[index], fcntl.LOCK_UN)
+
+class LLMClient:
+    """
+    Shared Ollama chat client. All requests run on one background event loop over a bounded
+    pool of keep-alive connections, so many turns can be in flight at once without each
+    one holding its own socket or event loop. Coroutines can be awaited directly on that
+    loop (chat_async, stream_chat_async) or driven from Flask's worker threads with run().
+
+    Every request names a priority and passes through a scheduler that caps how many run
+    on the model at once (see _Scheduler); share_slots() extends the cap to every process
+    forked from this one (see _SharedSlots). `timer(phase, priority)`, if given, returns a
+    context manager that times the 'queue' wait and the 'request' itself separately.
+    `keep_alive`, if given, is sent with every request: how long Ollama keeps the model
+    loaded afterwards (seconds or a duration such as '30m'; -1 keeps it loaded).
+    """
+
+    def __init__(self, url, model, max_connections=8, keepalive_timeout=60.0, default_timeout=60.0,
+                 max_in_flight=2, max_queued=32, max_queued_background=8, timer=None, keep_alive=None):
+        self.url = url
+        self.model = model
+        self.keep_alive = keep_alive
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.default_timeout = default_timeout
+        self.timer = timer or (lambda phase, priority: contextlib.nullcontext())
+        self._scheduler = _Scheduler(max_in_flight, {INTERACTIVE: max_queued, BACKGROUND: max_queued_background})
+        self._shared = None
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._session = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'in_flight': 0, 'errors': 0, 'timeouts': 0, 'cancelled': 0,
+            'connections_created': 0, 'connections_reused': 0,
+            'rejected': 0, 'queue_wait_seconds': 0.0,
+        }
+
+    # --- Event Loop ---
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None and self._pid != os.getpid():
+                # A forked child inherits the loop but not the thread running it, nor any use
+                # for the parent's connections and queued requests
+                self._loop = None
+                self._session = None
+                self._scheduler = _Scheduler(self._scheduler.max_in_flight, self._scheduler.max_queued)
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client-loop', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._loop
+
+    def share_slots(self, directory):
+        """
+        Makes `max_in_flight` a cap across every process that uses `directory`, such as the
+        workers forked from this one, rather than per process. Does nothing where flock is
+        not available.
+        """
+        if fcntl is not None:
+            self._shared = _SharedSlots(directory, self._scheduler.max_in_flight)
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the client's loop and returns a concurrent.futures.Future.
+        Cancelling the future cancels the coroutine, and with it any open Ollama request.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout=None):
+        """
+        Runs a coroutine on the client's loop and blocks the calling thread until it finishes.
+        The coroutine is cancelled if it does not finish within `timeout` seconds.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._count('timeouts')
+            raise LLMError(f"Deadline of {timeout}s exceeded")
+        except concurrent.futures.CancelledError:
+            raise LLMError("Request was cancelled")
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection_created)
+            trace.on_connection_reuseconn.append(self._on_connection_reused)
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+        return self._session
+
+    async def _on_connection_created(self, session, ctx, params):
+        self._count('connections_created')
+
+    async def _on_connection_reused(self, session, ctx, params):
+        self._count('connections_reused')
+
+    def close(self):
+        """
+        Closes the connections and stops the loop, waiting for its thread (and the executor
+        threads of asyncio.to_thread) to exit. The next request starts a new loop.
+        """
+        if self._loop is None or self._pid != os.getpid():
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(5)
+        asyncio.run_coroutine_threadsafe(self._loop.shutdown_default_executor(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        self._session = None
+
+    # --- Statistics ---
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_connections'] = self.max_connections
+        stats['max_in_flight'] = self._scheduler.max_in_flight
+        stats['shared_slots'] = self._shared is not None
+        for priority in PRIORITIES:
+            stats[f'in_flight_{priority}'] = self._scheduler.in_flight[priority]
+            stats[f'queued_{priority}'] = len(self._scheduler.waiting[priority])
+        return stats
+
+    # --- Scheduling ---
+    @contextlib.asynccontextmanager
+    async def _slot(self, priority):
+        """
+        Waits for the scheduler to admit a request of `priority` and holds its slot for the
+        duration of the block. Raises LLMBusy if the priority's queue is full.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM request priority '{priority}'")
+        start = time.perf_counter()
+        shared = self._shared
+        index = None
+        try:
+            with self.timer('queue', priority):
+                await self._scheduler.acquire(priority)
+                if shared is not None:
+                    try:
+                        index = await shared.acquire(priority)
+                    except BaseException:
+                        self._scheduler.release(priority)
+                        raise
+        except LLMBusy:
+            self._count('rejected')
+            raise
+        except asyncio.CancelledError:
+            self._count('cancelled')
+            raise
+        finally:
+            self._count('queue_wait_seconds', time.perf_counter() - start)
+        try:
+            with self.timer('request', priority):
+                yield
+        finally:
+            if index is not None:
+                shared.release(index)
+            self._scheduler.release(priority)
+
+    # --- Chat ---
+    def _payload(self, messages, stream, options, response_format):
+        payload = {'model': self.model, 'messages': messages, 'stream': stream}
+        if options:
+            payload['options'] = options
+        if response_format:
+            payload['format'] = response_format
+        if self.keep_alive is not None:
+            payload['keep_alive'] = self.keep_alive
+        return payload
+
+    async def chat_async(self, messages, timeout=None, options=None, response_format=None, priority=INTERACTIVE):
+        """
+        Returns the full reply text of a non-streaming chat request. The timeout starts once
+        the scheduler has admitted the request.
+        """
+        timeout = aiohttp.ClientTimeout(total=timeout or self.default_timeout)
+        payload = self._payload(messages, False, options, response_format)
+        async with self._slot(priority):
+            return await self._post(payload, timeout)
+
+    async def load_model_async(self, timeout=None):
+        """
+        Has Ollama load the model into memory without generating anything (a chat request
+        with no messages), so the first real request does not wait for it.
+        """
+        await self.chat_async([], timeout, priority=BACKGROUND)
+
+    async def _post(self, payload, timeout):
+        session = await self._get_session()
+        self._count('requests')
+        self._count('in_flight')
+        try:
+            async with session.post(self.url, json=payload, timeout=timeout) as resp:
+                resp.raise_for_status()
+                body = await resp.json(content_type=None)
+                return body['message']['content']
+        except asyncio.TimeoutError as e:
+            self._count('timeouts')
+            raise LLMError("Ollama request timed out") from e
+        except asyncio.CancelledError:
+            self._count('cancelled')
+            raise
+        except (aiohttp.ClientError, KeyError, ValueError) as e:
+            self._count('errors')
+            raise LLMError(str(e)) from e
+        finally:
+            self._count('in_flight', -1)
+
+    async def stream_chat_async(self, messages, timeout=None, options=None, priority=INTERACTIVE):
+        """
+        Yields content tokens from Ollama's NDJSON chat stream. Closing the generator (or
+        cancelling the task iterating it) closes the connection, which stops generation.
+        """
+        timeout = aiohttp.ClientTimeout(total=timeout or self.default_timeout)
+        payload = self._payload(messages, True, options, None)
+        async with self._slot(priority):
+            # aclosing: closing this generator must close the connection straight away
+            async with contextlib.aclosing(self._post_stream(payload, timeout)) as tokens:
+                async for token in tokens:
+                    yield token
+
+    async def _post_stream(self, payload, timeout):
+        session = await self._get_session()
+        self._count('requests')
+        self._count('in_flight')
+        try:
+            async with session.post(self.url, json=payload, timeout=timeout) as resp:
+                resp.raise_for_status()
+                async for line in resp.content:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    token = chunk.get('message', {}).get('content', '')
+                    if token:
+                        yield token
+                    if chunk.get('done'):
+                        break
+        except asyncio.TimeoutError as e:
+            self._count('timeouts')
+            raise LLMError("Ollama stream timed out") from e
+        except (asyncio.CancelledError, GeneratorExit):
+            self._count('cancelled')
+            raise
+        except (aiohttp.ClientError, ValueError) as e:
+            self._count('errors')
+            raise LLMError(str(e)) from e
+        finally:
+            self._count('in_flight', -1)
+
+    def chat(self, messages, timeout=None, options=None, response_format=None, priority=INTERACTIVE, max_wait=None):
+        """
+        Blocking wrapper around chat_async for code running in Flask's worker threads. The
+        request is abandoned (and leaves the queue) if it has not finished within `max_wait`
+        seconds (default: the default timeout) of queueing plus its own timeout.
+        """
+        deadline = timeout or self.default_timeout
+        return self.run(self.chat_async(messages, deadline, options, response_format, priority),
+                        deadline + (max_wait or self.default_timeout) + 1)
@@ -0,0 +1,137 @@
+import time
+import bisect
+import threading
+import contextlib
+import contextvars
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans finished during the current request, for its Server-Timing header. A context variable
+# rather than flask.g so coroutines run on the LLM client's loop (which copy the submitting
+# thread's context) add to the same list.
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+class Histogram:
+    """
+    A Prometheus histogram with one series per label value tuple.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{base.rstrip(",")}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{base.rstrip(",")}}} {values[-1]}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels).rstrip(",")}}} {value}')
+        return lines
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ''.join(f'{name}="{value}",' for name, value in zip(names, escaped))
+
+class Registry:
+    """
+    The app's metrics: stage and request latency histograms, error counters, and gauges read
+    from the components' existing stats() dicts when /metrics is scraped.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stage_seconds = Histogram(f'{prefix}_stage_seconds', 'Time spent in each stage of a turn.', ('stage',))
+        self.stage_errors = Counter(f'{prefix}_stage_errors_total', 'Stages that raised an exception.', ('stage',))
+        self.request_seconds = Histogram(f'{prefix}_http_request_seconds', 'HTTP request latency until the '
+                                         'response starts.', ('endpoint', 'method', 'status'))
+        self._stats = []
+
+    def add_stats(self, name, stats):
+        """Publishes the numeric values of `stats()` as `<prefix>_<name>_<key>` gauges."""
+        self._stats.append((name, stats))
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """
+        Times the enclosed block as `stage`, in the stage histogram and in the current
+        request's Server-Timing header.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.stage_errors.inc(stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds.observe(elapsed, stage)
+            spans = _request_spans.get()
+            if spans is not None:
+                spans.append((stage, elapsed))
+
+    # --- Per-request spans ---
+    def start_request(self):
+        """Starts collecting spans for the request being handled on this thread."""
+        _request_spans.set([])
+
+    def server_timing(self):
+        """
+        The Server-Timing header value for the spans of the current request. Repeated stages
+        (e.g. one TTS call per sentence) are summed.
+        """
+        totals = {}
+        for stage, elapsed in _request_spans.get() or ():
+            totals[stage] = totals.get(stage, 0.0) + elapsed
+        return ', '.join(f'{stage};dur={elapsed * 1000:.1f}' for stage, elapsed in totals.items())
+
+    def render(self):
+        lines = self.stage_seconds.render() + self.stage_errors.render() + self.request_seconds.render()
+        for name, stats in self._stats:
+            for key, value in sorted(stats().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f'{self.prefix}_{name}_{key}'
+                    lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
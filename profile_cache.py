@@ -0,0 +1,57 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Returned by get() on a miss, since None is a valid cached value (a user with no profile yet)
+MISSING = object()
+
+class ProfileCache:
+    """
+    In-memory LRU cache of decrypted user profiles, keyed by user_id and bounded by entry
+    count and age. Plaintext only ever lives here, never on disk. Writers update the
+    cache as they commit (write-through), so within a process a cached profile is never
+    stale. The TTL bounds how long another worker process can serve an old copy.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, profile)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'writes': 0}
+
+    def get(self, user_id):
+        """
+        Returns a copy of the cached profile (None for a user known to have none), or
+        MISSING.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISSING
+            expires_at, profile = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(user_id)
+            self._stats['hits'] += 1
+            return dict(profile) if profile is not None else None
+
+    def put(self, user_id, profile):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(profile) if profile is not None else None)
+            self._entries.move_to_end(user_id)
+            self._stats['writes'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        return stats
@@ -0,0 +1,96 @@
+import os
+import struct
+import threading
+import contextlib
+import transcode
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: serve.py's worker processes don't run there, the thread lock is enough
+
+# The recording is a canonical 44-byte-header PCM WAV, so the two size fields that need
+# fixing up after an append are always at the same offsets.
+HEADER_SIZE = 44
+RIFF_SIZE_OFFSET = 4
+DATA_SIZE_OFFSET = 40
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+@contextlib.contextmanager
+def _locked(path):
+    """
+    Opens the recording for update, creating it if needed, and holds it exclusively: the
+    thread lock orders the appends of this process, the flock those of serve.py's other
+    worker processes, which a session's requests may be spread across.
+    """
+    with _lock_for(path):
+        with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            yield f
+
+def _wav_header(data_size):
+    byte_rate = transcode.SAMPLE_RATE * transcode.CHANNELS * transcode.SAMPLE_WIDTH
+    block_align = transcode.CHANNELS * transcode.SAMPLE_WIDTH
+    return (b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, transcode.CHANNELS, transcode.SAMPLE_RATE,
+                                    byte_rate, block_align, transcode.SAMPLE_WIDTH * 8)
+            + b'data' + struct.pack('<I', data_size))
+
+class SessionRecorder:
+    """
+    Builds the session recording one clip at a time. Each user and bot clip is appended to
+    a single WAV as its turn finishes, with a short silence between clips, so closing the
+    session costs the same however long it was and no per-turn files are kept.
+
+    The file is reopened and locked for every append and its header is patched straight
+    after, so the recording stays valid if the session is never closed and any worker
+    thread or process can append to it.
+    """
+
+    def __init__(self, path, gap_seconds=0.5):
+        self.path = path
+        self.gap = transcode.silence(gap_seconds)
+
+    def append(self, pcm, gap=True):
+        """
+        Appends 16 kHz mono PCM. The silence gap is only inserted between clips, never before
+        the first one; pass gap=False to continue the previous clip (e.g. the next sentence of
+        a streamed reply).
+        """
+        if not pcm:
+            return
+        with _locked(self.path) as f:
+            data_size = f.seek(0, os.SEEK_END) - HEADER_SIZE
+            if data_size < 0:
+                f.write(_wav_header(0))  # a new recording
+            elif gap and data_size > 0:
+                f.write(self.gap)
+            f.write(pcm)
+            self._patch_header(f)
+
+    def _patch_header(self, f):
+        data_size = f.seek(0, os.SEEK_END) - HEADER_SIZE
+        f.seek(RIFF_SIZE_OFFSET)
+        f.write(struct.pack('<I', 36 + data_size))
+        f.seek(DATA_SIZE_OFFSET)
+        f.write(struct.pack('<I', data_size))
+
+    def close(self):
+        """
+        Fixes up the header one last time and returns the recording's path, or None if
+        nothing was ever recorded.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with _locked(self.path) as f:
+            self._patch_header(f)
+        with _locks_guard:
+            _locks.pop(self.path, None)
+        return self.path
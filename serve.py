@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import traceback
+from werkzeug.serving import make_server
+
+# The app is only imported in main(), once the arguments are parsed: --help and bad
+# arguments are answered straight away, and --keep-alive has to be in the environment
+# before the app reads it.
+
+# Passed on from the parent to the workers, which exit on either
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+# Seconds the job process gives running jobs to finish when stopped; unfinished ones are
+# claimed again once their lease runs out
+JOB_STOP_TIMEOUT = 10.0
+
+def listen(host, port, backlog=128):
+    """
+    Opens the listening socket the workers share. It is non-blocking, so a worker that loses
+    the race for a connection to another worker goes back to waiting instead of blocking in
+    accept().
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.create_server((host, port), family=family, backlog=backlog)
+    listener.setblocking(False)
+    return listener
+
+def _exit_on_stop_signals():
+    # Called in a forked child with the stop signals blocked
+    def stop(signum, frame):
+        sys.exit(0)
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, stop)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+def run_worker(counsellor, listener):
+    """
+    Body of a forked web worker: serves requests on the shared socket with a thread per
+    connection until it is sent SIGTERM. Background jobs are left to the job process.
+    """
+    _exit_on_stop_signals()
+    counsellor.start_background(jobs=False)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, counsellor.app, threaded=True, ssl_context=counsellor.ssl_context,
+                         fd=listener.fileno())
+    server.serve_forever()
+
+def run_jobs(counsellor):
+    """
+    Body of the forked job process: runs the app's JOB_WORKERS job workers, the only ones
+    across all the processes, until it is sent SIGTERM.
+    """
+    _exit_on_stop_signals()
+    counsellor.start_background()
+    try:
+        while True:
+            signal.pause()
+    finally:
+        counsellor.job_queue.stop(JOB_STOP_TIMEOUT)
+
+def serve(counsellor, listener, workers, warm=True):
+    """
+    Forks `workers` web worker processes and one job process from the already-imported app
+    module `counsellor` and keeps them running until SIGTERM or SIGINT, which is passed on
+    to them. With `warm`, the model is loaded and the TTS cache filled once, here, before
+    the first worker is forked. The processes share LLM_MAX_IN_FLIGHT.
+    """
+    if warm:
+        counsellor.warm_up()
+    counsellor.before_fork()
+    if threading.active_count() > 1:
+        print(f"Warning: forking with threads still running: {[t.name for t in threading.enumerate()]}")
+
+    children = {}  # pid -> (start time, body)
+    stopping = []
+
+    def spawn(body):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Blocked across the fork: the child must not run the parent's handler, and the
+        # parent's handler must see every child it has forked
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                body()
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 0
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                # Never return into the parent's loop; atexit handlers don't run after _exit
+                counsellor.transcript.flush()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        children[pid] = (time.monotonic(), body)
+        if stopping:
+            os.kill(pid, signal.SIGTERM)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, stop)
+
+    spawn(lambda: run_jobs(counsellor))
+    for _ in range(workers):
+        spawn(lambda: run_worker(counsellor, listener))
+    host, port = listener.getsockname()[:2]
+    print(f"Serving on {host}:{port} with {workers} workers and a job process (pids {sorted(children)}).")
+
+    while children:
+        pid, status = os.wait()
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        started, body = child
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, starting a new one.")
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # don't spin if workers die on startup
+        spawn(body)
+    listener.close()
+
+def main():
+    """
+    Production server: imports the app once, loads the model and warms the caches, then
+    forks worker processes that share one listening socket, and one process for the
+    background jobs. Workers that die are replaced.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', os.cpu_count() or 1)),
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--keep-alive', default=os.getenv('OLLAMA_KEEP_ALIVE', '-1'),
+                        help="how long Ollama keeps the model loaded: seconds or a duration such as '30m', "
+                             "-1 (the default) to keep it loaded")
+    parser.add_argument('--no-warm-up', dest='warm', action='store_false',
+                        help='fork straight away; each worker warms up in the background instead')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    # Bind before the import, so a port already in use fails fast
+    listener = listen(args.host, args.port)
+    os.environ['OLLAMA_KEEP_ALIVE'] = args.keep_alive
+    start = time.perf_counter()
+    import app as counsellor
+    print(f"App loaded in {time.perf_counter() - start:.1f}s.")
+    serve(counsellor, listener, args.workers, warm=args.warm)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import time
+import sqlite3
+import secrets
+import threading
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+
+# The session key holding the transcript. It is stored as one row per turn instead of
+# inside the serialized session, so adding a turn never rewrites the earlier ones.
+HISTORY_KEY = 'conversation_history'
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, last_seen=0.0):
+        def on_update(self):
+            self.modified = True
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.last_seen = last_seen
+        self.cleared = False
+        # What the store already holds, to tell an append from a rewrite on save
+        self.stored_history = list(self.get(HISTORY_KEY) or [])
+
+    def clear(self):
+        # auth() and logout() clear the session; the next save issues a fresh ID
+        super().clear()
+        self.cleared = True
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Keeps session data in a SQLite database (WAL mode, shared by every worker process) and
+    puts only an opaque random session ID in the cookie. Sessions idle for longer than
+    app.permanent_session_lifetime are evicted.
+    """
+    serializer = TaggedJSONSerializer()
+    # How often a session that was read but not changed gets its idle timer refreshed,
+    # and how often expired sessions are swept, in seconds
+    touch_interval = 60
+    sweep_interval = 300
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        with self._connect().conn as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at);
+                CREATE TABLE IF NOT EXISTS session_turns (
+                    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS session_summaries (
+                    session_id TEXT PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+                    upto INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    summary TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS greetings (
+                    user_id INTEGER PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    reply_text TEXT,
+                    updated_at REAL NOT NULL
+                );
+            ''')
+
+    def _connect(self, write=True):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return _Transaction(conn, write)
+
+    def disconnect(self):
+        """Closes the calling thread's connection; it is reopened on next use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Flask SessionInterface ---
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        cutoff = time.time() - app.permanent_session_lifetime.total_seconds()
+        with self._connect(write=False) as conn:
+            row = conn.execute('SELECT data, updated_at FROM sessions WHERE id = ?', (sid,)).fetchone()
+            if row is None or row[1] < cutoff:
+                return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+            data = self.serializer.loads(row[0])
+            if data.pop('_has_history', False):
+                turns = conn.execute('SELECT role, content FROM session_turns WHERE session_id = ? ORDER BY seq',
+                                     (sid,)).fetchall()
+                data[HISTORY_KEY] = [{'role': role, 'content': content} for role, content in turns]
+        return ServerSession(data, sid=sid, last_seen=row[1])
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        had_cookie = not session.new
+        if had_cookie and (session.cleared or not session):
+            with self._connect() as conn:
+                conn.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+            session.stored_history = []
+
+        if not session:
+            # Logged out or never used: nothing to store
+            if had_cookie:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        history = session.get(HISTORY_KEY)
+        history_changed = history != session.stored_history
+        now = time.time()
+        if session.modified or history_changed or session.new:
+            self._write(session, history, now)
+        elif now - session.last_seen > self.touch_interval:
+            # Only the idle timer needs refreshing; the stored data may be newer than this copy
+            with self._connect() as conn:
+                conn.execute('UPDATE sessions SET updated_at = ? WHERE id = ?', (now, session.sid))
+            session.last_seen = now
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+            )
+        self._maybe_sweep(app, now)
+
+    def _write(self, session, history, now):
+        data = {k: v for k, v in session.items() if k != HISTORY_KEY}
+        data['_has_history'] = history is not None
+        stored = session.stored_history
+        with self._connect() as conn:
+            conn.execute('INSERT INTO sessions (id, data, updated_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                         (session.sid, self.serializer.dumps(data), now))
+            history = history or []
+            if history[:len(stored)] == stored:
+                new_turns = history[len(stored):]
+            else:
+                # The history was reset or rewritten rather than appended to
+                conn.execute('DELETE FROM session_turns WHERE session_id = ?', (session.sid,))
+                new_turns = history
+            self._insert_turns(conn, session.sid, new_turns)
+        session.stored_history = list(history)
+        session.last_seen = now
+
+    def _insert_turns(self, conn, sid, turns):
+        if not turns:
+            return
+        start = conn.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM session_turns WHERE session_id = ?',
+                             (sid,)).fetchone()[0]
+        conn.executemany('INSERT INTO session_turns (session_id, seq, role, content) VALUES (?, ?, ?, ?)',
+                         [(sid, start + i, turn['role'], turn['content']) for i, turn in enumerate(turns)])
+
+    # --- Direct access ---
+    def append_turns(self, sid, turns):
+        """
+        Appends turns to a stored session outside of a request/response cycle, e.g. once a
+        streamed reply has finished and the session has already been saved.
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET updated_at = ?, data = json_set(data, '$._has_history', json('true')) "
+                         "WHERE id = ?", (time.time(), sid))
+            self._insert_turns(conn, sid, turns)
+
+    def persist(self, session):
+        """
+        Writes a session to the store right away, for long-lived connections (the voice
+        WebSocket) that change it many times before their response completes.
+        """
+        self._write(session, session.get(HISTORY_KEY), time.time())
+        session.modified = False
+
+    def get_summary(self, sid):
+        """
+        Returns the rolling summary stored for a session as {'upto', 'digest', 'summary'}, or None.
+        """
+        with self._connect(write=False) as conn:
+            row = conn.execute('SELECT upto, digest, summary FROM session_summaries WHERE session_id = ?',
+                               (sid,)).fetchone()
+        return dict(zip(('upto', 'digest', 'summary'), row)) if row else None
+
+    def put_summary(self, sid, upto, digest, summary):
+        """
+        Stores the rolling summary of the first `upto` turns. Written by a background task, so
+        it lives in its own table rather than in the session data a request may overwrite.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute('INSERT INTO session_summaries (session_id, upto, digest, summary) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT(session_id) DO UPDATE SET upto = excluded.upto, digest = excluded.digest, '
+                             'summary = excluded.summary', (sid, upto, digest, summary))
+        except sqlite3.IntegrityError:
+            pass  # the session ended or was rotated while the summary was being written
+
+    def put_greeting(self, user_id, digest, reply_text=None):
+        """
+        Stores the greeting generated at login for the prompt with `digest`, so a request that
+        reaches another worker process can use it. Without `reply_text` the greeting is marked
+        as being generated.
+        """
+        with self._connect() as conn:
+            conn.execute('INSERT INTO greetings (user_id, digest, reply_text, updated_at) VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT(user_id) DO UPDATE SET digest = excluded.digest, '
+                         'reply_text = excluded.reply_text, updated_at = excluded.updated_at',
+                         (user_id, digest, reply_text, time.time()))
+
+    def get_greeting(self, user_id, digest):
+        """
+        Returns (reply_text, updated_at) of the user's greeting for the prompt with `digest`,
+        reply_text being None while it is generated, or None if there is none.
+        """
+        with self._connect(write=False) as conn:
+            row = conn.execute('SELECT reply_text, updated_at FROM greetings WHERE user_id = ? AND digest = ?',
+                               (user_id, digest)).fetchone()
+        return tuple(row) if row else None
+
+    def drop_greeting(self, user_id, digest=None):
+        """Deletes the user's greeting, only if it was generated for `digest` when given."""
+        with self._connect() as conn:
+            if digest is None:
+                conn.execute('DELETE FROM greetings WHERE user_id = ?', (user_id,))
+            else:
+                conn.execute('DELETE FROM greetings WHERE user_id = ? AND digest = ?', (user_id, digest))
+
+    def _maybe_sweep(self, app, now):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        cutoff = now - app.permanent_session_lifetime.total_seconds()
+        with self._connect() as conn:
+            evicted = conn.execute('DELETE FROM sessions WHERE updated_at < ?', (cutoff,)).rowcount
+            conn.execute('DELETE FROM greetings WHERE updated_at < ?', (cutoff,))
+        if evicted:
+            print(f"Evicted {evicted} idle sessions.")
+
+class _Transaction:
+    """
+    Wraps a connection in a transaction. Writers use BEGIN IMMEDIATE so concurrent writers
+    queue on the lock instead of failing when they upgrade from a read.
+    """
+    def __init__(self, conn, write):
+        self.conn = conn
+        self.write = write
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE' if self.write else 'BEGIN')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
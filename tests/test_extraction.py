@@ -0,0 +1,49 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extraction import EXTRACTION_FIELDS, FastPath
+
+def settle(answer, question='Hello! How can I help you today?'):
+    """The fast path's outcome for one answer: the settled (value, confidence), or None if it's left to the LLM."""
+    context = [{'role': 'assistant', 'content': question}, {'role': 'user', 'content': answer}]
+    settled, _ = FastPath().settle(context)
+    return settled
+
+def settled_name(answer, question='Hello! How can I help you today?'):
+    value = settle(answer, question).get('name')
+    return value[0] if value else 'llm'
+
+@pytest.mark.parametrize('answer, name', [
+    ('My name is Kaivan Mehta', 'Kaivan Mehta'),
+    ("Hi, my name's Priya and I'm from Pune", 'Priya'),
+    ('You can call me Ravi at 98765 43210', 'Ravi'),
+])
+def test_own_name_is_settled(answer, name):
+    assert settled_name(answer) == name
+
+@pytest.mark.parametrize('answer', [
+    'You can call me at 98765 43210',
+    'Call me tomorrow please',
+    "My father's name is Rajesh Kumar.",
+    'My name is Ravi 9876543210',
+])
+def test_no_wrong_name_is_settled(answer):
+    assert settled_name(answer) in (None, 'llm')
+
+def test_bare_name_answer_is_left_to_the_llm():
+    assert settled_name('Kaivan Shah', question='May I know your name?') == 'llm'
+
+def test_phone_is_normalized():
+    assert settle('My number is +91 98765 43210')['phone'] == ('+919876543210', 0.95)
+    assert settle('It is 098765 43210', question='What is your mobile number?')['phone'][0] == '9876543210'
+
+def test_percentages_go_to_their_cue():
+    settled = settle('I got 92% in my HSC boards and 88 percentile in JEE mains')
+    assert settled['hsc_marks'][0] == '92%'
+    assert settled['jee_percentile'][0] == '88%ile'
+
+def test_unasked_fields_are_settled_missing():
+    settled = settle('I want to know about the hostel fees')
+    assert all(settled[name] == (None, 1.0) for name in EXTRACTION_FIELDS)
@@ -0,0 +1,35 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transcode
+from vad import EnergyVAD
+
+def clip(lead, speech, trail, noise_dbfs, seed=0):
+    """`speech` seconds of a pulsed tone between `lead` and `trail` seconds, over noise."""
+    rate = transcode.SAMPLE_RATE
+    audio = np.random.default_rng(seed).normal(0.0, 10 ** (noise_dbfs / 20), int((lead + speech + trail) * rate))
+    t = np.arange(int(speech * rate)) / rate
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    audio[int(lead * rate):int(lead * rate) + len(t)] += 0.3 * np.sin(2 * np.pi * 180 * t) * envelope
+    return (np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes()
+
+@pytest.mark.parametrize('noise_dbfs', [-60, -45, -35, -25])
+def test_noise_only_clip_has_no_speech(noise_dbfs):
+    vad = EnergyVAD()
+    pcm = clip(2.0, 0, 0, noise_dbfs)
+    assert vad.bounds(pcm) is None
+    assert vad.trim(pcm) == b''
+
+@pytest.mark.parametrize('noise_dbfs', [-60, -45, -35])
+def test_silence_around_speech_is_cut(noise_dbfs):
+    vad = EnergyVAD()
+    start, end = vad.bounds(clip(1.0, 1.5, 1.0, noise_dbfs))
+    seconds = lambda offset: offset / transcode.SAMPLE_WIDTH / transcode.SAMPLE_RATE
+    assert 0.5 < seconds(start) <= 1.0
+    assert 2.5 <= seconds(end) < 3.0
+
+def test_empty_clip_has_no_speech():
+    assert EnergyVAD().bounds(b'') is None
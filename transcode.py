@@ -0,0 +1,261 @@
+import io
+import wave
+import queue
+import threading
+import ffmpeg
+
+# PyAV decodes in-process with no subprocess or temp file per clip. Without it we fall back
+# to a single ffmpeg process per clip fed through stdin/stdout pipes.
+try:
+    import av
+except ImportError:
+    av = None
+
+# Every clip is normalised to what the recognizer and the session recording expect
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes, signed 16-bit little endian
+CHANNELS = 1
+
+BACKEND = 'av' if av is not None else 'ffmpeg'
+
+class TranscodeError(Exception):
+    """
+    Raised when a clip cannot be decoded.
+    """
+
+def decode_to_pcm(data, backend=None):
+    """
+    Decodes a compressed clip (webm/opus from the browser, mp3 from edge-tts, wav, ...) held
+    in memory into 16 kHz mono s16le PCM bytes.
+    """
+    if not data:
+        raise TranscodeError("Empty audio clip")
+    if (backend or BACKEND) == 'av':
+        return _decode_with_av(data)
+    return _decode_with_ffmpeg(data)
+
+def _decode_with_av(data):
+    resampler = av.AudioResampler(format='s16', layout='mono', rate=SAMPLE_RATE)
+    pcm = bytearray()
+    try:
+        with av.open(io.BytesIO(data), mode='r') as container:
+            for frame in container.decode(audio=0):
+                for out in resampler.resample(frame):
+                    pcm += bytes(out.planes[0])[:out.samples * SAMPLE_WIDTH]
+            # Flush whatever the resampler is still holding
+            for out in resampler.resample(None):
+                pcm += bytes(out.planes[0])[:out.samples * SAMPLE_WIDTH]
+    except (av.FFmpegError, IndexError, ValueError) as e:
+        raise TranscodeError(f"PyAV could not decode clip: {e}") from e
+    return bytes(pcm)
+
+def _decode_with_ffmpeg(data):
+    try:
+        pcm, _ = (
+            ffmpeg.input('pipe:0')
+            .output('pipe:1', format='s16le', acodec='pcm_s16le', ar=SAMPLE_RATE, ac=CHANNELS)
+            .run(input=data, capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        raise TranscodeError(f"ffmpeg could not decode clip: {e.stderr.decode(errors='replace')}") from e
+    return pcm
+
+class StreamDecoder:
+    """
+    Decodes a compressed clip while it is still arriving, e.g. the browser's webm as it is
+    uploaded chunk by chunk. Chunks passed to write() are decoded on a background thread and
+    every block of 16 kHz mono PCM is handed to `on_pcm` as soon as it is ready. close()
+    waits for the rest of the clip and returns all of its PCM.
+    """
+
+    def __init__(self, on_pcm=None, backend=None):
+        self.on_pcm = on_pcm
+        self.backend = backend or BACKEND
+        self._pcm = bytearray()
+        self._error = None
+        self._written = 0
+        if self.backend == 'av':
+            self._chunks = _ChunkReader()
+            target = self._decode_with_av
+        else:
+            self._process = (
+                ffmpeg.input('pipe:0')
+                .output('pipe:1', format='s16le', acodec='pcm_s16le', ar=SAMPLE_RATE, ac=CHANNELS)
+                .global_args('-loglevel', 'error')  # stderr is only read at the end
+                .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True, quiet=True)
+            )
+            target = self._read_from_ffmpeg
+        self._thread = threading.Thread(target=target, name='stream-decoder', daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        self._written += len(data)
+        if self.backend == 'av':
+            self._chunks.put(data)
+            return
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg gave up on the stream; close() reports why
+
+    def close(self):
+        """
+        Returns the PCM of the whole clip. Raises TranscodeError if it could not be decoded.
+        """
+        if self.backend == 'av':
+            self._chunks.put(None)
+        else:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self._thread.join()
+        if not self._written:
+            raise TranscodeError("Empty audio clip")
+        if self._error is not None:
+            raise TranscodeError(self._error)
+        return bytes(self._pcm)
+
+    def abort(self):
+        """Stops decoding and drops the clip."""
+        try:
+            self.close()
+        except TranscodeError:
+            pass
+
+    def _emit(self, pcm):
+        if not pcm:
+            return
+        self._pcm += pcm
+        if self.on_pcm is not None:
+            self.on_pcm(pcm)
+
+    def _decode_with_av(self):
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=SAMPLE_RATE)
+        try:
+            with av.open(self._chunks, mode='r') as container:
+                for frame in container.decode(audio=0):
+                    for out in resampler.resample(frame):
+                        self._emit(bytes(out.planes[0])[:out.samples * SAMPLE_WIDTH])
+                for out in resampler.resample(None):
+                    self._emit(bytes(out.planes[0])[:out.samples * SAMPLE_WIDTH])
+        except (av.FFmpegError, IndexError, ValueError) as e:
+            self._error = f"PyAV could not decode stream: {e}"
+        finally:
+            # Keep accepting (and dropping) chunks if decoding stopped early
+            self._chunks.drain()
+
+    def _read_from_ffmpeg(self):
+        # 100 ms blocks
+        block = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS // 10
+        while True:
+            pcm = self._process.stdout.read(block)
+            if not pcm:
+                break
+            self._emit(pcm)
+        stderr = self._process.stderr.read()
+        if self._process.wait() != 0:
+            self._error = f"ffmpeg could not decode stream: {stderr.decode(errors='replace')}"
+
+class _ChunkReader(io.RawIOBase):
+    """
+    A read-only file over chunks put from another thread; reads block until data arrives,
+    and put(None) marks the end of the stream.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._buffer = b''
+        self._eof = False
+
+    def put(self, data):
+        self._queue.put(data)
+
+    def drain(self):
+        self._eof = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+# --- Archiving ---
+# Codecs finished session recordings can be re-encoded with: container format, encoder,
+# file extension and bit rate (None for lossless)
+ARCHIVE_CODECS = {
+    'flac': ('flac', 'flac', '.flac', None),
+    'opus': ('ogg', 'libopus', '.opus', 24000),
+}
+
+def encode_file(src, dest, codec='flac', backend=None):
+    """
+    Re-encodes the 16 kHz mono WAV at `src` into `dest` with one of ARCHIVE_CODECS. Raises
+    TranscodeError if it cannot be encoded.
+    """
+    if (backend or BACKEND) == 'av':
+        return _encode_with_av(src, dest, *ARCHIVE_CODECS[codec])
+    return _encode_with_ffmpeg(src, dest, *ARCHIVE_CODECS[codec])
+
+def _encode_with_av(src, dest, container_format, encoder, extension, bit_rate):
+    try:
+        with av.open(src, mode='r') as source, av.open(dest, mode='w', format=container_format) as target:
+            stream = target.add_stream(encoder, rate=SAMPLE_RATE, layout='mono')
+            if bit_rate:
+                stream.bit_rate = bit_rate
+            for frame in source.decode(audio=0):
+                frame.pts = None
+                target.mux(stream.encode(frame))
+            target.mux(stream.encode(None))
+    except (av.FFmpegError, IndexError, ValueError) as e:
+        raise TranscodeError(f"PyAV could not encode {src}: {e}") from e
+
+def _encode_with_ffmpeg(src, dest, container_format, encoder, extension, bit_rate):
+    options = {'b:a': bit_rate} if bit_rate else {}
+    try:
+        (
+            ffmpeg.input(src)
+            .output(dest, format=container_format, acodec=encoder, ar=SAMPLE_RATE, ac=CHANNELS, **options)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        raise TranscodeError(f"ffmpeg could not encode {src}: {e.stderr.decode(errors='replace')}") from e
+
+def silence(seconds):
+    """
+    Returns `seconds` of digital silence as PCM.
+    """
+    return b'\x00' * (int(SAMPLE_RATE * seconds) * SAMPLE_WIDTH * CHANNELS)
+
+def pcm_duration(pcm):
+    return len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS)
+
+def pcm_to_wav(pcm):
+    """
+    Wraps PCM in a WAV container, in memory.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+def write_wav(path, pcm):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
@@ -0,0 +1,139 @@
+import os
+import time
+import zlib
+import base64
+import sqlite3
+import threading
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# --- Turn Encoding ---
+# A turn's content is deflated against a preset dictionary of phrases the interview repeats,
+# so even a one-line answer compresses, then sealed with AES-GCM under a key derived from the
+# app's Fernet key: a 12-byte nonce and a 16-byte tag per row, where a Fernet token adds 57
+# bytes or more. The row's user, session, turn number and role are authenticated with it, so
+# a row's content cannot be passed off as another's. `format` is stored with every row: the
+# dictionary of a format must never change, a new dictionary gets a new format number. It is
+# an excerpt of admin_prompt_conv.txt as it stood, typos included; editing the prompt does not
+# update it, and replies in the new wording compress less.
+FORMAT_DEFLATE_GCM_V2 = 2
+DICTIONARY = (
+    "Hello! Welcome to the XYZ College admission interview. Are you ready to begin? Please be aware that this "
+    "conversation, including your audio and all data you provide, will be securely recorded and stored on XYZ "
+    "College's servers for admission processing. Hello, welcome back to XYZ College. We have your previous "
+    "information on file. Are you ready to begin your admission interview or would you like to review/update your "
+    "details first? Your currently saved HSC marks are What would you like me to update them to? "
+    "Could you please tell me your full name? What is your phone number? Could you please share your mobile number? "
+    "What is your JEE percentile? What was your 12th HSC percentage? Thank you for sharing that. "
+    "I have recieved sufficient information, to update the records. Thank you for your time. Have a great day! "
+    "(User audio was empty or indecipherable) (Speech recognition service failed) "
+    "Sorry, there was an error with the local LLM. Sorry, I'm a little overloaded right now. Please try again in a "
+    "moment. I'm sorry, I'm having trouble connecting right now. "
+    "Yes, I'm ready. My name is My number is I got percentile in JEE mains. I scored percent in my HSC boards. "
+    "engineering computer science mechanical branch college campus hostel fees scholarship admission Ahmedabad "
+).encode('utf-8')
+
+def _associated_data(user_id, session_id, seq, role):
+    return f'{user_id}:{session_id.hex()}:{seq}:{role}'.encode('utf-8')
+
+class TurnSealer:
+    """
+    Seals and opens turn content with a key derived from the Fernet key `key`. Session ids
+    are the 16 raw bytes of the conversation id, as stored.
+    """
+
+    def __init__(self, key):
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'transcript log v2')
+        self.aead = AESGCM(hkdf.derive(base64.urlsafe_b64decode(key)))
+
+    def seal(self, user_id, session_id, seq, role, content):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=DICTIONARY)
+        packed = compressor.compress(content.encode('utf-8')) + compressor.flush()
+        nonce = os.urandom(12)
+        return nonce + self.aead.encrypt(nonce, packed, _associated_data(user_id, session_id, seq, role))
+
+    def unseal(self, user_id, session_id, seq, role, fmt, blob):
+        """
+        Returns the content of a stored turn. Raises cryptography's InvalidTag if it was
+        tampered with or belongs to another row.
+        """
+        if fmt != FORMAT_DEFLATE_GCM_V2:
+            raise ValueError(f"Unknown turn format {fmt}")
+        packed = self.aead.decrypt(blob[:12], blob[12:], _associated_data(user_id, session_id, seq, role))
+        decompressor = zlib.decompressobj(-15, zdict=DICTIONARY)
+        return (decompressor.decompress(packed) + decompressor.flush()).decode('utf-8')
+
+class TranscriptLog:
+    """
+    Append-only log of every conversation turn, one encrypted row per turn in the app
+    database's `turns` table. append() only queues the turn; a writer thread seals the queued
+    turns and inserts them in one transaction every `flush_interval` seconds, or as soon as
+    `batch_size` are waiting. Up to `flush_interval` of turns are lost if the process dies.
+    Turns are keyed by (user_id, session_id, seq), so a turn written twice is stored once;
+    `session_id` is a conversation id of 32 hex digits, stored as its 16 bytes.
+    """
+
+    def __init__(self, db, key, batch_size=64, flush_interval=1.0, max_pending=10000):
+        self.db = db
+        self.sealer = TurnSealer(key)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {'turns': 0, 'batches': 0, 'dropped': 0, 'failed_batches': 0,
+                       'content_bytes': 0, 'stored_bytes': 0}
+
+    def append(self, user_id, session_id, seq, role, content):
+        with self._lock:
+            if self._thread is None:
+                # Started on first use, so a process that forks after import has its own writer
+                self._thread = threading.Thread(target=self._run, name='transcript-writer', daemon=True)
+                self._thread.start()
+            self._pending.append((user_id, bytes.fromhex(session_id), seq, role, time.time(), content))
+            if len(self._pending) > self.max_pending:
+                del self._pending[0]
+                self._stats['dropped'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes the queued turns now. Also called at exit."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            rows = [(user_id, session_id, seq, role, created_at, FORMAT_DEFLATE_GCM_V2,
+                     self.sealer.seal(user_id, session_id, seq, role, content))
+                    for user_id, session_id, seq, role, created_at, content in pending]
+            try:
+                self.db.insert_turns(rows)
+            except sqlite3.Error as e:
+                print(f"Could not write {len(rows)} transcript turns, retrying: {e}")
+                with self._lock:
+                    self._pending[:0] = pending
+                    self._stats['failed_batches'] += 1
+                return
+            with self._lock:
+                self._stats['turns'] += len(rows)
+                self._stats['batches'] += 1
+                self._stats['content_bytes'] += sum(len(turn[-1].encode('utf-8')) for turn in pending)
+                self._stats['stored_bytes'] += sum(len(row[-1]) for row in rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['stored_ratio'] = stats['stored_bytes'] / stats['content_bytes'] if stats['content_bytes'] else 0.0
+        return stats
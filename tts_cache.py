@@ -0,0 +1,217 @@
+import os
+import io
+import re
+import json
+import wave
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech. Each entry holds the compressed audio
+    edge-tts returned (what the browser plays) and its 16 kHz mono PCM (what the session
+    recording needs), so a hit skips both the TTS round trip and the decode.
+
+    There are two LRU tiers, each bounded in bytes: a small in-memory one, and an on-disk
+    one under `cache_dir` that survives restarts. Disk hits are promoted into memory.
+
+    The disk tier is shared by every process using `cache_dir`: a key missing from this
+    process's index is looked up on disk and adopted, and before evicting, the index is
+    rebuilt from the directory (at most every `rescan_seconds`) so the byte bound and the
+    LRU order cover the entries written and read by the other processes too.
+    """
+
+    def __init__(self, cache_dir, memory_bytes=16 * 1024 * 1024, disk_bytes=256 * 1024 * 1024, rescan_seconds=60.0):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.rescan_seconds = rescan_seconds
+        self._last_scan = 0.0
+        self._memory = OrderedDict()  # key -> (audio, pcm)
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> bytes on disk, least recently used first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'memory_evictions': 0, 'disk_evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def key(voice, text, output_format):
+        return hashlib.sha256(json.dumps([voice, text, output_format]).encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f'{key}.audio'), os.path.join(self.cache_dir, f'{key}.wav')
+
+    def _load_disk_index(self):
+        """Rebuilds the disk index from the files in `cache_dir`, least recently used first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.audio'):
+                continue
+            key = name[:-len('.audio')]
+            audio_path, wav_path = self._paths(key)
+            try:
+                size = os.path.getsize(audio_path) + os.path.getsize(wav_path)
+                entries.append((os.path.getmtime(audio_path), key, size))
+            except OSError:
+                continue
+        disk = OrderedDict((key, size) for _, key, size in sorted(entries))
+        with self._lock:
+            self._disk = disk
+            self._disk_size = sum(disk.values())
+            self._last_scan = time.monotonic()
+
+    def _adopt(self, key):
+        """
+        Indexes an entry another process wrote since the index was built. Returns False if
+        it is not on disk.
+        """
+        try:
+            size = sum(os.path.getsize(path) for path in self._paths(key))
+        except OSError:
+            return False
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = size
+                self._disk_size += size
+        return True
+
+    # --- Lookup ---
+    def get(self, key):
+        """
+        Returns (audio, pcm) for the key, or None on a miss.
+        """
+        if not re.fullmatch(r'[0-9a-f]{64}', key):
+            return None
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._memory[key]
+            on_disk = key in self._disk
+
+        if on_disk or self._adopt(key):
+            entry = self._read_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._put_memory(key, entry)
+                return entry
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def audio_path(self, key):
+        """
+        Returns the path of the cached compressed audio for the key, or None if it is not on
+        disk. Lets the file be served straight from the cache without reading it into memory.
+        """
+        if not re.fullmatch(r'[0-9a-f]{64}', key):
+            return None
+        with self._lock:
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+        if not on_disk and not self._adopt(key):
+            return None
+        return self._paths(key)[0]
+
+    def _read_disk(self, key):
+        audio_path, wav_path = self._paths(key)
+        try:
+            with open(audio_path, 'rb') as f:
+                audio = f.read()
+            with wave.open(wav_path, 'rb') as wav:
+                pcm = wav.readframes(wav.getnframes())
+            # Record the access so recency survives a restart
+            os.utime(audio_path)
+            return audio, pcm
+        except (OSError, EOFError, wave.Error):
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            return None
+
+    # --- Insertion ---
+    def put(self, key, audio, pcm, sample_rate=16000):
+        if not audio or not pcm:
+            return
+        with self._lock:
+            self._put_memory(key, (audio, pcm))
+            if key in self._disk:
+                return
+
+        audio_path, wav_path = self._paths(key)
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm)
+        try:
+            # Write the wav first: an entry is only indexed once its .audio file exists
+            for path, data in [(wav_path, wav_buffer.getvalue()), (audio_path, audio)]:
+                # Thread ids repeat across forked workers, so the pid is part of the name
+                tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write TTS cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            size = len(audio) + wav_buffer.tell()
+            if key not in self._disk:
+                self._disk[key] = size
+                self._disk_size += size
+            rescan = time.monotonic() - self._last_scan >= self.rescan_seconds
+        if rescan:
+            # Count the other processes' entries before deciding what to evict
+            self._load_disk_index()
+        with self._lock:
+            evicted = self._evict_disk()
+        for old_key in evicted:
+            for path in self._paths(old_key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # already evicted by another process
+
+    def _put_memory(self, key, entry):
+        size = len(entry[0]) + len(entry[1])
+        if size > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = entry
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (audio, pcm) = self._memory.popitem(last=False)
+            self._memory_size -= len(audio) + len(pcm)
+            self._stats['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        evicted = []
+        while self._disk_size > self.disk_bytes and self._disk:
+            old_key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self._stats['disk_evictions'] += 1
+            evicted.append(old_key)
+        return evicted
+
+    # --- Statistics ---
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'memory_entries': len(self._memory), 'memory_bytes': self._memory_size,
+                'disk_entries': len(self._disk), 'disk_bytes': self._disk_size,
+            })
+        return stats
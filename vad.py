@@ -0,0 +1,86 @@
+import threading
+import numpy as np
+import transcode
+
+class EnergyVAD:
+    """
+    Finds the speech in a clip of 16 kHz mono s16le PCM from the energy of short frames,
+    so push-to-talk silence before and after the user speaks is neither sent to the
+    recognizer nor stored. All frame math runs on NumPy arrays, with no per-sample loops.
+
+    A frame is voiced if its energy is `margin_db` above the clip's noise floor (a low
+    percentile of the frame energies) and above `floor_db`; a clip with no frame that far
+    above its floor is noise only. Speech starts at the first voiced frame and ends
+    `hangover_ms` after the last one, so a trailing word that fades out is kept;
+    `pre_roll_ms` is kept before the start for soft onsets. A clip with less than
+    `min_speech_ms` of voiced frames holds no speech.
+    """
+
+    def __init__(self, frame_ms=20, margin_db=12.0, floor_db=-50.0, noise_percentile=10,
+                 min_speech_ms=150, pre_roll_ms=200, hangover_ms=300):
+        self.frame_samples = transcode.SAMPLE_RATE * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.floor_db = floor_db
+        self.noise_percentile = noise_percentile
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.hangover_frames = hangover_ms // frame_ms
+        self._lock = threading.Lock()
+        self._stats = {'clips': 0, 'no_speech': 0, 'seconds_in': 0.0, 'seconds_out': 0.0}
+
+    def frame_energies(self, pcm):
+        """Energy of each whole frame in dBFS."""
+        samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // transcode.SAMPLE_WIDTH)
+        frames = samples[:len(samples) // self.frame_samples * self.frame_samples]
+        frames = frames.reshape(-1, self.frame_samples).astype(np.float32) / 32768.0
+        return 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+    def threshold(self, energies):
+        """
+        The energy a frame needs to count as voiced, or None if no frame can be: a clip whose
+        loudest frame is less than `margin_db` above its noise floor is flat noise, however
+        loud. A clip that is speech throughout has no quiet frames to take the noise floor
+        from, so the threshold is also kept `margin_db` below the loudest frame.
+        """
+        noise = np.percentile(energies, self.noise_percentile)
+        loudest = energies.max()
+        if loudest - noise < self.margin_db:
+            return None
+        return max(self.floor_db, min(noise + self.margin_db, loudest - self.margin_db))
+
+    def bounds(self, pcm):
+        """
+        Returns the (start, end) byte offsets of the speech in `pcm`, or None if it has none.
+        """
+        energies = self.frame_energies(pcm)
+        threshold = self.threshold(energies) if len(energies) else None
+        if threshold is None:
+            return None
+        voiced = np.flatnonzero(energies > threshold)
+        if len(voiced) < self.min_speech_frames:
+            return None
+        frame_bytes = self.frame_samples * transcode.SAMPLE_WIDTH
+        start = max(0, voiced[0] - self.pre_roll_frames) * frame_bytes
+        end = min(len(pcm), (voiced[-1] + 1 + self.hangover_frames) * frame_bytes)
+        return int(start), int(end)
+
+    def trim(self, pcm):
+        """
+        Returns the speech in `pcm` with the silence around it cut off, or b'' if it holds
+        no speech.
+        """
+        found = self.bounds(pcm)
+        speech = pcm[found[0]:found[1]] if found else b''
+        with self._lock:
+            self._stats['clips'] += 1
+            self._stats['no_speech'] += not found
+            self._stats['seconds_in'] += transcode.pcm_duration(pcm)
+            self._stats['seconds_out'] += transcode.pcm_duration(speech)
+        return speech
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['trimmed_ratio'] = 1.0 - stats['seconds_out'] / stats['seconds_in'] if stats['seconds_in'] else 0.0
+        return stats